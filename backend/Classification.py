@@ -1,8 +1,10 @@
 import asyncio
 import os
 import re
+import threading
 import ast
 import json
+from collections import OrderedDict
 from sentence_transformers import SentenceTransformer
 import json
 import pandas as pd
@@ -24,16 +26,147 @@ class SimpleRegressor(nn.Module):
     def forward(self, x):
         return self.fc(x)
 model = SimpleRegressor()
-model.load_state_dict(torch.load(r"C:\Users\qiu19\Unwrapathon\reddit-review-qualitative-to-quantitative\backend\model_weights.pt",
-    map_location="cpu"))
+MODEL_WEIGHTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_weights.pt")
+model.load_state_dict(torch.load(MODEL_WEIGHTS, map_location="cpu"))
 model.eval()
 
-async def analyze_comment(reviews: list[str]) -> list[float]:
-    x = embedder.encode(reviews)
-    x = torch.tensor(x).float()
-    with torch.no_grad():
-        preds = model(x)
-    return preds.tolist()
+
+def share_model_memory():
+    # Move encoder + regressor weights into shared memory so forked workers
+    # (see serve.py) all map the same pages instead of each holding a copy.
+    embedder.share_memory()
+    model.share_memory()
+
+
+def configure_worker_threads(num_threads: int):
+    # Each worker gets its own slice of the CPU; without this every process
+    # starts one torch thread per core and they oversubscribe the machine.
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # can only be set before any inter-op work has run
+
+# Padded tokens per encoder batch: short comments go in large batches, long ones
+# in small batches, instead of every batch padding to its longest member.
+MAX_BATCH_TOKENS = 8192
+MAX_BATCH_SIZE = 256
+# Over-length comments are split into windows that overlap by this many tokens.
+CHUNK_OVERLAP_TOKENS = 32
+
+
+def _chunks(text: str, offsets, size: int, overlap: int):
+    # (chunk_text, n_tokens) windows covering a comment longer than the encoder's limit
+    step = max(1, size - overlap)
+    for start in range(0, len(offsets), step):
+        window = offsets[start:start + size]
+        yield text[window[0][0]:window[-1][1]], len(window)
+        if start + size >= len(offsets):
+            break
+
+
+def encode_comments(texts: list[str]) -> np.ndarray:
+    """
+    MiniLM embeddings in the original order. Inputs are grouped into length
+    buckets to keep padding low, and comments longer than the encoder's
+    max_seq_length are chunked and pooled (token-weighted mean) instead of
+    being truncated.
+    """
+    dim = embedder.get_sentence_embedding_dimension()
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32)
+    limit = embedder.max_seq_length - 2  # room for [CLS] and [SEP]
+    offsets = embedder.tokenizer(list(texts), add_special_tokens=False, return_offsets_mapping=True,
+                                 verbose=False)["offset_mapping"]
+    pieces, owners, lengths = [], [], []
+    for i, (text, offs) in enumerate(zip(texts, offsets)):
+        if len(offs) <= limit:
+            pieces.append(text)
+            owners.append(i)
+            lengths.append(max(1, len(offs)))
+        else:
+            for chunk, n in _chunks(text, offs, limit, CHUNK_OVERLAP_TOKENS):
+                pieces.append(chunk)
+                owners.append(i)
+                lengths.append(n)
+
+    vectors = np.empty((len(pieces), dim), dtype=np.float32)
+    order = np.argsort(lengths, kind="stable")
+    start = 0
+    while start < len(order):
+        end = start + 1
+        while (end < len(order) and end - start < MAX_BATCH_SIZE
+               and (end - start + 1) * (lengths[order[end]] + 2) <= MAX_BATCH_TOKENS):
+            end += 1
+        batch = order[start:end]
+        vectors[batch] = embedder.encode([pieces[k] for k in batch], batch_size=len(batch), convert_to_numpy=True)
+        start = end
+
+    owners = np.asarray(owners)
+    weights = np.asarray(lengths, dtype=np.float32)[:, None]
+    if len(pieces) == len(texts):
+        return vectors  # nothing was chunked; owners are 0..n-1 in order
+    pooled = np.zeros((len(texts), dim), dtype=np.float32)
+    np.add.at(pooled, owners, vectors * weights)
+    pooled /= np.bincount(owners, weights=weights[:, 0])[:, None]
+    # Keep pooled vectors at the scale of the model's own outputs.
+    norms = np.zeros(len(texts), dtype=np.float32)
+    np.add.at(norms, owners, np.linalg.norm(vectors, axis=1))
+    norms /= np.bincount(owners)
+    pooled *= (norms / np.maximum(np.linalg.norm(pooled, axis=1), 1e-12))[:, None]
+    return pooled
+
+
+async def analyze_comment(reviews: list[str], memo: dict | None = None) -> list[float]:
+    # memo maps comment text -> predictions; shared across calls (e.g. a batch of
+    # products) so a comment seen more than once is only encoded once.
+    return classify_comments(reviews, memo)
+
+
+def classify_comments(reviews: list[str], memo: dict | None = None) -> list[float]:
+    # Synchronous core of analyze_comment, for callers that run it in a worker
+    # thread (see pipeline.py) so the event loop keeps scheduling fetches.
+    if memo is None:
+        memo = {}
+    pending = list(dict.fromkeys(r for r in reviews if r not in memo))
+    if pending:
+        embeddings = encode_comments(pending)
+        _remember_embeddings(pending, embeddings)
+        x = torch.tensor(embeddings).float()
+        with torch.no_grad():
+            preds = model(x)
+        for text, pred in zip(pending, preds.tolist()):
+            memo[text] = pred
+    return [memo[r] for r in reviews]
+
+
+# Recent comment embeddings, kept so later stages (local pros/cons) can reuse
+# the vectors analyze_comment already computed instead of encoding again.
+EMBEDDING_CACHE_SIZE = 4096
+_embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_embedding_lock = threading.Lock()
+
+
+def _remember_embeddings(texts, embeddings):
+    with _embedding_lock:
+        for text, vector in zip(texts, embeddings):
+            _embedding_cache[text] = vector
+            _embedding_cache.move_to_end(text)
+        while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+
+
+def embed_texts(texts: list[str]) -> np.ndarray:
+    # MiniLM embeddings for texts, reusing cached vectors and encoding only the rest
+    with _embedding_lock:
+        missing = list(dict.fromkeys(t for t in texts if t not in _embedding_cache))
+    if missing:
+        _remember_embeddings(missing, encode_comments(missing))
+    with _embedding_lock:
+        found = {t: _embedding_cache.get(t) for t in texts}
+    if any(v is None for v in found.values()):  # evicted while encoding a huge batch
+        return encode_comments(texts)
+    return np.stack([found[t] for t in texts]).astype(np.float32)
 
 
 
@@ -0,0 +1,143 @@
+"""
+Adaptive fetch budget for fetch_data.
+
+Instead of a fixed `limit`, posts are fetched in relevance order and each post's
+comments are classified and folded into a running weighted score as soon as it
+arrives. Crawling stops once the score has converged (its confidence interval or
+the change from the last post falls below a threshold), subject to min/max post
+counts and a time budget.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import deadline
+from Classification import analyze_comment
+from calculate import RunningAggregate, compute_weight
+from prefilter import prefilter_comments
+from reddit_api_call import _default_query_for_product, fan_out_kwargs
+
+try:
+    from .data import iter_search_posts  # type: ignore
+    from .data_refactor import build_comment_tuples_from_record  # type: ignore
+except Exception:
+    from backend.data import iter_search_posts  # type: ignore
+    from backend.data_refactor import build_comment_tuples_from_record  # type: ignore
+
+MIN_POSTS = 2
+MAX_POSTS = 25
+MAX_SECONDS = 30.0
+# Stop when the 95% CI half-width on final_score (1-5 scale) is below this...
+CI_THRESHOLD = 0.15
+# ...or when the last post moved final_score by less than this.
+DELTA_THRESHOLD = 0.02
+# Share of the request's remaining latency budget that crawling may use.
+REQUEST_BUDGET_SHARE = 0.5
+
+
+async def adaptive_fetch(
+    keyword: str,
+    *,
+    subreddit: Optional[str] = "all",
+    time_filter: str = "year",
+    comments: int = 30,
+    min_posts: int = MIN_POSTS,
+    max_posts: int = MAX_POSTS,
+    max_seconds: float = MAX_SECONDS,
+    ci_threshold: float = CI_THRESHOLD,
+    delta_threshold: float = DELTA_THRESHOLD,
+    post_cache=None,
+    metric_cache: Optional[dict] = None,
+    classify=None,
+    fan_out: bool = False,
+) -> Tuple[List[Tuple[str, str, list]], List[list], Dict[str, Any]]:
+    """
+    Returns (reddit_data, metrics, stats): the kept comment tuples, their classifier
+    outputs in the same order, and {posts_used, score_uncertainty, stop_reason, ...}.
+    `classify` optionally replaces analyze_comment (same signature minus memo).
+    `fan_out` ranks the posts with the parallel fan-out search (see data.fan_out_search).
+    """
+    started = time.monotonic()
+    request_budget = deadline.current()
+    if request_budget is not None:
+        max_seconds = min(max_seconds, request_budget.remaining() * REQUEST_BUDGET_SHARE)
+    posts = iter_search_posts(
+        _default_query_for_product(keyword),
+        subreddit=subreddit,
+        sort="relevance",
+        time_filter=time_filter,
+        limit=max_posts,
+        max_comments=comments,
+        post_cache=post_cache,
+        **fan_out_kwargs(keyword, fan_out),
+    )
+    aggregate = RunningAggregate()
+    reddit_data: List[Tuple[str, str, list]] = []
+    metrics: List[list] = []
+    posts_used = 0
+    last_score: Optional[float] = None
+    delta = math.inf
+    stop_reason = "exhausted"
+
+    try:
+        while True:
+            if time.monotonic() - started >= max_seconds:
+                stop_reason = "time_budget"
+                break
+            post = await asyncio.to_thread(next, posts, None)
+            if post is None:
+                break
+            posts_used += 1
+
+            counted = aggregate.count
+            tuples, _ = prefilter_comments(build_comment_tuples_from_record(post), keyword)
+            if tuples:
+                texts = [t[0] for t in tuples]
+                if classify is not None:
+                    preds = await classify(texts)
+                else:
+                    preds = await analyze_comment(texts, memo=metric_cache)
+                for t, m in zip(tuples, preds):
+                    reddit_data.append(t)
+                    metrics.append(m)
+                    if m[-1] == -1:
+                        continue
+                    aggregate.add(m, await compute_weight(t[2], m[-1]))
+
+            if posts_used >= max_posts:
+                stop_reason = "max_posts"
+                break
+            # A post that added no comments leaves the score unchanged; that is not convergence.
+            if aggregate.count == counted:
+                continue
+            score = aggregate.final_score
+            if last_score is not None:
+                delta = abs(score - last_score)
+            last_score = score
+
+            if posts_used >= min_posts and aggregate.count >= 2:
+                if aggregate.uncertainty() <= ci_threshold:
+                    stop_reason = "converged_ci"
+                    break
+                if delta <= delta_threshold:
+                    stop_reason = "converged_delta"
+                    break
+    finally:
+        try:
+            posts.close()
+        except ValueError:
+            pass  # cancelled while a fetch is still running in its thread
+    uncertainty = aggregate.uncertainty()
+    stats = {
+        "posts_used": posts_used,
+        "comments_used": aggregate.count,
+        "score_uncertainty": None if math.isinf(uncertainty) else round(uncertainty, 3),
+        "stop_reason": stop_reason,
+        "elapsed_seconds": round(time.monotonic() - started, 2),
+    }
+    print(f"Adaptive fetch for '{keyword}': {stats}")
+    return reddit_data, metrics, stats
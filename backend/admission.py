@@ -0,0 +1,190 @@
+"""
+Admission control for the expensive /analyze endpoints.
+
+Each full analysis holds Reddit quota, LLM slots and memory for tens of
+seconds. Without a cap, a traffic spike starts a pipeline for every request,
+and they all slow down together until they time out. AdmissionController
+bounds the number of analyses in flight per worker process (MAX_IN_FLIGHT)
+and the number waiting for a slot (MAX_QUEUE):
+
+  - a request that cannot be admitted right away waits in its client's queue;
+    slots are handed out round-robin across clients, so one client sending
+    many requests can't starve the others
+  - a client may hold at most PER_CLIENT_LIMIT requests (running + waiting)
+  - when the queue is full, the client is over its limit, or no slot frees up
+    within MAX_WAIT_SECONDS, the request is rejected with Overloaded, which the
+    server turns into 429 with a Retry-After based on recent service times
+
+Cache hits never reach the controller: server.analyze answers them before
+asking for a slot, so they are served even while the server is saturated.
+Clients are identified by API key (X-API-Key) when it is one of
+ADMISSION_API_KEYS, else by IP. The IP is taken from X-Forwarded-For only as
+far as ADMISSION_TRUSTED_PROXY_HOPS of our own proxies vouch for it (counting
+from the right, since clients can put anything on the left), else from the
+socket peer.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import math
+import os
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "4"))
+MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+PER_CLIENT_LIMIT = int(os.getenv("ADMISSION_PER_CLIENT", "3"))
+MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT", "20"))
+MAX_RETRY_AFTER_SECONDS = 60
+# Proxies in front of the app that append to X-Forwarded-For (Render: 1).
+TRUSTED_PROXY_HOPS = int(os.getenv("ADMISSION_TRUSTED_PROXY_HOPS", "0"))
+# Comma-separated API keys that get their own fairness bucket.
+API_KEYS = frozenset(k.strip() for k in os.getenv("ADMISSION_API_KEYS", "").split(",") if k.strip())
+# Smoothing factor for the moving average of analysis duration.
+SERVICE_TIME_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """The request was not admitted; retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def client_id(host: Optional[str], forwarded_for: Optional[str] = None, api_key: Optional[str] = None,
+              trusted_hops: int = TRUSTED_PROXY_HOPS, api_keys: frozenset = API_KEYS) -> str:
+    """Fairness key: hashed API key if it is a configured one, else the client IP our proxies saw."""
+    if api_key and api_key in api_keys:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    hops = [h.strip() for h in (forwarded_for or "").split(",") if h.strip()]
+    if trusted_hops > 0 and hops:
+        # Each trusted proxy appended the address it received from, so the entry
+        # `trusted_hops` from the right was written by our outermost proxy.
+        return "ip:" + hops[-min(trusted_hops, len(hops))]
+    return "ip:" + (host or "unknown")
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        max_queue: int = MAX_QUEUE,
+        per_client_limit: int = PER_CLIENT_LIMIT,
+        max_wait: float = MAX_WAIT_SECONDS,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.per_client_limit = per_client_limit
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.queued = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._per_client: Counter = Counter()
+        self.service_seconds = 10.0  # initial guess until real analyses finish
+        self.stats: Dict[str, int] = {
+            "admitted": 0, "had_to_wait": 0, "cache_hits": 0,
+            "rejected_queue_full": 0, "rejected_client_limit": 0, "rejected_wait_timeout": 0,
+        }
+
+    def retry_after(self) -> int:
+        """Rough seconds until a slot is free for a new arrival."""
+        waves = (self.queued + 1) / max(1, self.max_in_flight)
+        return int(min(MAX_RETRY_AFTER_SECONDS, max(1, math.ceil(self.service_seconds * waves))))
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.stats[f"rejected_{reason}"] += 1
+        return Overloaded(reason, self.retry_after())
+
+    def _hand_off(self) -> bool:
+        # Give the freed slot to the next client in round-robin order.
+        while self._waiters:
+            client, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            if queue:
+                self._waiters.move_to_end(client)
+            else:
+                del self._waiters[client]
+            if not future.done():
+                self.queued -= 1
+                future.set_result(None)
+                return True
+        return False
+
+    def _forget(self, client: str, future: asyncio.Future) -> None:
+        queue = self._waiters.get(client)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self._waiters[client]
+            self.queued -= 1
+
+    async def acquire(self, client: str) -> None:
+        if self._per_client[client] >= self.per_client_limit:
+            raise self._reject("client_limit")
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._per_client[client] += 1
+            self.stats["admitted"] += 1
+            return
+        if self.queued >= self.max_queue:
+            raise self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(client, deque()).append(future)
+        self.queued += 1
+        self._per_client[client] += 1
+        self.stats["had_to_wait"] += 1
+        try:
+            await asyncio.wait({future}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            if future.done():
+                self.release(client)  # slot was handed over just as we were cancelled
+            else:
+                self._forget(client, future)
+                self._per_client[client] -= 1
+            raise
+        if not future.done():
+            future.cancel()
+            self._forget(client, future)
+            self._per_client[client] -= 1
+            raise self._reject("wait_timeout")
+        self.stats["admitted"] += 1  # the releasing request's slot is now ours
+
+    def release(self, client: str) -> None:
+        self._per_client[client] -= 1
+        if self._per_client[client] <= 0:
+            del self._per_client[client]
+        if not self._hand_off():
+            self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, client: str):
+        """Hold one analysis slot for the enclosed block; raises Overloaded if not admitted."""
+        await self.acquire(client)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.service_seconds += SERVICE_TIME_ALPHA * (elapsed - self.service_seconds)
+            self.release(client)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "clients_waiting": len(self._waiters),
+            "avg_service_seconds": round(self.service_seconds, 2),
+            "retry_after": self.retry_after(),
+            **self.stats,
+        }
+
+
+admission = AdmissionController()
@@ -1,11 +1,71 @@
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Header, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+import asyncio
+import hashlib
+import json
 import os
-from backend.data import fetch_post_data
+import threading
+from backend.data import PostCache, fetch_failed, fetch_post_data, get_reddit_client, submission_id
+from backend.profiling import ProfilingMiddleware
+from backend.comment_index import index_post
 app = FastAPI()
+# Opt-in per-request profiling (X-Profile header + X-Admin-Token), see backend/profiling.py.
+# Both endpoints fetch in the threadpool, so only sample mode sees their work.
+app.add_middleware(ProfilingMiddleware, paths=["/post", "/posts"], threaded_paths=["/post", "/posts"])
+
+# Fetched posts are served from memory for this long; clients revalidate with ETags.
+POST_TTL_SECONDS = int(os.getenv("POST_TTL_SECONDS", "120"))
+POST_CACHE_ENTRIES = 2000
+MAX_BULK_POSTS = 100
+MAX_BULK_CONCURRENCY = 8
+
+post_cache = PostCache(ttl_seconds=POST_TTL_SECONDS, max_entries=POST_CACHE_ENTRIES)
+_reddit = None
+_reddit_lock = threading.Lock()
+
+
+class PostsRequest(BaseModel):
+    urls_or_ids: List[str] = Field(..., min_length=1, max_length=MAX_BULK_POSTS)
+    max_comments: int = 100
+    concurrency: int = Field(4, ge=1, le=MAX_BULK_CONCURRENCY)
+    # Per-post If-None-Match: submission ID -> ETag from an earlier response
+    etags: Dict[str, str] = {}
+
+
+def _reddit_client():
+    # One read-only client shared by every fetch instead of a new one per call
+    global _reddit
+    with _reddit_lock:
+        if _reddit is None:
+            _reddit = get_reddit_client()
+        return _reddit
+
+
+def _etag(post: dict) -> str:
+    return '"%s"' % hashlib.sha256(json.dumps(post, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+def _cached_post(post_id: str, max_comments: int) -> dict:
+    """{"post", "etag"} for a submission, from the TTL cache or freshly fetched."""
+    def _fetch() -> dict:
+        post = fetch_post_data(post_id, max_comments=max_comments, reddit=_reddit_client())
+        index_post(post)
+        return {"post": post, "etag": _etag(post)}
+    return post_cache.get_or_fetch(f"{post_id}:{max_comments}", _fetch,
+                                   failed=lambda entry: fetch_failed(entry["post"]))
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
 
 @app.get("/")
 def root():
-    return {"status": "ok", "endpoints": ["/post?url_or_id=<reddit_url_or_id>"]}
+    return {"status": "ok", "endpoints": ["/post?url_or_id=<reddit_url_or_id>", "POST /posts"]}
 
 @app.get("/debug/env")
 def debug_env():
@@ -25,9 +85,51 @@ def debug_env():
 
 @app.get("/post")
 def post(url_or_id: str = Query(..., description="Reddit URL or base36 ID"),
-         max_comments: int = 100):
+         max_comments: int = 100,
+         if_none_match: Optional[str] = Header(None)):
     try:
-        return fetch_post_data(url_or_id, max_comments=max_comments)
+        entry = _cached_post(submission_id(url_or_id), max_comments)
     except Exception as e:
         # Return explicit error message for easier debugging (e.g., 401 due to env/creds)
-        raise HTTPException(status_code=500, detail=f"Failed to fetch post: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to fetch post: {e}")
+    headers = {"ETag": entry["etag"], "Cache-Control": f"max-age={POST_TTL_SECONDS}"}
+    if _etag_matches(if_none_match, entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(entry["post"], headers=headers)
+
+@app.post("/posts")
+async def posts(request: PostsRequest):
+    """
+    Fetch many posts concurrently. Inputs are deduplicated by submission ID and
+    results are streamed as NDJSON, one line per post in completion order:
+    {"id", "inputs", "status": 200|304|404|500, "etag", "post" | "error"}.
+    A post whose ETag is given in `etags` and still matches comes back as 304
+    without its body.
+    """
+    inputs: Dict[str, List[str]] = {}
+    bad: List[str] = []
+    for raw in request.urls_or_ids:
+        try:
+            inputs.setdefault(submission_id(raw), []).append(raw)
+        except Exception:
+            bad.append(raw)
+    semaphore = asyncio.Semaphore(request.concurrency)
+
+    async def one(post_id: str) -> dict:
+        async with semaphore:
+            try:
+                entry = await asyncio.to_thread(_cached_post, post_id, request.max_comments)
+            except Exception as e:
+                return {"id": post_id, "inputs": inputs[post_id], "status": 500, "error": str(e)}
+        line = {"id": post_id, "inputs": inputs[post_id], "etag": entry["etag"]}
+        if _etag_matches(request.etags.get(post_id), entry["etag"]):
+            return {**line, "status": 304}
+        return {**line, "status": 200, "post": entry["post"]}
+
+    async def stream():
+        for raw in bad:
+            yield json.dumps({"id": None, "inputs": [raw], "status": 404, "error": "Not a Reddit post URL or ID"}) + "\n"
+        for finished in asyncio.as_completed([one(post_id) for post_id in inputs]):
+            yield json.dumps(await finished, default=str) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
\ No newline at end of file
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark comment traversal on large synthetic threads.
+
+Compares the old approach (flatten the whole forest with .list(), then slice)
+against data.iter_top_comments, which stops after `max_comments` usable comments.
+Reports wall time and peak traced memory for each.
+
+    python backend/bench_comments.py --comments 20000 --max-comments 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, List
+
+try:
+    from .data import iter_top_comments  # type: ignore
+except Exception:
+    from data import iter_top_comments  # type: ignore
+
+
+class FakeComment:
+    __slots__ = ("id", "body", "score", "replies")
+
+    def __init__(self, cid: int, body: str, score: int) -> None:
+        self.id = f"c{cid}"
+        self.body = body
+        self.score = score
+        self.replies: List["FakeComment"] = []
+
+
+class FakeForest(list):
+    def list(self) -> List[FakeComment]:
+        # Same breadth-first flattening as praw's CommentForest.list()
+        out: List[FakeComment] = []
+        queue = deque(self)
+        while queue:
+            c = queue.popleft()
+            out.append(c)
+            queue.extend(c.replies)
+        return out
+
+
+def make_thread(n: int, top_level: int, deleted_ratio: float, seed: int = 0) -> FakeForest:
+    rng = random.Random(seed)
+    forest = FakeForest()
+    nodes: List[FakeComment] = []
+    for i in range(n):
+        body = "[deleted]" if rng.random() < deleted_ratio else "comment text " * rng.randint(1, 40)
+        c = FakeComment(i, body, int(rng.paretovariate(1.2)))
+        if i < top_level or not nodes:
+            forest.append(c)
+        else:
+            rng.choice(nodes).replies.append(c)
+        nodes.append(c)
+    return forest
+
+
+def flatten_then_slice(forest: FakeForest, max_comments: int) -> List[Any]:
+    flat = list(forest.list())
+    return [c for c in flat[:max_comments] if hasattr(c, "body")]
+
+
+def bounded_traversal(forest: FakeForest, max_comments: int) -> List[Any]:
+    return list(iter_top_comments(forest, max_comments))
+
+
+def measure(fn: Callable[[FakeForest, int], List[Any]], forest: FakeForest, max_comments: int, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(forest, max_comments)
+    elapsed = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    result = fn(forest, max_comments)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(result)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark comment traversal strategies on synthetic threads.")
+    ap.add_argument("--comments", type=int, nargs="+", default=[1000, 10000, 50000])
+    ap.add_argument("--max-comments", type=int, default=30)
+    ap.add_argument("--top-level", type=int, default=300)
+    ap.add_argument("--deleted-ratio", type=float, default=0.1)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"{'thread':>8} {'strategy':>20} {'ms':>9} {'peak KiB':>10} {'returned':>9}")
+    for n in args.comments:
+        forest = make_thread(n, args.top_level, args.deleted_ratio)
+        for name, fn in (("flatten+slice", flatten_then_slice), ("iter_top_comments", bounded_traversal)):
+            elapsed, peak, count = measure(fn, forest, args.max_comments, args.repeat)
+            print(f"{n:>8} {name:>20} {elapsed * 1000:>9.2f} {peak / 1024:>10.1f} {count:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark the comment encoder on realistic Reddit length distributions.
+
+Compares a plain `embedder.encode(texts)` call (the old analyze_comment path)
+against Classification.encode_comments, which buckets inputs by token length
+and chunks over-length comments instead of truncating them. Reports throughput
+(comments/s and real tokens/s), how many comments the plain call truncated, and
+how close the two embeddings are for comments that fit the model.
+
+Comment lengths are drawn from a log-normal fitted to Reddit review threads:
+mostly one- or two-sentence replies with a long tail of multi-paragraph reviews.
+
+    python backend/bench_encoder.py --comments 2000 --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Callable, List
+
+import numpy as np
+
+try:
+    from .Classification import embedder, encode_comments  # type: ignore
+except Exception:
+    from Classification import embedder, encode_comments  # type: ignore
+
+WORDS = ("battery screen keyboard price great terrible fast slow worth bought returned love hate "
+         "performance build quality fans heat ports display speakers trackpad support warranty "
+         "the a it is was and but really after months honestly would recommend again").split()
+
+# (name, mu, sigma) of log-normal word counts
+DISTRIBUTIONS = {
+    "replies": (2.8, 0.8),      # short thread replies, median ~16 words
+    "mixed": (3.3, 1.0),        # typical search results, median ~27 words, some essays
+    "reviews": (4.3, 0.9),      # long-form review posts, median ~75 words
+}
+
+
+def make_comments(n: int, mu: float, sigma: float, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        words = max(2, min(3000, int(rng.lognormvariate(mu, sigma))))
+        sentences, current = [], []
+        for _ in range(words):
+            current.append(rng.choice(WORDS))
+            if len(current) >= rng.randint(8, 20):
+                sentences.append(" ".join(current).capitalize() + ".")
+                current = []
+        if current:
+            sentences.append(" ".join(current).capitalize() + ".")
+        out.append(" ".join(sentences))
+    return out
+
+
+def measure(fn: Callable[[List[str]], np.ndarray], texts: List[str], repeat: int):
+    fn(texts[:32])  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(texts)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comments", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--distribution", choices=[*DISTRIBUTIONS, "all"], default="all")
+    args = parser.parse_args()
+
+    limit = embedder.max_seq_length - 2
+    names = list(DISTRIBUTIONS) if args.distribution == "all" else [args.distribution]
+    print(f"{'distribution':<12} {'method':<10} {'comments/s':>11} {'tokens/s':>10} {'truncated':>10} {'cos(fit)':>9}")
+    for name in names:
+        texts = make_comments(args.comments, *DISTRIBUTIONS[name])
+        token_counts = [len(ids) for ids in embedder.tokenizer(texts, add_special_tokens=False,
+                                                                verbose=False)["input_ids"]]
+        total_tokens = sum(token_counts)
+        truncated = sum(1 for n in token_counts if n > limit)
+
+        plain_time, plain = measure(lambda t: embedder.encode(t, convert_to_numpy=True), texts, args.repeat)
+        bucket_time, bucketed = measure(encode_comments, texts, args.repeat)
+
+        fits = np.array([n <= limit for n in token_counts])
+        a, b = plain[fits], bucketed[fits]
+        cos = float(np.mean(np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))))
+        for method, elapsed, trunc, similarity in (("plain", plain_time, truncated, ""),
+                                                   ("bucketed", bucket_time, 0, f"{cos:.4f}")):
+            print(f"{name:<12} {method:<10} {len(texts) / elapsed:>11.0f} {total_tokens / elapsed:>10.0f} "
+                  f"{trunc:>10} {similarity:>9}")
+
+
+if __name__ == "__main__":
+    main()
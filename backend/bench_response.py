@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark /analyze response encoding: payload size and serialization time.
+
+Builds realistic analysis responses (comment texts, pros/cons with URLs,
+similar products, run info) and compares, for the full response and for
+?fields=summary:
+  - fastapi: jsonable_encoder + json.dumps, what FastAPI does by default
+  - json:    encoding.dumps_json (orjson when installed)
+  - msgpack: encoding.dumps_msgpack (skipped when msgpack is missing)
+Reports raw and gzipped bytes and microseconds per response.
+
+    python backend/bench_response.py --responses 200 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+
+try:
+    from . import encoding  # type: ignore
+except Exception:
+    import encoding  # type: ignore
+
+WORDS = ("battery screen keyboard price great terrible fast slow worth bought returned love hate "
+         "performance build quality fans heat ports display speakers trackpad support warranty "
+         "the a it is was and but really after months honestly would recommend again").split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _url(rng: random.Random) -> str:
+    return f"https://www.reddit.com/r/{rng.choice(['laptops', 'apple', 'buildapc'])}/comments/" \
+           f"{rng.getrandbits(32):x}/_/{rng.getrandbits(32):x}/"
+
+
+def make_response(rng: random.Random) -> Dict[str, Any]:
+    """One analysis response shaped like server._run_analysis's output."""
+    return {
+        "final_rating": rng.uniform(1, 5),
+        "subscores": [rng.uniform(1, 5) for _ in range(4)],
+        "ai_summary": " ".join(_sentence(rng, rng.randint(10, 25)) for _ in range(5)),
+        "comments": [[_sentence(rng, int(rng.lognormvariate(3.3, 1.0)) + 2), _url(rng)] for _ in range(5)],
+        "pros": [(_sentence(rng, rng.randint(4, 12)), _url(rng)) for _ in range(5)],
+        "cons": [(_sentence(rng, rng.randint(4, 12)), _url(rng)) for _ in range(5)],
+        "similar_products": [f"Product {rng.randint(1, 999)}" for _ in range(3)],
+        "posts_used": rng.randint(3, 10),
+        "degraded": [],
+        "llm_tokens": rng.randint(2000, 20000),
+    }
+
+
+def fastapi_default(content: Any) -> bytes:
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def measure(fn: Callable[[Any], bytes], payloads: List[Any], repeat: int):
+    fn(payloads[0])  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encoded = [fn(p) for p in payloads]
+    elapsed = (time.perf_counter() - start) / (repeat * len(payloads))
+    raw = sum(len(e) for e in encoded) / len(encoded)
+    zipped = sum(len(gzip.compress(e)) for e in encoded) / len(encoded)
+    return elapsed, raw, zipped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--responses", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    responses = [make_response(rng) for _ in range(args.responses)]
+    encoders = [("fastapi", fastapi_default),
+                ("orjson" if encoding.orjson is not None else "json", encoding.dumps_json)]
+    if encoding.msgpack is not None:
+        encoders.append(("msgpack", encoding.dumps_msgpack))
+
+    print(f"{'fields':<8} {'encoder':<9} {'bytes':>8} {'gzipped':>8} {'us/resp':>8}")
+    for label, fields in (("all", None), ("summary", encoding.parse_fields("summary"))):
+        payloads = [encoding.select_fields(r, fields) for r in responses]
+        for name, fn in encoders:
+            elapsed, raw, zipped = measure(fn, payloads, args.repeat)
+            print(f"{label:<8} {name:<9} {raw:>8.0f} {zipped:>8.0f} {elapsed * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark memory and classification throughput for 1, 2, 4 and 8 workers.
+
+Two modes are compared:
+  shared      models loaded once in the parent, workers forked (what serve.py does)
+  per-worker  each worker is a fresh process that loads the models itself
+              (what `uvicorn --workers N` does)
+
+Each worker runs analyze_comment on batches of synthetic Reddit-length comments
+for a fixed time, then reports how many comments it classified plus its RSS and
+PSS (proportional set size, which splits shared pages between processes and so
+shows the real total footprint). Linux only (reads /proc/self/smaps_rollup).
+
+    python bench_workers.py --workers 1 2 4 8 --seconds 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import random
+import time
+from typing import Dict, List
+
+WORDS = ("battery screen keyboard price great terrible fast slow worth bought returned love hate "
+         "performance build quality fans heat ports display speakers trackpad support warranty").split()
+
+
+def _comments(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    # Roughly log-normal lengths: mostly one-liners with a long tail of essays.
+    return [" ".join(rng.choice(WORDS) for _ in range(max(3, int(rng.lognormvariate(3.0, 0.9))))) for _ in range(n)]
+
+
+def _memory_kib() -> Dict[str, int]:
+    out = {"rss": 0, "pss": 0}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key.lower() in out:
+                out[key.lower()] = int(value.split()[0])
+    return out
+
+
+def _worker(threads: int, seconds: float, batch: int, results) -> None:
+    from Classification import analyze_comment, configure_worker_threads
+
+    configure_worker_threads(threads)
+    comments = _comments(batch, seed=os.getpid())
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        asyncio.run(analyze_comment(comments))
+        done += len(comments)
+    results.put({"comments": done, **_memory_kib()})
+
+
+def run(mode: str, workers: int, threads: int, seconds: float, batch: int) -> Dict[str, float]:
+    ctx = mp.get_context("fork" if mode == "shared" else "spawn")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(threads, seconds, batch, results)) for _ in range(workers)]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    reports = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "comments_per_s": sum(r["comments"] for r in reports) / seconds,
+        "rss_mib": sum(r["rss"] for r in reports) / 1024,
+        "pss_mib": sum(r["pss"] for r in reports) / 1024,
+        "wall_s": elapsed,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Compare RSS/PSS and throughput of shared vs per-worker model loading.")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--batch", type=int, default=64, help="comments per analyze_comment call")
+    ap.add_argument("--threads-per-worker", type=int, default=None)
+    args = ap.parse_args()
+
+    import Classification
+
+    Classification.share_model_memory()
+
+    print(f"{'mode':>10} {'workers':>7} {'threads':>7} {'comments/s':>11} {'RSS MiB':>9} {'PSS MiB':>9}")
+    for workers in args.workers:
+        threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        for mode in ("shared", "per-worker"):
+            r = run(mode, workers, threads, args.seconds, args.batch)
+            print(f"{mode:>10} {workers:>7} {threads:>7} {r['comments_per_s']:>11.1f} {r['rss_mib']:>9.1f} {r['pss_mib']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,363 @@
+"""
+Shared cache for LLM results, with pluggable storage backends.
+
+script.py, calculate.py and simprod.py all use the dict-like object returned by
+load_cache() (`key in cache`, `cache[key]`, `cache[key] = value`) and call
+save_cache(cache) after writing. The backend is chosen with CACHE_BACKEND:
+
+  memory  process-local dict (nothing persisted)
+  disk    cache.json in the working directory (the default, as before)
+  redis   any Redis-protocol server at CACHE_URL, shared by every instance
+
+A small in-process LRU (L1) sits in front of the backend so repeated reads in a
+request don't go over the network. Several worker processes (serve.py) can
+share the disk backend: flush() merges this process's writes into cache.json
+under a file lock, and reads pick up entries other workers have written. get_many/set_many batch several keys into a
+single round trip (MGET / pipelined SETs for Redis).
+"""
+
 import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+__all__ = ["CACHE_FILE", "load_cache", "save_cache"]
 
 CACHE_FILE = "cache.json"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "disk")
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "reviewradar:")
+# Entries expire from Redis after this many seconds (0 = never).
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "0"))
+L1_SIZE = 1024
+# How long an L1 entry is trusted before re-reading the shared backend.
+L1_TTL_SECONDS = 300
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock on `path`.lock, shared by every process on this machine."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        return {k: self._data[k] for k in keys if k in self._data}
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        self._data.update(items)
+
+    def keys(self) -> List[str]:
+        return list(self._data.keys())
+
+    def flush(self) -> None:
+        pass
+
+
+class DiskBackend(MemoryBackend):
+    """
+    The original cache.json file. It is re-read whenever another process has
+    replaced it, and flush() merges only this process's unsaved keys into the
+    current file under file_lock, so concurrent workers don't drop each
+    other's entries.
+    """
+
+    def __init__(self, path: str = CACHE_FILE):
+        super().__init__()
+        self.path = path
+        self._pending: Dict[str, Any] = {}
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self._reload()
+
+    def _read_file(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _reload(self) -> None:
+        mtime = self._file_mtime()
+        if mtime is not None and mtime == self._mtime:
+            return
+        data = self._read_file()
+        data.update(self._pending)
+        self._data = data
+        self._mtime = mtime
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        with self._lock:
+            self._reload()
+            return super().get_many(keys)
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        with self._lock:
+            super().set_many(items)
+            self._pending.update(items)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            self._reload()
+            return super().keys()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            with file_lock(self.path):
+                data = self._read_file()
+                data.update(self._pending)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+                self._data = data
+                self._pending = {}
+                self._mtime = self._file_mtime()
+
+
+class RedisBackend:
+    """
+    Minimal RESP2 client (no redis-py dependency) for a shared network cache.
+    Values are stored JSON-encoded under CACHE_PREFIX.
+    """
+
+    def __init__(self, url: str = CACHE_URL, prefix: str = CACHE_PREFIX,
+                 ttl_seconds: int = CACHE_TTL_SECONDS, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(["AUTH", self.password])
+        if self.db:
+            setup.append(["SELECT", str(self.db)])
+        if setup:
+            self._send(setup)
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    @staticmethod
+    def _encode(args: List[Any]) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(f"Redis error: {rest.decode()}")
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length == -1:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length == -1 else [self._read_reply() for _ in range(length)]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+    def _send(self, commands: List[List[Any]]) -> List[Any]:
+        """Pipeline: write all commands in one packet, then read every reply."""
+        self._sock.sendall(b"".join(self._encode(c) for c in commands))
+        return [self._read_reply() for _ in commands]
+
+    def _pipeline(self, commands: List[List[Any]]) -> List[Any]:
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send(commands)
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt:
+                        raise
+                except Exception:
+                    # e.g. an -ERR reply: the pipeline's remaining replies are still
+                    # unread, so the connection can't be reused for the next command.
+                    self._close()
+                    raise
+        return []
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        (values,) = self._pipeline([["MGET", *[self.prefix + k for k in keys]]])
+        return {k: json.loads(v) for k, v in zip(keys, values) if v is not None}
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        if not items:
+            return
+        ttl = ["EX", self.ttl_seconds] if self.ttl_seconds else []
+        self._pipeline([["SET", self.prefix + k, json.dumps(v), *ttl] for k, v in items.items()])
+
+    def keys(self) -> List[str]:
+        found: List[str] = []
+        cursor = "0"
+        while True:
+            ((cursor, batch),) = self._pipeline([["SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 1000]])
+            found.extend(k.decode()[len(self.prefix):] for k in batch)
+            cursor = cursor.decode() if isinstance(cursor, bytes) else cursor
+            if cursor == "0":
+                return found
+
+    def flush(self) -> None:
+        pass  # writes go straight to the server
+
+
+class Cache:
+    """Dict-like front end: an LRU L1 in front of a storage backend."""
+
+    def __init__(self, backend, l1_size: int = L1_SIZE, l1_ttl: float = L1_TTL_SECONDS):
+        self.backend = backend
+        self.l1_size = l1_size
+        self.l1_ttl = l1_ttl
+        self._l1: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"l1_hits": 0, "backend_hits": 0, "misses": 0}
+
+    def _l1_get(self, key: str):
+        entry = self._l1.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.l1_ttl:
+            return None
+        self._l1.move_to_end(key)
+        return entry
+
+    def _l1_put(self, key: str, value: Any) -> None:
+        self._l1[key] = (time.monotonic(), value)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_size:
+            self._l1.popitem(last=False)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        with self._lock:
+            for key in keys:
+                entry = self._l1_get(key)
+                if entry is not None:
+                    found[key] = entry[1]
+                    self.stats["l1_hits"] += 1
+                else:
+                    missing.append(key)
+        if missing:
+            fetched = self.backend.get_many(missing)
+            with self._lock:
+                for key, value in fetched.items():
+                    self._l1_put(key, value)
+                self.stats["backend_hits"] += len(fetched)
+                self.stats["misses"] += len(missing) - len(fetched)
+            found.update(fetched)
+        return found
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        with self._lock:
+            for key, value in items.items():
+                self._l1_put(key, value)
+        self.backend.set_many(items)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.get_many([key])
+
+    def __getitem__(self, key: str) -> Any:
+        found = self.get_many([key])
+        if key not in found:
+            raise KeyError(key)
+        return found[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.set_many({key: value})
+
+    def keys(self) -> List[str]:
+        return self.backend.keys()
+
+    def flush(self) -> None:
+        self.backend.flush()
+
+
+def make_backend(name: str = CACHE_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "disk":
+        return DiskBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"Unknown CACHE_BACKEND: {name!r} (expected memory, disk or redis)")
+
+
+_cache: Optional[Cache] = None
+_cache_lock = threading.Lock()
+
+
+def load_cache() -> Cache:
+    """Return the process-wide cache (every module shares one instance)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = Cache(make_backend())
+        return _cache
 
-def load_cache():
-    try:
-        with open(CACHE_FILE, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
 
-def save_cache(cache):
-    with open(CACHE_FILE, "w") as f:
-        json.dump(cache, f)
\ No newline at end of file
+def save_cache(cache) -> None:
+    cache.flush()
@@ -5,32 +5,33 @@
 import math
 import asyncio
 import os
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from cache import *
 import hashlib
+import llm
+import usage
 load_dotenv()
 cache = load_cache()
-API_KEY = os.getenv("subscription_key")
 MODEL = "gpt-5-mini"
-client = AsyncOpenAI(
-    api_key=API_KEY
-)
 
-async def summary(processed) -> str:
+async def summary(processed, allow_llm=True) -> str:
     normalized = sorted(processed)
     joined = "\n".join(normalized) + "sum"
     hash_value = hashlib.sha256(joined.encode()).hexdigest()
     cache_key = hash_value
     if cache_key in cache:
         print("Cache hit")
+        usage.record_cache_hit("summary")
         summary = cache[cache_key]
         return summary
+    if not allow_llm or not usage.allows("summary"):
+        return None
     prompt = f"""Given is a list of 5 Reddit comments reviewing a product,
     give a quick summary for a potential buyer.
     Reviews: {processed}
     """
-    response = await client.responses.create(
+    response = await llm.create_response(
+        llm.get_client(), "summary",
         model=MODEL,
         input=prompt,
         max_output_tokens=500
@@ -44,10 +45,11 @@ async def compute_score(metrics):
     return sum(valid_metrics) / len(valid_metrics) if valid_metrics else 0.0
 
 async def compute_weight(weight_factors, credibility):
-    if not weight_factors or len(weight_factors) != 4:
+    if not weight_factors or len(weight_factors) < 4:
         return 1.0
 
-    upvotes, karma, karma2, time_ago = weight_factors
+    # a fifth factor, the comment's created_utc, only dates the comment (score_history)
+    upvotes, karma, karma2, time_ago = weight_factors[:4]
     if ((karma or 0) < 0):
         karma = 0
     if ((karma2 or 0) < 0):
@@ -63,13 +65,79 @@ async def compute_weight(weight_factors, credibility):
 
     return 0.32 * upvote_w + 0.08  * karma_w + 0.24 * karma2_w + 0.2 * time_w + 0.24 * credibility_w
 
-async def process_comments(comments):
+class RunningAggregate:
+    """
+    Incremental version of the weighted aggregation in process_comments.
+
+    Comments can be folded in one at a time (e.g. post by post while later posts are
+    still being fetched), and final_metrics/final_score are available at any point.
+    Also tracks enough moments to estimate the uncertainty of final_score, and each
+    comment's weight in the order added (so process_comments can reuse them).
+    """
+
+    def __init__(self):
+        self.total_weight = 0.0
+        self.weight_sq_sum = 0.0
+        self.count = 0
+        self.weighted_metrics_sum = [0.0, 0.0, 0.0, 0.0]
+        self.total_metric_weights = [0.0, 0.0, 0.0, 0.0]
+        # weighted moments of each comment's own score (mean of its valid metrics, 1-5 scale)
+        self.weighted_score_sum = 0.0
+        self.weighted_score_sq_sum = 0.0
+        self.weights = []
+
+    def add(self, metrics, weight):
+        self.weights.append(weight)
+        self.count += 1
+        self.total_weight += weight
+        self.weight_sq_sum += weight * weight
+        valid = []
+        for i in range(4):
+            if metrics[i] >= 0:  # skip negative metrics
+                self.weighted_metrics_sum[i] += metrics[i] * weight
+                self.total_metric_weights[i] += weight
+                valid.append(metrics[i] + 1)
+        if valid:
+            score = sum(valid) / len(valid)
+            self.weighted_score_sum += score * weight
+            self.weighted_score_sq_sum += score * score * weight
+
+    @property
+    def final_metrics(self):
+        if self.total_weight == 0:
+            return [0.0, 0.0, 0.0, 0.0]
+        return [
+            (self.weighted_metrics_sum[i] / self.total_metric_weights[i]) +1 if self.total_metric_weights[i] > 0 else 0.0
+            for i in range(4)
+        ]
+
+    @property
+    def final_score(self):
+        if self.total_weight == 0:
+            return 0.0
+        nonzero = [m for m in self.final_metrics if m != 0]
+        return sum(nonzero) / len(nonzero) if nonzero else 0.0
+
+    def uncertainty(self, z=1.96):
+        """Half-width of an approximate confidence interval on final_score (inf if < 2 comments)."""
+        if self.count < 2 or self.total_weight == 0:
+            return math.inf
+        mean = self.weighted_score_sum / self.total_weight
+        variance = max(self.weighted_score_sq_sum / self.total_weight - mean * mean, 0.0)
+        effective_n = self.total_weight ** 2 / self.weight_sq_sum
+        return z * math.sqrt(variance / effective_n)
+
+
+async def process_comments(comments, allow_llm=True, aggregate=None):
+    # allow_llm=False only serves the summary from cache; a cache miss (or a failed
+    # summary call) returns summ=None so the caller can fall back to a stale summary.
+    # aggregate, if given, already has the valid comments folded in, in order (e.g.
+    # by the streaming pipeline); its weights and score are reused as they are.
     processed_full = []  
     comments_with_weight = []  
-    total_weight = 0.0
-    weighted_score_sum = 0.0
-    weighted_metrics_sum = [0.0, 0.0, 0.0, 0.0]
-    total_metric_weights = [0.0, 0.0, 0.0, 0.0]
+    folded = aggregate.weights if aggregate is not None else None
+    if aggregate is None:
+        aggregate = RunningAggregate()
 
     for c in comments:
         text, url, metrics, weight_factors = c
@@ -77,41 +145,27 @@ async def process_comments(comments):
             continue
 
         score = await compute_score(metrics)
-        weight = await compute_weight(weight_factors, metrics[-1])
+        if folded is not None:
+            weight = folded[len(processed_full)]
+        else:
+            weight = await compute_weight(weight_factors, metrics[-1])
+            aggregate.add(metrics, weight)
 
         processed_full.append([text, url, score, metrics, weight])
         comments_with_weight.append(((text, url), weight))
 
-        total_weight += weight
-        weighted_score_sum += score * weight
-        for i in range(4):
-            if metrics[i] >= 0:  # skip negative metrics
-                weighted_metrics_sum[i] += metrics[i] * weight
-                total_metric_weights[i] += weight
-
     comments_with_weight.sort(key=lambda x: x[1], reverse=True)
     processed = [text for text, _ in comments_with_weight]
 
-    if total_weight == 0:
-        final_score = 0.0
-        final_metrics = [0.0, 0.0, 0.0, 0.0]
-    else:
-        # final_score = weighted_score_sum / total_weight
-        final_metrics = [
-            (weighted_metrics_sum[i] / total_metric_weights[i]) +1 if total_metric_weights[i] > 0 else 0.0
-            for i in range(4)
-        ]
-        sum = 0
-        count = 0
-        for i in range(4):
-            if (final_metrics[i] != 0):
-                sum += final_metrics[i]
-                count += 1
-        final_score = sum/count
-        
+    final_score = aggregate.final_score
+    final_metrics = aggregate.final_metrics
 
     top5 = [text for text, _ in processed[:5]]
-    summ = await summary(top5)
+    try:
+        summ = await summary(top5, allow_llm=allow_llm)
+    except Exception as e:
+        print(f"⚠️ Summary failed: {type(e).__name__}: {e}")
+        summ = None
 
     return processed, final_score, final_metrics, summ
 
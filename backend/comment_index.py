@@ -0,0 +1,203 @@
+"""
+Persistent local full-text index of every post and comment fetched from Reddit.
+
+Each post fetched through data.iter_fetch_posts (search, fan-out, adaptive),
+the Google source or api.py is written to a SQLite database. The post's
+metadata and comments go in plain tables, and its title and comment text go
+in an FTS5 table. get_reddit_tuples(source="local") answers from here when
+enough fresh posts match, and only goes to the Reddit API for the gap, so
+repeat and related product queries need next to no Reddit calls. Like the
+Reddit query, a local match needs the product and "review" in the title, and
+Reddit is skipped only once at least INDEX_MIN_POSTS such posts are indexed.
+The source is opt-in (REDDIT_TUPLE_SOURCE=local).
+
+Import this module as backend.comment_index (like data.py does): under two
+names it would hold two separate indexes.
+
+The database path is COMMENT_INDEX_PATH (default comment_index.db; set it to an
+empty string to disable indexing). SQLite runs in WAL mode with one connection
+per thread, so concurrent requests and pre-forked workers can share the file.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+INDEX_PATH = os.getenv("COMMENT_INDEX_PATH", "comment_index.db")
+# Indexed posts older than this are refetched rather than served locally.
+INDEX_MAX_AGE_SECONDS = 24 * 60 * 60
+# Fewer matching fresh posts than this is not enough coverage to skip Reddit search.
+INDEX_MIN_POSTS = int(os.getenv("INDEX_MIN_POSTS", "3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    subreddit TEXT,
+    title TEXT,
+    score INTEGER,
+    created_utc REAL,
+    permalink TEXT,
+    fetched_at REAL NOT NULL,
+    post_json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS comments (
+    id TEXT PRIMARY KEY,
+    post_id TEXT NOT NULL,
+    author TEXT,
+    body TEXT NOT NULL,
+    score INTEGER,
+    created_utc REAL,
+    author_link_karma INTEGER,
+    author_comment_karma INTEGER,
+    comment_url TEXT,
+    comment_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comments_post_id ON comments(post_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(
+    post_id UNINDEXED, title, body, tokenize='porter unicode61'
+);
+"""
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def title_query(product_name: str, require_review: bool = True) -> Optional[str]:
+    """
+    FTS5 query matching the product name as a phrase in post titles, and (like the
+    Reddit query's title:review) the word review/reviews. None if it has no words.
+    """
+    words = _WORD.findall(product_name.lower())
+    if not words:
+        return None
+    query = f'title : "{" ".join(words)}"'
+    return f"{query} AND title : review" if require_review else query
+
+
+class CommentIndex:
+    def __init__(self, path: str = INDEX_PATH) -> None:
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add_post(self, record: Dict[str, Any]) -> bool:
+        """Upsert one {"post", "comments"} record from data.fetch_post_data. Returns False if skipped."""
+        post = record.get("post") or {}
+        comments = [c for c in record.get("comments") or [] if isinstance(c, dict) and "error" not in c]
+        if not post.get("id") or len(comments) != len(record.get("comments") or []):
+            return False  # a post whose comments failed would look like a post without comments
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (post["id"], post.get("subreddit"), post.get("title"), post.get("score"),
+                 post.get("created_utc"), post.get("permalink"), now, json.dumps(post, ensure_ascii=False)),
+            )
+            conn.execute("DELETE FROM comments WHERE post_id = ?", (post["id"],))
+            conn.executemany(
+                "INSERT OR REPLACE INTO comments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(c.get("id") or c.get("comment_url"), post["id"], c.get("author"), c.get("body") or "",
+                  c.get("score"), c.get("created_utc"), c.get("author_link_karma"),
+                  c.get("author_comment_karma"), c.get("comment_url"), json.dumps(c, ensure_ascii=False))
+                 for c in comments],
+            )
+            conn.execute("DELETE FROM post_fts WHERE post_id = ?", (post["id"],))
+            conn.execute("INSERT INTO post_fts (post_id, title, body) VALUES (?, ?, ?)",
+                         (post["id"], post.get("title") or "", "\n".join(c.get("body") or "" for c in comments)))
+        return True
+
+    def _records(self, post_ids: List[str]) -> List[Dict[str, Any]]:
+        if not post_ids:
+            return []
+        conn = self._connect()
+        marks = ",".join("?" * len(post_ids))
+        posts = {pid: json.loads(pj) for pid, pj in
+                 conn.execute(f"SELECT id, post_json FROM posts WHERE id IN ({marks})", post_ids)}
+        comments: Dict[str, List[Dict[str, Any]]] = {pid: [] for pid in post_ids}
+        for pid, cj in conn.execute(
+                f"SELECT post_id, comment_json FROM comments WHERE post_id IN ({marks}) ORDER BY score DESC",
+                post_ids):
+            comments[pid].append(json.loads(cj))
+        return [{"post": posts[pid], "comments": comments[pid]} for pid in post_ids if pid in posts]
+
+    def search(self, product_name: str, limit: int, max_age_seconds: Optional[float] = INDEX_MAX_AGE_SECONDS,
+               max_comments: Optional[int] = None, require_review: bool = True) -> List[Dict[str, Any]]:
+        """Fresh indexed posts whose title matches the product, best BM25 match first, as fetch_post_data records."""
+        query = title_query(product_name, require_review)
+        if query is None:
+            return []
+        min_fetched = time.time() - max_age_seconds if max_age_seconds is not None else 0
+        rows = self._connect().execute(
+            "SELECT post_fts.post_id FROM post_fts JOIN posts ON posts.id = post_fts.post_id "
+            "WHERE post_fts MATCH ? AND posts.fetched_at >= ? "
+            "ORDER BY bm25(post_fts), posts.score DESC LIMIT ?",
+            (query, min_fetched, limit),
+        ).fetchall()
+        records = self._records([r[0] for r in rows])
+        if max_comments is not None:
+            for rec in records:
+                rec["comments"] = rec["comments"][:max_comments]
+        return records
+
+    def fresh_ids(self, post_ids: Iterable[str], max_age_seconds: float = INDEX_MAX_AGE_SECONDS) -> Set[str]:
+        ids = list(post_ids)
+        if not ids:
+            return set()
+        marks = ",".join("?" * len(ids))
+        rows = self._connect().execute(
+            f"SELECT id FROM posts WHERE id IN ({marks}) AND fetched_at >= ?",
+            (*ids, time.time() - max_age_seconds),
+        )
+        return {r[0] for r in rows}
+
+    def get_records(self, post_ids: List[str]) -> List[Dict[str, Any]]:
+        return self._records(post_ids)
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        return {
+            "posts": conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0],
+            "comments": conn.execute("SELECT COUNT(*) FROM comments").fetchone()[0],
+        }
+
+
+_index: Optional[CommentIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> Optional[CommentIndex]:
+    """The process-wide index, or None when COMMENT_INDEX_PATH is empty."""
+    global _index
+    if not INDEX_PATH:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = CommentIndex(INDEX_PATH)
+        return _index
+
+
+def index_post(record: Dict[str, Any]) -> None:
+    """Best-effort add of a fetched post; indexing problems never fail the fetch."""
+    try:
+        index = get_index()
+        if index is not None:
+            index.add_post(record)
+    except Exception as e:
+        print(f"⚠️ Could not index post: {e}")
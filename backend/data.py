@@ -20,10 +20,16 @@ Environment variables:
 from __future__ import annotations
 
 import argparse
+import contextvars
+import heapq
+import itertools
 import json
 import math
 import os
-from typing import Dict, Any, List, Tuple, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Sequence, Tuple, Optional
 
 try:
     # Optional: only used if python-dotenv is installed and a .env file exists
@@ -34,29 +40,104 @@ except Exception:
     pass
 
 import praw  # type: ignore
+from praw.models import Submission  # type: ignore
 
-def search_and_fetch(
+try:
+    from .reddit_scheduler import PROFILE, scheduler  # type: ignore
+    from .comment_index import index_post  # type: ignore
+except Exception:
+    from backend.reddit_scheduler import PROFILE, scheduler  # type: ignore
+    from backend.comment_index import index_post  # type: ignore
+
+
+def fetch_failed(post_data: Dict[str, Any]) -> bool:
+    """True if fetch_post_data could not load the comments (it records an {"error": ...} comment instead)."""
+    return any(isinstance(c, dict) and "error" in c for c in post_data.get("comments") or [])
+
+
+class PostCache:
+    """
+    Thread-safe memo of fetched posts keyed by submission ID.
+
+    Shared across concurrent searches (e.g. a batch of keywords) so a post that
+    shows up in several result lists is only fetched from Reddit once. Threads
+    asking for a post that is already being fetched wait for that fetch instead
+    of starting a second one.
+
+    With `ttl_seconds`, entries older than that are fetched again; `max_entries`
+    bounds the cache for long-lived instances (oldest entries are dropped first).
+    Failed fetches (an exception, or comments that could not be loaded) are not
+    cached, so the next caller tries Reddit again.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._posts: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._pending: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, post_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._posts.get(post_id)
+        if entry is None:
+            return None
+        if self.ttl_seconds is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+            del self._posts[post_id]
+            return None
+        return entry[1]
+
+    def get_or_fetch(
+        self,
+        post_id: str,
+        fetch: Callable[[], Dict[str, Any]],
+        failed: Callable[[Dict[str, Any]], bool] = fetch_failed,
+    ) -> Dict[str, Any]:
+        with self._lock:
+            post_data = self._fresh(post_id)
+            if post_data is not None:
+                self.hits += 1
+                return post_data
+            pending = self._pending.setdefault(post_id, threading.Lock())
+        with pending:
+            with self._lock:
+                post_data = self._fresh(post_id)
+                if post_data is not None:
+                    self.hits += 1
+                    return post_data
+            try:
+                post_data = fetch()
+                with self._lock:
+                    self.misses += 1
+                    if not failed(post_data):
+                        self._posts.pop(post_id, None)
+                        self._posts[post_id] = (time.monotonic(), post_data)
+                        if self.max_entries is not None:
+                            while len(self._posts) > self.max_entries:
+                                del self._posts[next(iter(self._posts))]
+            finally:
+                with self._lock:
+                    self._pending.pop(post_id, None)
+            return post_data
+
+
+def search_submissions(
+    reddit: praw.Reddit,
     query: str,
     subreddit: Optional[str] = None,
     sort: str = "relevance",
     time_filter: str = "all",
     limit: int = 20,
-    max_comments: int = 100,
-    include_commenter_karma: bool = False,
-    max_commenter_profiles: int = 200,
-    posts_json_path: str = "search_results.json",
-    posts_jsonl_path: str = "search_posts.jsonl",
-) -> None:
+) -> List[Dict[str, Any]]:
     """
-    Search Reddit for submissions matching the query and fetch full post/comment data for each.
-    Saves the search results metadata to a JSON file, and full post+comments to a JSONL file.
-    Prints progress to stdout.
+    Run a Reddit search and return lightweight metadata for each submission, in result order.
     """
-    reddit = get_reddit_client()
     subreddit_obj = reddit.subreddit(subreddit) if subreddit else reddit.subreddit("all")
     print(f"Searching for '{query}' in subreddit='{subreddit or 'all'}' (sort={sort}, time_filter={time_filter}, limit={limit})")
     submissions = []
-    for i, subm in enumerate(subreddit_obj.search(query, sort=sort, time_filter=time_filter, limit=limit)):
+    listing = subreddit_obj.search(query, sort=sort, time_filter=time_filter, limit=limit)
+    for i, subm in enumerate(scheduler.throttled(reddit, listing)):
         post_meta = {
             "id": subm.id,
             "title": subm.title,
@@ -69,24 +150,188 @@ def search_and_fetch(
             "num_comments": int(subm.num_comments),
         }
         submissions.append(post_meta)
-    print(f"Found {len(submissions)} submissions. Writing metadata to {posts_json_path}")
-    with open(posts_json_path, "w", encoding="utf-8") as f:
-        json.dump(submissions, f, indent=2, ensure_ascii=False)
+    return submissions
 
-    print(f"Fetching full post and comments for each submission; writing to {posts_jsonl_path}")
-    with open(posts_jsonl_path, "w", encoding="utf-8") as fout:
-        for idx, meta in enumerate(submissions, 1):
-            print(f" [{idx}/{len(submissions)}] Fetching post {meta['id']} ...")
+
+# Reciprocal-rank-fusion constant: larger values flatten the advantage of top ranks.
+FAN_OUT_RRF_K = 60
+FAN_OUT_MAX_WORKERS = 8
+
+
+def split_subreddits(subreddit: Optional[str]) -> List[Optional[str]]:
+    """'apple+macbook' -> ['apple', 'macbook']; None/'all' stay a single shard."""
+    if not subreddit or subreddit == "all":
+        return [subreddit]
+    return [s for s in subreddit.split("+") if s] or [subreddit]
+
+
+def fan_out_search(
+    reddit: praw.Reddit,
+    queries: Sequence[str],
+    subreddit: Optional[str] = None,
+    sorts: Sequence[str] = ("relevance",),
+    time_filter: str = "all",
+    limit: int = 20,
+    per_shard_limit: Optional[int] = None,
+    max_workers: int = FAN_OUT_MAX_WORKERS,
+) -> List[Dict[str, Any]]:
+    """
+    Run one search per (query, subreddit, sort) shard in parallel and merge the
+    results by submission ID.
+
+    Each shard has its own ~1000-result cap, so splitting a multi-subreddit or
+    adding sort orders / query variants widens coverage for the same wall-clock
+    time. Merged posts are ranked by reciprocal rank fusion (sum of
+    1 / (FAN_OUT_RRF_K + rank) over the shards that returned them), ties broken
+    by score; each gets `fan_out_score` and `fan_out_shards`. Shard requests
+    still go through the rate-limit scheduler with the caller's priority.
+    """
+    subreddits = split_subreddits(subreddit)
+    shards = list(itertools.product(queries, subreddits, sorts))
+    per_shard_limit = per_shard_limit or limit
+    print(f"Fan-out search: {len(shards)} shards ({len(queries)} queries x "
+          f"{len(subreddits)} subreddits x {len(sorts)} sorts)")
+
+    def _shard(query: str, sub: Optional[str], sort: str) -> List[Dict[str, Any]]:
+        return search_submissions(reddit, query, sub, sort, time_filter, per_shard_limit)
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(shards)) or 1) as pool:
+        # copy_context so each shard keeps the request's scheduler priority and deadline
+        futures = {pool.submit(contextvars.copy_context().run, _shard, *shard): shard for shard in shards}
+        for future in as_completed(futures):
             try:
+                results = future.result()
+            except Exception as e:
+                print(f"   Shard {futures[future]} failed: {e}")
+                continue
+            for rank, meta in enumerate(results, 1):
+                entry = merged.setdefault(meta["id"], {**meta, "fan_out_score": 0.0, "fan_out_shards": 0})
+                entry["fan_out_score"] += 1.0 / (FAN_OUT_RRF_K + rank)
+                entry["fan_out_shards"] += 1
+
+    ranked = sorted(merged.values(), key=lambda m: (m["fan_out_score"], m["score"]), reverse=True)
+    print(f"Fan-out search merged {len(merged)} unique submissions; keeping {min(limit, len(ranked))}")
+    return ranked[:limit]
+
+
+def iter_fetch_posts(
+    reddit: praw.Reddit,
+    submissions: List[Dict[str, Any]],
+    max_comments: int = 100,
+    include_commenter_karma: bool = False,
+    max_commenter_profiles: int = 200,
+    post_cache: Optional[PostCache] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Fetch full post+comments for each submission in order, yielding each as soon as it
+    arrives. Posts that fail to fetch are reported and skipped.
+    """
+    for idx, meta in enumerate(submissions, 1):
+        print(f" [{idx}/{len(submissions)}] Fetching post {meta['id']} ...")
+        try:
+            def _fetch(permalink: str = meta["permalink"]) -> Dict[str, Any]:
                 post_data = fetch_post_data(
-                    meta["permalink"],
+                    permalink,
                     max_comments=max_comments,
                     include_commenter_karma=include_commenter_karma,
                     max_commenter_profiles=max_commenter_profiles,
+                    reddit=reddit,
                 )
-                fout.write(json.dumps(post_data, ensure_ascii=False) + "\n")
-            except Exception as e:
-                print(f"   Error fetching post {meta['id']}: {e}")
+                index_post(post_data)
+                return post_data
+
+            if post_cache is not None:
+                post_data = post_cache.get_or_fetch(meta["id"], _fetch)
+            else:
+                post_data = _fetch()
+        except Exception as e:
+            print(f"   Error fetching post {meta['id']}: {e}")
+            continue
+        yield post_data
+
+
+def find_submissions(reddit, query, subreddit=None, sort="relevance", time_filter="all", limit=20,
+                     fan_out=False, sorts=None, query_variants=()):
+    """Submission metadata from a plain search, or from fan_out_search when `fan_out` is set."""
+    if not fan_out:
+        return search_submissions(reddit, query, subreddit, sort, time_filter, limit)
+    queries = list(dict.fromkeys([query, *query_variants]))
+    return fan_out_search(reddit, queries, subreddit, sorts or (sort,), time_filter, limit)
+
+
+def iter_search_posts(
+    query: str,
+    subreddit: Optional[str] = None,
+    sort: str = "relevance",
+    time_filter: str = "all",
+    limit: int = 20,
+    max_comments: int = 100,
+    include_commenter_karma: bool = False,
+    max_commenter_profiles: int = 200,
+    post_cache: Optional[PostCache] = None,
+    fan_out: bool = False,
+    sorts: Optional[Sequence[str]] = None,
+    query_variants: Sequence[str] = (),
+) -> Iterator[Dict[str, Any]]:
+    """
+    Search, then lazily fetch posts in result (relevance) order. Callers that stop
+    iterating early never fetch the remaining posts.
+    With `fan_out`, the search is split into parallel shards (see fan_out_search).
+    """
+    reddit = get_reddit_client()
+    submissions = find_submissions(reddit, query, subreddit, sort, time_filter, limit, fan_out, sorts, query_variants)
+    yield from iter_fetch_posts(
+        reddit,
+        submissions,
+        max_comments=max_comments,
+        include_commenter_karma=include_commenter_karma,
+        max_commenter_profiles=max_commenter_profiles,
+        post_cache=post_cache,
+    )
+
+
+def search_and_fetch(
+    query: str,
+    subreddit: Optional[str] = None,
+    sort: str = "relevance",
+    time_filter: str = "all",
+    limit: int = 20,
+    max_comments: int = 100,
+    include_commenter_karma: bool = False,
+    max_commenter_profiles: int = 200,
+    posts_json_path: str = "search_results.json",
+    posts_jsonl_path: str = "search_posts.jsonl",
+    post_cache: Optional[PostCache] = None,
+    fan_out: bool = False,
+    sorts: Optional[Sequence[str]] = None,
+    query_variants: Sequence[str] = (),
+) -> None:
+    """
+    Search Reddit for submissions matching the query and fetch full post/comment data for each.
+    Saves the search results metadata to a JSON file, and full post+comments to a JSONL file.
+    Prints progress to stdout.
+    If `post_cache` is given, posts already fetched through it are reused instead of refetched.
+    With `fan_out`, the search runs as parallel shards over each subreddit of a multi,
+    each of `sorts` (default: just `sort`) and the query plus `query_variants`.
+    """
+    reddit = get_reddit_client()
+    submissions = find_submissions(reddit, query, subreddit, sort, time_filter, limit, fan_out, sorts, query_variants)
+    print(f"Found {len(submissions)} submissions. Writing metadata to {posts_json_path}")
+    with open(posts_json_path, "w", encoding="utf-8") as f:
+        json.dump(submissions, f, indent=2, ensure_ascii=False)
+
+    print(f"Fetching full post and comments for each submission; writing to {posts_jsonl_path}")
+    with open(posts_jsonl_path, "w", encoding="utf-8") as fout:
+        for post_data in iter_fetch_posts(
+            reddit,
+            submissions,
+            max_comments=max_comments,
+            include_commenter_karma=include_commenter_karma,
+            max_commenter_profiles=max_commenter_profiles,
+            post_cache=post_cache,
+        ):
+            fout.write(json.dumps(post_data, ensure_ascii=False) + "\n")
     print("Done.")
 
 
@@ -112,11 +357,19 @@ def get_reddit_client() -> praw.Reddit:
     client_secret = _env("REDDIT_CLIENT_SECRET")
     user_agent = _env("REDDIT_USER_AGENT")
 
+    # Optional overrides, e.g. to point PRAW at a local fake Reddit for testing the scheduler
+    endpoint_overrides = {
+        key: os.environ[env_name]
+        for key, env_name in (("oauth_url", "REDDIT_OAUTH_URL"), ("reddit_url", "REDDIT_URL"))
+        if os.getenv(env_name)
+    }
+
     reddit = praw.Reddit(
         client_id=client_id,
         client_secret=client_secret,
         user_agent=user_agent,
         check_for_async=False,
+        **endpoint_overrides,
     )
     reddit.read_only = True
     return reddit
@@ -132,6 +385,16 @@ def get_submission(url_or_id: str, reddit: Optional[praw.Reddit] = None):
     return r.submission(id=url_or_id)
 
 
+def submission_id(url_or_id: str) -> str:
+    """Base36 submission ID for a Reddit URL, `t3_` fullname or bare ID (no network call)."""
+    url_or_id = url_or_id.strip()
+    if url_or_id.startswith("http://") or url_or_id.startswith("https://"):
+        return Submission.id_from_url(url_or_id)
+    if url_or_id.startswith("t3_"):
+        url_or_id = url_or_id[3:]
+    return url_or_id.lower()
+
+
 def estimate_votes(score: int, upvote_ratio: Optional[float]) -> Tuple[Optional[int], Optional[int]]:
     """
     Reddit does not expose raw upvote/downvote counts.
@@ -174,17 +437,64 @@ def estimate_votes(score: int, upvote_ratio: Optional[float]) -> Tuple[Optional[
     return (u_int, d_int)
 
 
+UNUSABLE_BODIES = {"", "[deleted]", "[removed]"}
+
+
+def iter_top_comments(
+    forest: Iterable[Any],
+    max_comments: int,
+    max_depth: Optional[int] = None,
+    top_level_only: bool = False,
+) -> Iterator[Any]:
+    """
+    Yield up to `max_comments` usable comments from a comment forest, highest score first.
+
+    Walks the tree lazily with a score-ordered frontier instead of flattening the whole
+    forest, so it stops as soon as enough comments were found. MoreComments placeholders
+    and deleted/removed/empty bodies are skipped (their replies are still visited).
+    Depth 0 is top-level; `max_depth` bounds how deep replies are followed.
+    """
+    if max_comments <= 0:
+        return
+    if top_level_only:
+        max_depth = 0
+    seq = itertools.count()  # tie-breaker keeps the API's order for equal scores
+    frontier: List[Tuple[int, int, int, Any]] = []
+
+    def _push(comments: Iterable[Any], depth: int) -> None:
+        for c in comments:
+            if not hasattr(c, "body"):  # MoreComments
+                continue
+            heapq.heappush(frontier, (-int(getattr(c, "score", 0) or 0), next(seq), depth, c))
+
+    _push(forest, 0)
+    found = 0
+    while frontier and found < max_comments:
+        _, _, depth, c = heapq.heappop(frontier)
+        if max_depth is None or depth < max_depth:
+            _push(getattr(c, "replies", None) or [], depth + 1)
+        if (c.body or "").strip() in UNUSABLE_BODIES:
+            continue
+        found += 1
+        yield c
+
+
 def fetch_post_data(
     url_or_id: str,
     max_comments: int = 100,
     include_commenter_karma: bool = False,
     max_commenter_profiles: int = 200,
     reddit: Optional[praw.Reddit] = None,
+    max_depth: Optional[int] = None,
+    top_level_only: bool = False,
 ) -> Dict[str, Any]:
     """
-    Fetch submission metrics and up to `max_comments` flattened comments.
+    Fetch submission metrics and up to `max_comments` comments, highest score first.
+    `max_depth` / `top_level_only` limit how far into reply chains to look.
     """
     subm = get_submission(url_or_id, reddit=reddit)
+    # The submission (with its comment tree) is fetched lazily on first attribute access.
+    scheduler.acquire()
 
     commenter_cache: Dict[str, Tuple[Optional[int], Optional[int]]] = {}
     profiles_looked_up = 0
@@ -193,11 +503,13 @@ def fetch_post_data(
 
     # Basic post metrics
     author_name = str(subm.author) if subm.author else None
+    scheduler.update_from_reddit(subm._reddit)
     author_link_karma = None
     author_comment_karma = None
     try:
         if subm.author is not None:
             # Public author karma is usually available for read-only
+            scheduler.acquire(priority=PROFILE)
             author_link_karma = getattr(subm.author, "link_karma", None)
             author_comment_karma = getattr(subm.author, "comment_karma", None)
     except Exception:
@@ -228,11 +540,9 @@ def fetch_post_data(
     # Fetch comments (flattened)
     comments: List[Dict[str, Any]] = []
     try:
-        subm.comments.replace_more(limit=0)  # Avoid MoreComments objects
-        flat = list(subm.comments.list())
-        for c in flat[: max(0, max_comments)]:
-            if not hasattr(c, "body"):
-                continue
+        # MoreComments placeholders are skipped during traversal rather than
+        # stripped up front with replace_more(limit=0), which walks the whole forest.
+        for c in iter_top_comments(subm.comments, max_comments, max_depth=max_depth, top_level_only=top_level_only):
             author = str(c.author) if c.author else None
 
             author_link_karma_c = None
@@ -242,6 +552,7 @@ def fetch_post_data(
                     author_link_karma_c, author_comment_karma_c = commenter_cache[author]
                 elif profiles_looked_up < max_commenter_profiles:
                     try:
+                        scheduler.acquire(priority=PROFILE)
                         redditor = subm._reddit.redditor(author)
                         author_link_karma_c = getattr(redditor, "link_karma", None)
                         author_comment_karma_c = getattr(redditor, "comment_karma", None)
@@ -293,6 +604,8 @@ def main():
     parser.add_argument(
         "--pretty", action="store_true", help="Pretty-print JSON output (for single post mode)"
     )
+    parser.add_argument("--max-depth", type=int, default=None, help="Only follow reply chains this deep (0 = top-level only)")
+    parser.add_argument("--top-level-only", action="store_true", help="Only return top-level comments")
     parser.add_argument("--commenter-karma", action="store_true", help="If set, fetch karma for distinct comment authors (rate-limited; cached).")
     parser.add_argument("--max-commenter-profiles", type=int, default=200, help="Max distinct commenter profiles to look up for karma (default: 200).")
     parser.add_argument("--search", action="store_true", help="If set, treat positional arg as a search query and fetch multiple posts.")
@@ -302,6 +615,9 @@ def main():
     parser.add_argument("--limit", type=int, default=20, help="Max number of search results to fetch (default: 20)")
     parser.add_argument("--posts-json-path", type=str, default="search_results.json", help="Path to save search results metadata (default: search_results.json)")
     parser.add_argument("--posts-jsonl-path", type=str, default="search_posts.jsonl", help="Path to save full post+comments JSONL (default: search_posts.jsonl)")
+    parser.add_argument("--fan-out", action="store_true", help="Split the search into parallel shards (each subreddit of a multi, each --sorts entry, each --query-variant) and merge by ID")
+    parser.add_argument("--sorts", type=str, default=None, help="Comma-separated sorts for --fan-out (default: --sort)")
+    parser.add_argument("--query-variant", action="append", default=[], help="Extra query for --fan-out (repeatable)")
     parser.add_argument("--urls-file", type=str, default=None, help="Path to a text file with one Reddit post URL per line; skips search and fetches those posts directly")
     parser.add_argument("--out-json", type=str, default="posts_from_urls.json", help="Output JSON path when using --urls-file (default: posts_from_urls.json)")
     args = parser.parse_args()
@@ -323,6 +639,9 @@ def main():
             max_commenter_profiles=args.max_commenter_profiles,
             posts_json_path=args.posts_json_path,
             posts_jsonl_path=args.posts_jsonl_path,
+            fan_out=args.fan_out,
+            sorts=args.sorts.split(",") if args.sorts else None,
+            query_variants=args.query_variant,
         )
     else:
         data = fetch_post_data(
@@ -330,6 +649,8 @@ def main():
             max_comments=args.comments,
             include_commenter_karma=args.commenter_karma,
             max_commenter_profiles=args.max_commenter_profiles,
+            max_depth=args.max_depth,
+            top_level_only=args.top_level_only,
         )
         if args.pretty:
             print(json.dumps(data, indent=2, ensure_ascii=False))
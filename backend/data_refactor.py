@@ -14,7 +14,8 @@ Each tuple structure:
     post_score: int,
     user_total_karma: int | None,   # author_link_karma + author_comment_karma (if known)
     comment_score: int,
-    post_age_ago: str               # e.g., "3d", "5h", "2y"
+    post_age_months: float,
+    comment_created_utc: float      # the comment's own timestamp (post's if unknown)
   ]
 )
 
@@ -78,6 +79,57 @@ def _humanize_age(seconds_ago: float) -> str:
 essential_comment_fields = ("body", "comment_url", "score", "author_link_karma", "author_comment_karma")
 
 
+def build_comment_tuples_from_record(rec: Dict[str, Any]) -> List[TupleType]:
+    """
+    Turn one {"post": {...}, "comments": [...]} record from backend/data.py into tuples.
+    Same tuple layout as build_comment_tuples_from_jsonl.
+    """
+    tuples: List[TupleType] = []
+    if "post" not in rec or "comments" not in rec:
+        return tuples
+
+    post = rec["post"]
+    comments = rec["comments"] if isinstance(rec["comments"], list) else []
+
+    post_score = int(post.get("score", 0))
+    created_utc = float(post.get("created_utc", time.time()))
+    now_dt = datetime.now(timezone.utc)
+    age_months = (now_dt - datetime.fromtimestamp(created_utc, timezone.utc)).total_seconds() / (86400.0 * 30.0)
+    if age_months < (1.0 / 30.0):  # enforce minimum of 1 day expressed in months
+        age_months = (1.0 / 30.0)
+
+    for c in comments:
+        # Some lines may be error records; skip those.
+        if not isinstance(c, dict):
+            continue
+        if "error" in c:
+            continue
+
+        body = c.get("body")
+        url = c.get("comment_url")
+        if not body or not url:
+            # Only keep well-formed comment entries
+            continue
+
+        comment_score = int(c.get("score", 0))
+        link_k = c.get("author_link_karma")
+        comm_k = c.get("author_comment_karma")
+
+        user_total_karma: Optional[int]
+        if isinstance(link_k, int) or isinstance(comm_k, int):
+            user_total_karma = int((link_k or 0) + (comm_k or 0))
+        else:
+            user_total_karma = None
+
+        comment_created_utc = float(c.get("created_utc") or created_utc)
+
+        details: List[Optional[int] | float] = [post_score, user_total_karma, comment_score, age_months,
+                                                comment_created_utc]
+        tuples.append((body, url, details))
+
+    return tuples
+
+
 def build_comment_tuples_from_jsonl(in_jsonl: str) -> List[TupleType]:
     """
     Read a JSONL file produced by backend/data.py and return the array of tuples.
@@ -85,10 +137,9 @@ def build_comment_tuples_from_jsonl(in_jsonl: str) -> List[TupleType]:
     Tuple fields:
       0: comment body (str)
       1: comment URL (str)
-      2: details list [post_score, user_total_karma, comment_score, post_age_ago]
+      2: details list [post_score, user_total_karma, comment_score, post_age_months, comment_created_utc]
     """
     tuples: List[TupleType] = []
-    now = time.time()
 
     with open(in_jsonl, "r", encoding="utf-8") as f:
         for line in f:
@@ -96,44 +147,7 @@ def build_comment_tuples_from_jsonl(in_jsonl: str) -> List[TupleType]:
             if not line:
                 continue
             rec: Dict[str, Any] = json.loads(line)
-            if "post" not in rec or "comments" not in rec:
-                continue
-
-            post = rec["post"]
-            comments = rec["comments"] if isinstance(rec["comments"], list) else []
-
-            post_score = int(post.get("score", 0))
-            created_utc = float(post.get("created_utc", now))
-            now_dt = datetime.now(timezone.utc)
-            age_months = (now_dt - datetime.fromtimestamp(created_utc, timezone.utc)).total_seconds() / (86400.0 * 30.0)
-            if age_months < (1.0 / 30.0):  # enforce minimum of 1 day expressed in months
-                age_months = (1.0 / 30.0)
-
-            for c in comments:
-                # Some lines may be error records; skip those.
-                if not isinstance(c, dict):
-                    continue
-                if "error" in c:
-                    continue
-
-                body = c.get("body")
-                url = c.get("comment_url")
-                if not body or not url:
-                    # Only keep well-formed comment entries
-                    continue
-
-                comment_score = int(c.get("score", 0))
-                link_k = c.get("author_link_karma")
-                comm_k = c.get("author_comment_karma")
-
-                user_total_karma: Optional[int]
-                if isinstance(link_k, int) or isinstance(comm_k, int):
-                    user_total_karma = int((link_k or 0) + (comm_k or 0))
-                else:
-                    user_total_karma = None
-
-                details: List[Optional[int] | float] = [post_score, user_total_karma, comment_score, age_months]
-                tuples.append((body, url, details))
+            tuples.extend(build_comment_tuples_from_record(rec))
 
     return tuples
 
@@ -0,0 +1,69 @@
+"""
+Request-level latency budget.
+
+server.analyze starts a Deadline for each request; fetch_data and run_analysis
+check it before every optional stage (pros/cons, summary, similar products) and
+skip the stage or serve a stale cached result when the budget is too tight.
+The deadline is also kept in a context variable so llm.create_response can
+clamp each call's timeout to what is left of the request.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# Rough time each optional stage needs; a stage is skipped if less than this remains.
+STAGE_SECONDS = {
+    "pros_cons": 20.0,
+    "pros_cons_polish": 5.0,
+    "summary": 8.0,
+    "gpt_summary": 8.0,
+    "similar_products": 5.0,
+}
+
+_current: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class Deadline:
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def allows(self, stage: str) -> bool:
+        """True if there is enough budget left to run `stage` for real."""
+        return self.remaining() >= STAGE_SECONDS.get(stage, 0.0)
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+def remaining(default: float) -> float:
+    """Seconds left in the current request's budget, or `default` if there is none."""
+    deadline = _current.get()
+    return default if deadline is None else min(default, deadline.remaining())
+
+
+def allows(stage: str) -> bool:
+    deadline = _current.get()
+    return deadline is None or deadline.allows(stage)
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]):
+    """Run the enclosed code under a Deadline of `seconds` (no-op if None)."""
+    if seconds is None:
+        yield None
+        return
+    deadline = Deadline(seconds)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
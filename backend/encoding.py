@@ -0,0 +1,89 @@
+"""
+Response encoding for /analyze: field selection, fast JSON and MessagePack.
+
+A full analysis carries comment texts, pros/cons with URLs and similar
+products, but listing pages only need final_rating and subscores. Clients
+pass ?fields=final_rating,subscores (or ?fields=summary) to get just those
+keys, and send `Accept: application/msgpack` to get MessagePack instead of
+JSON. JSON is encoded with orjson when it is installed, else with the same
+compact stdlib encoding FastAPI would use. Compression is left to
+GZipMiddleware in server.py.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Shorthands accepted in ?fields=
+FIELD_SETS = {
+    "summary": ("final_rating", "subscores"),
+}
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """'final_rating,subscores' -> ['final_rating', 'subscores']; None/empty means every field."""
+    if not fields:
+        return None
+    names: List[str] = []
+    for name in (f.strip() for f in fields.split(",")):
+        for field in FIELD_SETS.get(name, (name,)):
+            if field and field not in names:
+                names.append(field)
+    return names or None
+
+
+def select_fields(response: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Only the requested keys of an analysis response (all of them when fields is None)."""
+    if fields is None:
+        return response
+    return {name: response[name] for name in fields if name in response}
+
+
+def _default(obj: Any) -> Any:
+    # numpy scalars/arrays and tuples from the scoring code
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    raise TypeError(f"Cannot encode {type(obj).__name__}")
+
+
+def dumps_json(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """True if the Accept header asks for MessagePack (and msgpack is installed)."""
+    if msgpack is None or not accept:
+        return False
+    return any(part.split(";")[0].strip().lower() in MSGPACK_TYPES for part in accept.split(","))
+
+
+def render(content: Any, accept: Optional[str] = None, status_code: int = 200) -> Response:
+    """Encode `content` as MessagePack or JSON depending on the Accept header."""
+    headers = {"Vary": "Accept"}
+    if wants_msgpack(accept):
+        return Response(dumps_msgpack(content), status_code=status_code,
+                        media_type="application/msgpack", headers=headers)
+    return Response(dumps_json(content), status_code=status_code,
+                    media_type="application/json", headers=headers)
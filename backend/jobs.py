@@ -0,0 +1,228 @@
+"""
+Background job queue for long-running /analyze work.
+
+POST /jobs returns a job ID right away; a small pool of asyncio workers runs the
+analysis and GET /jobs/{id} reports progress and, once finished, the result.
+
+Job state lives in jobs.json (same approach as cache.json), which is also the
+queue: every server process (see serve.py) re-reads it under a file lock before
+each change, claims queued jobs from it and writes progress back, so a job
+submitted to one worker can run on another and GET /jobs/{id} answers the same
+on every worker. Finished jobs survive a restart, and jobs left running by a
+process that has died are put back in the queue. Submitting the same keyword
+again returns the existing job instead of starting a second one.
+
+File access takes a blocking flock, so it runs in a worker thread rather than
+on the event loop; stage changes are coalesced (only the latest pending stage
+of a job is written). Done and failed jobs are dropped from jobs.json once
+they are older than RESULT_TTL_SECONDS.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cache import file_lock
+
+JOBS_FILE = "jobs.json"
+DEFAULT_WORKERS = 2
+# Finished jobs older than this are rerun on the next submission and pruned from JOBS_FILE.
+RESULT_TTL_SECONDS = 24 * 60 * 60
+# How often idle workers look for jobs submitted to other processes.
+POLL_SECONDS = 1.0
+
+# Stages reported by fetch_data/run_analysis, in the order they happen.
+STAGES = ["queued", "fetching", "classifying", "scoring", "pros_cons", "summarizing", "similar_products", "done"]
+
+Runner = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+def job_id_for(keyword: str) -> str:
+    """Stable job ID, so duplicate submissions map to the same job."""
+    normalized = " ".join(keyword.lower().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()[:16]
+
+
+def _alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    def __init__(self, runner: Runner, workers: int = DEFAULT_WORKERS, path: str = JOBS_FILE) -> None:
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.path = path
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: list[asyncio.Task] = []
+        # job_id -> latest stage not yet written, and the task writing it
+        self._pending_stages: Dict[str, str] = {}
+        self._stage_writers: Dict[str, asyncio.Task] = {}
+
+    def _read(self) -> str:
+        try:
+            with open(self.path, "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return ""
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(self._read() or "{}")
+        except json.JSONDecodeError:
+            return {}
+
+    @contextmanager
+    def _jobs(self):
+        """All jobs, read fresh under the file lock; changes are written back on exit."""
+        with file_lock(self.path):
+            raw = self._read()
+            try:
+                jobs = json.loads(raw or "{}")
+            except json.JSONDecodeError:
+                jobs = {}
+            yield jobs
+            data = json.dumps(jobs)
+            if data == raw:
+                return  # nothing changed (e.g. an idle poll)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+
+    def start(self) -> None:
+        """Start the worker pool and requeue jobs whose process died mid-run."""
+        with self._jobs() as jobs:
+            for job in jobs.values():
+                if job["status"] == "running" and not _alive(job.get("worker_pid")):
+                    job["status"] = "queued"
+                    job["stage"] = "queued"
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, keyword: str) -> Dict[str, Any]:
+        """Queue `keyword` (blocking file access; call it with asyncio.to_thread from the loop)."""
+        job_id = job_id_for(keyword)
+        with self._jobs() as jobs:
+            job = jobs.get(job_id)
+            if job is not None:
+                fresh = job["status"] != "done" or time.time() - (job.get("finished_at") or 0) < RESULT_TTL_SECONDS
+                if job["status"] != "failed" and fresh:
+                    return job
+
+            job = {
+                "id": job_id,
+                "keyword": keyword,
+                "status": "queued",
+                "stage": "queued",
+                "progress": 0.0,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            jobs[job_id] = job
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._load().get(job_id)
+
+    @staticmethod
+    def _prune(jobs: Dict[str, Dict[str, Any]]) -> None:
+        cutoff = time.time() - RESULT_TTL_SECONDS
+        for job_id in [i for i, j in jobs.items()
+                       if j["status"] in ("done", "failed") and (j.get("finished_at") or 0) < cutoff]:
+            del jobs[job_id]
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        # Oldest queued job, marked running by this process.
+        with self._jobs() as jobs:
+            self._prune(jobs)
+            queued = [j for j in jobs.values() if j["status"] == "queued"]
+            if not queued:
+                return None
+            job = min(queued, key=lambda j: j["submitted_at"])
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            job["worker_pid"] = os.getpid()
+            self._set_stage(job, "fetching")
+            return job
+
+    def _update(self, job_id: str, **changes: Any) -> None:
+        with self._jobs() as jobs:
+            if job_id in jobs:
+                jobs[job_id].update(changes)
+
+    def _progress(self, job_id: str, stage: str) -> None:
+        # Called on the event loop by fetch_data: remember the stage and write it
+        # from a thread, so the loop never waits on the file lock.
+        self._pending_stages[job_id] = stage
+        if job_id not in self._stage_writers:
+            self._stage_writers[job_id] = asyncio.create_task(self._write_stages(job_id))
+
+    async def _write_stages(self, job_id: str) -> None:
+        try:
+            while job_id in self._pending_stages:
+                job: Dict[str, Any] = {}
+                self._set_stage(job, self._pending_stages.pop(job_id))
+                await asyncio.to_thread(self._update, job_id, **job)
+        finally:
+            self._stage_writers.pop(job_id, None)
+
+    async def _finish(self, job_id: str, **changes: Any) -> None:
+        # Let any stage write land first so it can't overwrite the final state.
+        self._pending_stages.pop(job_id, None)
+        writer = self._stage_writers.get(job_id)
+        if writer is not None:
+            await asyncio.gather(writer, return_exceptions=True)
+        await asyncio.to_thread(self._update, job_id, **changes)
+
+    @staticmethod
+    def _set_stage(job: Dict[str, Any], stage: str) -> None:
+        job["stage"] = stage
+        if stage in STAGES:
+            job["progress"] = round(STAGES.index(stage) / (len(STAGES) - 1), 2)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await asyncio.to_thread(self._claim)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job_id = job["id"]
+            try:
+                result = await self.runner(job["keyword"], progress=lambda stage: self._progress(job_id, stage))
+                done: Dict[str, Any] = {"status": "done", "result": result}
+                self._set_stage(done, "done")
+                await self._finish(job_id, **done, finished_at=time.time())
+            except Exception as e:
+                print(f"❌ Job {job_id} ('{job['keyword']}') failed: {e}")
+                await self._finish(job_id, status="failed", error=str(e), finished_at=time.time())
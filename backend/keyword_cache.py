@@ -0,0 +1,163 @@
+"""
+Keyword-level cache keys for the LLM caches in script.py and simprod.py.
+
+Raw keywords are canonicalized (case, whitespace, punctuation, filler words such
+as "review") before being used as cache keys, so "MacBook Air", "macbook air "
+and "Macbook Air review" share one entry. Keys have the form
+"kw:<kind>:<canonical keyword>", so kinds can't collide with each other or with
+a keyword. Entries written before this module (raw keyword + "sum"/"sim") are
+still read.
+
+Optionally (USE_SEMANTIC_LOOKUP, off by default), a miss on the canonical key
+falls back to an embedding-similarity lookup over the keywords already cached
+for the same kind. The closest entry above a threshold is reused only if its
+model/number tokens ("15", "m2", "x360") are identical, since MiniLM puts
+"iphone 14" and "iphone 15" well above any useful threshold.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+import numpy as np
+
+USE_SEMANTIC_LOOKUP = os.getenv("KEYWORD_SEMANTIC_LOOKUP", "0") == "1"
+SEMANTIC_THRESHOLD = 0.9
+# Kinds whose pre-keyword_cache entries were stored as raw keyword + kind.
+LEGACY_KINDS = ("sum", "sim")
+# Kinds whose hits save an LLM call; only these are counted in `stats`
+# (analysis responses, history and fallback_* entries are bookkeeping).
+LLM_KINDS = ("sum", "sim")
+
+# Words that don't change which product a query is about.
+FILLER_WORDS = {"review", "reviews", "reddit", "honest", "opinion", "opinions", "thoughts"}
+
+MISS = object()
+
+# exact: canonical key equal to the raw keyword (the old raw key would have hit too)
+# canonical: hit only because the keyword was canonicalized
+stats: Dict[str, int] = {"exact": 0, "raw": 0, "canonical": 0, "semantic": 0, "miss": 0}
+_stats_lock = threading.Lock()
+
+# suffix -> (canonical keywords, normalized embedding matrix)
+_semantic: Dict[str, Tuple[List[str], np.ndarray]] = {}
+_semantic_lock = threading.Lock()
+
+
+def canonical_keyword(keyword: str) -> str:
+    """Lowercase, drop punctuation and filler words, collapse whitespace."""
+    text = re.sub(r"[^\w\s+]", " ", keyword.lower())
+    words = [w for w in text.split() if w not in FILLER_WORDS]
+    return " ".join(words) or " ".join(text.split())
+
+
+def cache_key(keyword: str, suffix: str) -> str:
+    return _key(canonical_keyword(keyword), suffix)
+
+
+def _key(canonical: str, suffix: str) -> str:
+    return f"kw:{suffix}:{canonical}"
+
+
+def model_tokens(canonical: str) -> FrozenSet[str]:
+    """Words with a digit in them (model numbers, generations, sizes)."""
+    return frozenset(w for w in canonical.split() if any(c.isdigit() for c in w))
+
+
+def _count(suffix: str, kind: str) -> None:
+    if suffix not in LLM_KINDS:
+        return
+    with _stats_lock:
+        stats[kind] += 1
+
+
+def _embed(texts: List[str]) -> np.ndarray:
+    from Classification import embedder
+
+    return np.asarray(embedder.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+def _semantic_entries(cache, suffix: str) -> Tuple[List[str], np.ndarray]:
+    with _semantic_lock:
+        if suffix not in _semantic:
+            prefix = _key("", suffix)
+            keys = sorted({k[len(prefix):] for k in list(cache.keys())
+                           if k.startswith(prefix) and len(k) > len(prefix)})
+            vectors = _embed(keys) if keys else np.zeros((0, 0), dtype=np.float32)
+            _semantic[suffix] = (keys, vectors)
+        return _semantic[suffix]
+
+
+def _add_semantic_entry(suffix: str, canonical: str) -> None:
+    with _semantic_lock:
+        if suffix not in _semantic:
+            return  # built lazily from the cache on first lookup
+        keys, vectors = _semantic[suffix]
+        if canonical in keys:
+            return
+        vector = _embed([canonical])
+        vectors = np.vstack([vectors, vector]) if len(keys) else vector
+        _semantic[suffix] = (keys + [canonical], vectors)
+
+
+def lookup(cache, keyword: str, suffix: str, semantic: bool = USE_SEMANTIC_LOOKUP) -> Any:
+    """
+    Return the cached value for keyword/suffix, or MISS.
+
+    Checks the canonical key, then (for LEGACY_KINDS) the old raw keys, then
+    (if enabled) the most similar cached keyword above SEMANTIC_THRESHOLD with
+    the same model tokens.
+    """
+    canonical = canonical_keyword(keyword)
+    found = cache.get_many([_key(canonical, suffix)])
+    if found:
+        _count(suffix, "exact" if canonical == keyword else "canonical")
+        return next(iter(found.values()))
+
+    if suffix in LEGACY_KINDS:
+        for raw_key in (keyword + suffix, canonical + suffix):
+            if raw_key in cache:
+                _count(suffix, "raw")
+                return cache[raw_key]
+
+    if semantic:
+        keys, vectors = _semantic_entries(cache, suffix)
+        if keys:
+            sims = vectors @ _embed([canonical])[0]
+            tokens = model_tokens(canonical)
+            for best in np.argsort(-sims):
+                if sims[best] < SEMANTIC_THRESHOLD:
+                    break
+                if model_tokens(keys[best]) != tokens:
+                    continue
+                key = _key(keys[best], suffix)
+                if key in cache:
+                    print(f"Semantic cache hit: '{keyword}' -> '{keys[best]}' ({sims[best]:.2f})")
+                    _count(suffix, "semantic")
+                    return cache[key]
+
+    _count(suffix, "miss")
+    return MISS
+
+
+def store(cache, keyword: str, suffix: str, value: Any) -> None:
+    """Store value under the canonical key (caller is responsible for save_cache)."""
+    canonical = canonical_keyword(keyword)
+    cache[_key(canonical, suffix)] = value
+    if USE_SEMANTIC_LOOKUP:
+        _add_semantic_entry(suffix, canonical)
+
+
+def get_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        snapshot = dict(stats)
+    lookups = sum(snapshot.values())
+    snapshot["lookups"] = lookups
+    # Hits the raw-string keys would have missed, i.e. LLM calls avoided by this layer
+    # (LLM_KINDS only; exact repeats and legacy raw-key hits don't count).
+    snapshot["llm_calls_avoided"] = snapshot["canonical"] + snapshot["semantic"]
+    snapshot["hit_rate"] = round((lookups - snapshot["miss"]) / lookups, 3) if lookups else 0.0
+    return snapshot
@@ -0,0 +1,275 @@
+"""
+Shared wrapper for OpenAI Responses API calls.
+
+Every LLM call in the pipeline goes through create_response(), which adds:
+  - a per-call timeout, so one slow upstream response can't stall /analyze
+  - bounded retries of transient failures (timeouts, connection errors, 429s,
+    5xx) with full-jitter exponential backoff
+  - optional hedging: if the first request hasn't answered after the stage's
+    recent p95 latency, an identical second request is fired and whichever
+    answers first wins (the other is cancelled, and its tokens are still
+    counted in usage)
+
+All calls share one AsyncOpenAI client (get_client) with a bounded keep-alive
+connection pool, and every request to OpenAI first takes a slot from a
+process-wide PrioritySemaphore (LLM_MAX_IN_FLIGHT). When all slots are busy,
+callers queue by the priority set with reddit_scheduler.request_context
+(interactive /analyze before background jobs and cache warming), so a burst
+queues predictably instead of opening unbounded connections and drawing 429s.
+
+Per-stage counters (calls, retries, hedges fired/won, time spent queued, ...)
+are kept in `metrics`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+
+import deadline
+import usage
+
+try:
+    from .reddit_scheduler import current_priority  # type: ignore
+except Exception:
+    from backend.reddit_scheduler import current_priority  # type: ignore
+
+DEFAULT_TIMEOUT_SECONDS = 45.0
+MAX_RETRIES = 2
+BACKOFF_BASE_SECONDS = 0.5
+HEDGE_ENABLED = True
+HEDGE_PERCENTILE = 0.95
+# Don't hedge until we've seen enough calls for the percentile to mean something.
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# Process-wide cap on requests in flight to OpenAI; the pool holds as many connections.
+MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+KEEPALIVE_SECONDS = 60.0
+# Transport-level timeout; the real per-call budget is enforced by create_response.
+CLIENT_TIMEOUT_SECONDS = 120.0
+
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+_latencies: Dict[str, Deque[float]] = {}
+_queue_times: Dict[str, Deque[float]] = {}
+metrics: Dict[str, Dict[str, int]] = {}
+_client: Optional[openai.AsyncOpenAI] = None
+
+
+def get_client() -> openai.AsyncOpenAI:
+    """
+    The process-wide OpenAI client. Created on first use (after pre-fork workers
+    have started, so no connection is shared across processes). SDK retries are
+    off because create_response does its own.
+    """
+    global _client
+    if _client is None:
+        _client = openai.AsyncOpenAI(
+            api_key=os.getenv("subscription_key"),
+            max_retries=0,
+            timeout=CLIENT_TIMEOUT_SECONDS,
+            http_client=openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=MAX_IN_FLIGHT,
+                    max_keepalive_connections=MAX_IN_FLIGHT,
+                    keepalive_expiry=KEEPALIVE_SECONDS,
+                ),
+            ),
+        )
+    return _client
+
+
+class PrioritySemaphore:
+    """asyncio semaphore whose waiters are woken lowest priority value first, FIFO within a priority."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.in_flight = 0
+        self.peak_waiting = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: int) -> None:
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        self.peak_waiting = max(self.peak_waiting, len(self._waiters))
+        try:
+            await future  # release() hands its slot over directly
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # slot was handed over just as we were cancelled
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"limit": self.limit, "in_flight": self.in_flight,
+                "waiting": self.waiting, "peak_waiting": self.peak_waiting}
+
+
+limiter = PrioritySemaphore(MAX_IN_FLIGHT)
+
+
+def _stage_metrics(stage: str) -> Dict[str, int]:
+    return metrics.setdefault(stage, {
+        "calls": 0, "succeeded": 0, "failed": 0, "retries": 0,
+        "timeouts": 0, "hedges_fired": 0, "hedges_won": 0, "queued": 0,
+    })
+
+
+def _percentile(samples: Optional[Deque[float]], min_samples: int = 1) -> Optional[float]:
+    if not samples or len(samples) < min_samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * HEDGE_PERCENTILE))]
+
+
+def hedge_delay(stage: str) -> Optional[float]:
+    """Recent p95 latency for the stage, or None if there isn't enough history."""
+    return _percentile(_latencies.get(stage), HEDGE_MIN_SAMPLES)
+
+
+async def _timed_call(client, stage: str, kwargs: Dict[str, Any]):
+    queued = time.monotonic()
+    await limiter.acquire(current_priority())
+    try:
+        started = time.monotonic()
+        if started - queued > 0.001:
+            _stage_metrics(stage)["queued"] += 1
+        _queue_times.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(started - queued)
+        try:
+            response = await client.responses.create(**kwargs)
+        except asyncio.CancelledError:
+            # already sent, so it's billed even though nobody reads the answer
+            usage.record_cancelled(stage, time.monotonic() - started)
+            raise
+        # upstream latency only, so queueing doesn't inflate the hedge delay
+        latency = time.monotonic() - started
+        _latencies.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(latency)
+        usage.record(stage, response, latency)
+        return response
+    finally:
+        limiter.release()
+
+
+async def _hedged_call(client, stage: str, timeout: float, hedge: bool, kwargs: Dict[str, Any]):
+    m = _stage_metrics(stage)
+    deadline = time.monotonic() + timeout
+    primary = asyncio.ensure_future(_timed_call(client, stage, kwargs))
+    tasks = {primary}
+    try:
+        delay = hedge_delay(stage) if hedge else None
+        if delay is not None and delay < timeout:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            # Hedging only helps when there is spare capacity; under a queue it adds load.
+            if not done and not limiter.waiting:
+                m["hedges_fired"] += 1
+                tasks.add(asyncio.ensure_future(_timed_call(client, stage, kwargs)))
+
+        error: Optional[BaseException] = None
+        while tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                tasks.discard(task)
+                if task.exception() is None:
+                    if task is not primary:
+                        m["hedges_won"] += 1
+                    return task.result()
+                error = task.exception()
+        if error is not None and not tasks:
+            raise error
+        m["timeouts"] += 1
+        raise asyncio.TimeoutError(f"LLM call for stage '{stage}' timed out after {timeout:.1f}s")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def create_response(
+    client,
+    stage: str,
+    *,
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    retries: int = MAX_RETRIES,
+    hedge: bool = HEDGE_ENABLED,
+    **kwargs: Any,
+):
+    """
+    Drop-in replacement for `await client.responses.create(**kwargs)` with a
+    timeout, jittered retries of transient errors and optional hedging.
+    `stage` names the caller for latency tracking and metrics. The timeout is
+    clamped to what is left of the current request's deadline, if any.
+    """
+    m = _stage_metrics(stage)
+    m["calls"] += 1
+    for attempt in range(retries + 1):
+        attempt_timeout = deadline.remaining(timeout)
+        if attempt_timeout <= 0:
+            m["timeouts"] += 1
+            m["failed"] += 1
+            raise asyncio.TimeoutError(f"No request budget left for LLM stage '{stage}'")
+        try:
+            response = await _hedged_call(client, stage, attempt_timeout, hedge, kwargs)
+            m["succeeded"] += 1
+            return response
+        except TRANSIENT_ERRORS as e:
+            if attempt == retries:
+                m["failed"] += 1
+                raise
+            m["retries"] += 1
+            backoff = random.uniform(0, BACKOFF_BASE_SECONDS * (2 ** attempt))
+            print(f"⚠️ LLM {stage} attempt {attempt + 1} failed ({type(e).__name__}); retrying in {backoff:.1f}s")
+            await asyncio.sleep(backoff)
+        except Exception:
+            m["failed"] += 1
+            raise
+
+
+def get_metrics() -> Dict[str, Any]:
+    stages: Dict[str, Any] = {}
+    for stage, m in metrics.items():
+        delay = hedge_delay(stage)
+        queue_p95 = _percentile(_queue_times.get(stage))
+        stages[stage] = {
+            **m,
+            "p95_seconds": round(delay, 2) if delay is not None else None,
+            "queue_p95_seconds": round(queue_p95, 3) if queue_p95 is not None else None,
+        }
+    return {"limiter": limiter.snapshot(), "stages": stages}
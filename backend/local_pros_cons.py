@@ -0,0 +1,184 @@
+"""
+Local, extractive pros/cons from comment embeddings.
+
+fetch_pros_cons used to send every comment to the LLM with a 5000-token output
+budget, which made it the slowest and most expensive stage. This module builds the
+same (text, url) lists locally:
+
+  1. comments are split into positive and negative by the regressor's own
+     outputs (mean of quality, cost, availability and utility on the 1-5 scale);
+  2. each side is clustered with vectorized k-means (cosine, k-means++ init) on
+     the MiniLM embeddings analyze_comment already computed;
+  3. clusters are ranked by total comment weight, and for each one the sentence
+     closest to the cluster centroid is taken as the pro/con, with the URL of the
+     comment it came from.
+
+PROS_CONS_MODE picks how fetch_pros_cons uses it:
+  llm     the original prompt over all comments (the default)
+  local   extractive result only, no LLM call
+  hybrid  extractive result, then one small LLM call that only rewrites the few
+          representative sentences into concise pros/cons
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from Classification import embed_texts
+
+PROS_CONS_MODE = os.getenv("PROS_CONS_MODE", "llm")
+MODES = ("llm", "local", "hybrid")
+MAX_ITEMS = 5
+# Mean regressor score (1-5) at or above which a comment counts as praise / at or
+# below which it counts as criticism; comments in between are left out.
+POSITIVE_THRESHOLD = 3.5
+NEGATIVE_THRESHOLD = 2.5
+KMEANS_ITERATIONS = 25
+MIN_SENTENCE_CHARS = 20
+MAX_SENTENCE_CHARS = 280
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+ProsCons = Tuple[List[Tuple[str, Optional[str]]], List[Tuple[str, Optional[str]]]]
+
+
+def sentiment(metric: Sequence[float]) -> float:
+    """
+    Mean of the valid product subscores (quality, cost, availability, utility) on
+    the 1-5 scale, like RunningAggregate.add: the regressor outputs 0-4 and a
+    negative value for a missing subscore. Neutral (3.0) if none are valid.
+    """
+    valid = [m + 1 for m in metric[:4] if m >= 0]
+    return float(sum(valid) / len(valid)) if valid else 3.0
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means on L2-normalized rows. Returns (labels, centroids).
+    Deterministic for a given input so cached and fresh results agree.
+    """
+    n = len(x)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+    # k-means++ seeding on cosine distance
+    centroids = [x[rng.integers(n)]]
+    for _ in range(1, k):
+        dist = 1.0 - np.max(x @ np.stack(centroids).T, axis=1)
+        dist = np.clip(dist, 0.0, None) ** 2
+        total = dist.sum()
+        centroids.append(x[rng.choice(n, p=dist / total)] if total > 0 else x[rng.integers(n)])
+    centroids = np.stack(centroids)
+
+    labels = np.zeros(n, dtype=int)
+    for i in range(iterations):
+        new_labels = np.argmax(x @ centroids.T, axis=1)
+        if i and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(k):
+            members = x[labels == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return labels, centroids
+
+
+def _sentences(text: str) -> List[str]:
+    parts = [s.strip(" -*•\t") for s in _SENTENCE_SPLIT.split(text)]
+    good = [s for s in parts if MIN_SENTENCE_CHARS <= len(s) <= MAX_SENTENCE_CHARS]
+    return good or [text.strip()[:MAX_SENTENCE_CHARS]]
+
+
+def _side(texts: List[str], urls: List[Optional[str]], vectors: np.ndarray, weights: np.ndarray,
+          max_items: int) -> List[Tuple[str, Optional[str]]]:
+    if not texts:
+        return []
+    k = min(max_items, max(1, round(math.sqrt(len(texts)))))
+    labels, centroids = kmeans(vectors, k)
+
+    clusters = []
+    for c in range(len(centroids)):
+        members = np.flatnonzero(labels == c)
+        if len(members):
+            clusters.append((float(weights[members].sum()), c, members))
+    clusters.sort(key=lambda item: item[0], reverse=True)
+
+    # Candidate sentences come from the few comments nearest each centroid, so
+    # only a handful of short sentences need encoding.
+    picks = []
+    for _, c, members in clusters:
+        nearest = members[np.argsort(-(vectors[members] @ centroids[c]))[:3]]
+        candidates = [(s, int(i)) for i in nearest for s in _sentences(texts[i])]
+        picks.append((c, candidates))
+    all_sentences = [s for _, candidates in picks for s, _ in candidates]
+    sentence_vectors = _normalize(embed_texts(all_sentences))
+
+    out: List[Tuple[str, Optional[str]]] = []
+    offset = 0
+    for c, candidates in picks:
+        block = sentence_vectors[offset:offset + len(candidates)]
+        offset += len(candidates)
+        best = int(np.argmax(block @ centroids[c]))
+        sentence, comment_index = candidates[best]
+        out.append((sentence, urls[comment_index]))
+    return out
+
+
+def extract_pros_cons(newdata, weights: Optional[Sequence[float]] = None, max_items: int = MAX_ITEMS) -> ProsCons:
+    """
+    newdata is fetch_data's list of (comment, url, metrics, weight_factors).
+    weights, if given, are the per-comment weights (defaults to 1 each).
+    Returns (pros, cons) as lists of (text, url), like fetch_pros_cons.
+    """
+    rows = [(i, row) for i, row in enumerate(newdata) if row[2] and row[2][-1] != -1]
+    if not rows:
+        return [], []
+    texts = [row[0] for _, row in rows]
+    vectors = _normalize(embed_texts(texts))
+    scores = np.array([sentiment(row[2]) for _, row in rows])
+    w = np.array([weights[i] if weights is not None else 1.0 for i, _ in rows], dtype=np.float32)
+
+    result = []
+    for mask, strength in ((scores >= POSITIVE_THRESHOLD, scores - 3.0),
+                           (scores <= NEGATIVE_THRESHOLD, 3.0 - scores)):
+        idx = np.flatnonzero(mask)
+        result.append(_side([texts[i] for i in idx], [rows[i][1][1] for i in idx],
+                            vectors[idx], w[idx] * strength[idx], max_items))
+    return result[0], result[1]
+
+
+def polish_prompt(pros, cons) -> str:
+    """Prompt for the hybrid mode's LLM pass over the extracted representatives only."""
+    return f"""
+    Below are representative sentences from Reddit reviews of a product, already
+    grouped into pros and cons. Rewrite each one as a short, neutral pro or con
+    (under 15 words). Keep the same order and the same number of items; drop an
+    item only if it is not about the product, by returning null in its place.
+
+    Your response should be in JSON format:
+    {{"pros": ["...", null, ...], "cons": ["...", ...]}}
+
+    Pros: {[text for text, _ in pros]}
+    Cons: {[text for text, _ in cons]}
+    """
+
+
+def apply_polish(items, rewritten) -> List[Tuple[str, Optional[str]]]:
+    """Pair the LLM's rewritten texts back with the original URLs (falls back to the original text)."""
+    out = []
+    for i, (text, url) in enumerate(items):
+        new = rewritten[i] if i < len(rewritten) else text
+        if new is None:
+            continue
+        out.append((new if isinstance(new, str) and new.strip() else text, url))
+    return out
@@ -0,0 +1,170 @@
+"""
+Streaming fetch -> classify pipeline for fetch_data.
+
+The default path runs in strict phases: every post is fetched, then every
+tuple is built, then all comments are classified in one call, then they are
+aggregated, so the network and the CPU take turns sitting idle. Here the
+stages run concurrently with bounded queues between them:
+
+    fetch  ->  [posts]  ->  prepare  ->  [batches]  ->  classify + aggregate
+    (thread)               (refactor +              (thread; folds into
+                            prefilter)               RunningAggregate)
+
+Each post's comments are classified and folded into the score while the next
+posts are still downloading (fetch_data hands the aggregate to process_comments
+instead of aggregating again), so the wall-clock time approaches max(fetch, classify) instead
+of their sum. The queues are bounded (QUEUE_SIZE), so a slow classifier
+applies backpressure to fetching instead of buffering every post in memory.
+Posts still fresh in the local comment index are emitted first, and only the
+rest come from Reddit.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from Classification import classify_comments
+from calculate import RunningAggregate, compute_weight
+from prefilter import prefilter_comments
+from reddit_api_call import _default_query_for_product, fan_out_kwargs
+
+try:
+    from .comment_index import INDEX_MIN_POSTS, get_index  # type: ignore
+    from .data import iter_search_posts  # type: ignore
+    from .data_refactor import build_comment_tuples_from_record  # type: ignore
+except Exception:
+    from backend.comment_index import INDEX_MIN_POSTS, get_index  # type: ignore
+    from backend.data import iter_search_posts  # type: ignore
+    from backend.data_refactor import build_comment_tuples_from_record  # type: ignore
+
+POSTS = 5
+QUEUE_SIZE = 4
+_DONE = object()
+
+
+def _iter_posts(keyword: str, limit: int, comments: int, subreddit: Optional[str], time_filter: str,
+                post_cache, fan_out: bool = False) -> Iterator[Dict[str, Any]]:
+    # Local index hits first (instant), then Reddit for whatever is still missing.
+    seen = set()
+    index = get_index()
+    # (only with enough matches to trust the index's coverage, see comment_index.INDEX_MIN_POSTS)
+    matches = index.search(keyword, max(limit, INDEX_MIN_POSTS), max_comments=comments) if index is not None else []
+    if len(matches) >= INDEX_MIN_POSTS:
+        for record in matches[:limit]:
+            seen.add(record["post"]["id"])
+            yield record
+    if len(seen) >= limit:
+        return
+    remote = iter_search_posts(
+        _default_query_for_product(keyword),
+        subreddit=subreddit,
+        sort="relevance",
+        time_filter=time_filter,
+        limit=limit,
+        max_comments=comments,
+        post_cache=post_cache,
+        **fan_out_kwargs(keyword, fan_out),
+    )
+    try:
+        for record in remote:
+            if record["post"]["id"] in seen:
+                continue
+            seen.add(record["post"]["id"])
+            yield record
+            if len(seen) >= limit:
+                return
+    finally:
+        remote.close()
+
+
+async def stream_fetch(
+    keyword: str,
+    *,
+    limit: int = POSTS,
+    comments: int = 30,
+    subreddit: Optional[str] = "all",
+    time_filter: str = "year",
+    queue_size: int = QUEUE_SIZE,
+    post_cache=None,
+    metric_cache: Optional[dict] = None,
+    classify=None,
+    fan_out: bool = False,
+) -> Tuple[List[Tuple[str, str, list]], List[list], Dict[str, Any], RunningAggregate]:
+    """
+    Like adaptive_fetch, returns (reddit_data, metrics, stats, ...) with the kept
+    comment tuples, their classifier outputs in the same order and timings, plus
+    the RunningAggregate with every valid comment already folded in, in order.
+    `classify` optionally replaces the classifier (an async callable on a text list).
+    `fan_out` searches Reddit with the parallel fan-out search (see data.fan_out_search).
+    """
+    started = time.monotonic()
+    posts_q: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    batches_q: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    timings = {"fetch_seconds": 0.0, "classify_seconds": 0.0}
+    counts = {"posts": 0, "seen": 0}
+
+    async def fetch() -> None:
+        posts = _iter_posts(keyword, limit, comments, subreddit, time_filter, post_cache, fan_out)
+        try:
+            while True:
+                t0 = time.monotonic()
+                post = await asyncio.to_thread(next, posts, None)
+                timings["fetch_seconds"] += time.monotonic() - t0
+                if post is None:
+                    break
+                await posts_q.put(post)
+        finally:
+            try:
+                posts.close()
+            except ValueError:
+                pass  # cancelled while a fetch is still running in its thread
+        await posts_q.put(_DONE)
+
+    async def prepare() -> None:
+        while (post := await posts_q.get()) is not _DONE:
+            counts["posts"] += 1
+            tuples = build_comment_tuples_from_record(post)
+            counts["seen"] += len(tuples)
+            tuples, _ = prefilter_comments(tuples, keyword)
+            if tuples:
+                await batches_q.put(tuples)
+        await batches_q.put(_DONE)
+
+    reddit_data: List[Tuple[str, str, list]] = []
+    metrics: List[list] = []
+    aggregate = RunningAggregate()
+
+    async def classify_and_fold() -> None:
+        while (tuples := await batches_q.get()) is not _DONE:
+            texts = [t[0] for t in tuples]
+            t0 = time.monotonic()
+            if classify is not None:
+                preds = await classify(texts)
+            else:
+                preds = await asyncio.to_thread(classify_comments, texts, metric_cache)
+            timings["classify_seconds"] += time.monotonic() - t0
+            for t, m in zip(tuples, preds):
+                reddit_data.append(t)
+                metrics.append(m)
+                if m[-1] != -1:
+                    aggregate.add(m, await compute_weight(t[2], m[-1]))
+
+    tasks = [asyncio.ensure_future(stage()) for stage in (fetch, prepare, classify_and_fold)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    elapsed = time.monotonic() - started
+    stats = {
+        "posts_used": counts["posts"],
+        "comments_used": aggregate.count,
+        "pipeline_fetch_seconds": round(timings["fetch_seconds"], 2),
+        "pipeline_classify_seconds": round(timings["classify_seconds"], 2),
+        "elapsed_seconds": round(elapsed, 2),
+    }
+    print(f"Streaming pipeline for '{keyword}': {stats} (prefilter kept {len(reddit_data)}/{counts['seen']})")
+    return reddit_data, metrics, stats, aggregate
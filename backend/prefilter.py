@@ -0,0 +1,133 @@
+"""
+Cheap relevance prefilter that runs before classification.
+
+Drops comments that are unlikely to say anything about the product (one-word
+reactions, jokes, off-topic replies) using lexical features, so they never
+reach the MiniLM encoder or the LLM prompts. Comments in the grey zone (no
+product terms, medium length) can optionally be checked against a cached
+embedding of the keyword.
+
+Thresholds come from the environment (PREFILTER_MIN_CHARS, PREFILTER_MIN_WORDS,
+PREFILTER_LONG_COMMENT_CHARS, PREFILTER_EMBEDDING_CHECK=1 turns the embedding
+check on, PREFILTER_ENABLED=0 turns the filter off) or prefilter_comments'
+arguments. Long comments are always kept, and short comments that name the
+product or use an opinion word ("Battery life is amazing") are never dropped
+as too short. Words are counted in any script, so non-English comments aren't
+mistaken for short ones.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from keyword_cache import canonical_keyword
+
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "1") != "0"
+MIN_CHARS = int(os.getenv("PREFILTER_MIN_CHARS", "12"))
+MIN_WORDS = int(os.getenv("PREFILTER_MIN_WORDS", "3"))
+# Comments this long are kept even without product terms: in a review thread a
+# long reply is almost always about the product.
+LONG_COMMENT_CHARS = int(os.getenv("PREFILTER_LONG_COMMENT_CHARS", "200"))
+USE_EMBEDDING_CHECK = os.getenv("PREFILTER_EMBEDDING_CHECK", "0") == "1"
+MIN_EMBEDDING_SIMILARITY = 0.25
+# Rough chars-per-token ratio for English text, used for the savings estimate.
+CHARS_PER_TOKEN = 4
+
+_WORD_RE = re.compile(r"\w+")
+
+# Words that make even a very short comment a verdict on the product.
+OPINION_TERMS = {
+    "good", "great", "bad", "love", "loved", "hate", "hated", "amazing", "awesome", "terrible", "awful",
+    "excellent", "solid", "decent", "poor", "worst", "best", "recommend", "avoid", "broke", "broken",
+    "returned", "refund", "overpriced", "cheap", "worth", "disappointed", "disappointing", "perfect",
+}
+
+totals: Dict[str, int] = {"seen": 0, "kept": 0, "too_short": 0, "off_topic": 0, "tokens_saved": 0}
+_totals_lock = threading.Lock()
+
+
+def product_terms(keyword: str) -> set[str]:
+    return {t for t in _WORD_RE.findall(canonical_keyword(keyword)) if len(t) > 1}
+
+
+@lru_cache(maxsize=256)
+def _keyword_embedding(keyword: str) -> np.ndarray:
+    from Classification import embedder
+
+    return np.asarray(embedder.encode([canonical_keyword(keyword)], normalize_embeddings=True)[0])
+
+
+def _embedding_similarity(keyword: str, texts: List[str]) -> np.ndarray:
+    from Classification import embedder
+
+    vectors = np.asarray(embedder.encode(texts, normalize_embeddings=True))
+    return vectors @ _keyword_embedding(keyword)
+
+
+def prefilter_comments(
+    tuples: List[Tuple[str, str, list]],
+    keyword: str,
+    min_chars: int = MIN_CHARS,
+    min_words: int = MIN_WORDS,
+    long_comment_chars: int = LONG_COMMENT_CHARS,
+    use_embedding_check: bool = USE_EMBEDDING_CHECK,
+    min_embedding_similarity: float = MIN_EMBEDDING_SIMILARITY,
+    enabled: bool = PREFILTER_ENABLED,
+) -> Tuple[List[Tuple[str, str, list]], Dict[str, Any]]:
+    """
+    Filter (comment, url, weight_factors) tuples from build_comment_tuples_from_jsonl.
+
+    Returns the kept tuples and a stats dict with drop counts by reason and the
+    estimated encoder calls and LLM prompt tokens saved.
+    """
+    terms = product_terms(keyword)
+    stats: Dict[str, Any] = {"seen": len(tuples), "kept": 0, "too_short": 0, "off_topic": 0, "chars_dropped": 0}
+    # True = keep, False = drop, None = grey zone (no product terms, medium length)
+    decisions: List[Any] = []
+
+    for t in tuples:
+        text = t[0] or ""
+        words = _WORD_RE.findall(text.lower())
+        if not enabled or len(text) >= long_comment_chars:
+            decisions.append(True)
+        elif (len(text.strip()) < min_chars or len(words) < min_words) and not (terms | OPINION_TERMS) & set(words):
+            stats["too_short"] += 1
+            stats["chars_dropped"] += len(text)
+            decisions.append(False)
+        elif terms & set(words):
+            decisions.append(True)
+        else:
+            decisions.append(None)
+
+    grey = [i for i, d in enumerate(decisions) if d is None]
+    if grey and use_embedding_check:
+        sims = _embedding_similarity(keyword, [tuples[i][0] for i in grey])
+        for i, sim in zip(grey, sims):
+            decisions[i] = bool(sim >= min_embedding_similarity)
+            if not decisions[i]:
+                stats["off_topic"] += 1
+                stats["chars_dropped"] += len(tuples[i][0])
+
+    # Without the embedding check, grey-zone comments get the benefit of the doubt.
+    kept = [t for t, d in zip(tuples, decisions) if d is not False]
+    stats["kept"] = len(kept)
+    stats["encoder_calls_saved"] = stats["seen"] - stats["kept"]
+    stats["tokens_saved"] = stats["chars_dropped"] // CHARS_PER_TOKEN
+
+    with _totals_lock:
+        for key in ("seen", "kept", "too_short", "off_topic", "tokens_saved"):
+            totals[key] += stats[key]
+    return kept, stats
+
+
+def get_totals() -> Dict[str, Any]:
+    with _totals_lock:
+        snapshot = dict(totals)
+    snapshot["drop_rate"] = round(1 - snapshot["kept"] / snapshot["seen"], 3) if snapshot["seen"] else 0.0
+    return snapshot
@@ -0,0 +1,173 @@
+"""Local embedding index of known product names for similar-product lookups."""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import keyword_cache
+from cache import file_lock
+from Classification import embedder
+
+INDEX_FILE = "product_index.npz"
+# Neighbours below this cosine similarity are not trusted as "similar products".
+MIN_SIMILARITY = 0.6
+# Neighbours above this are treated as the same product written differently.
+DUPLICATE_SIMILARITY = 0.92
+
+
+def _normalize(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+class ProductIndex:
+    """
+    In-memory matrix of L2-normalized MiniLM embeddings, one row per product.
+
+    Lookups are a single matrix-vector product, which stays in the low
+    milliseconds for the tens of thousands of products we could realistically
+    accumulate, so no separate ANN library is needed. The matrix is persisted
+    to INDEX_FILE after every insert. Every serve.py worker holds its own copy:
+    saves merge with the file under file_lock, and lookups reload it when
+    another worker has replaced it.
+    """
+
+    def __init__(self, path: str = INDEX_FILE) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.names: List[str] = []
+        self._keys: set[str] = set()
+        self.vectors = np.zeros((0, embedder.get_sentence_embedding_dimension()), dtype=np.float32)
+        self._mtime: Optional[int] = None
+        with self._lock:
+            self._reload()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _reload(self) -> None:
+        """Re-read INDEX_FILE if another process replaced it (call with self._lock held)."""
+        mtime = self._file_mtime()
+        if mtime is None or mtime == self._mtime:
+            return
+        with np.load(self.path) as data:
+            self.names = [str(n) for n in data["names"]]
+            self.vectors = data["vectors"].astype(np.float32)
+        self._keys = {_normalize(n) for n in self.names}
+        self._mtime = mtime
+
+    def _save(self, new_names: List[str], new_vectors: np.ndarray) -> int:
+        """
+        Append rows to the file's current contents and write it back (call with
+        self._lock held). Returns how many were new to the file.
+        """
+        with file_lock(self.path):
+            self._reload()
+            keep = [i for i, name in enumerate(new_names) if _normalize(name) not in self._keys]
+            if not keep:
+                return 0
+            self.names.extend(new_names[i] for i in keep)
+            self.vectors = np.vstack([self.vectors, new_vectors[keep]])
+            self._keys.update(_normalize(new_names[i]) for i in keep)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, names=np.array(self.names, dtype=str), vectors=self.vectors)
+            os.replace(tmp_path, self.path)
+            self._mtime = self._file_mtime()
+            return len(keep)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(embedder.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def add(self, names: Iterable[str]) -> int:
+        """Add product names not already indexed. Returns how many were added."""
+        new_names: List[str] = []
+        with self._lock:
+            self._reload()
+            seen = set(self._keys)
+            for name in names:
+                name = (name or "").strip()
+                key = _normalize(name)
+                if key and key not in seen:
+                    seen.add(key)
+                    new_names.append(name)
+            if not new_names:
+                return 0
+            return self._save(new_names, self._embed(new_names))
+
+    def neighbours(
+        self,
+        product_name: str,
+        k: int = 3,
+        min_similarity: float = MIN_SIMILARITY,
+    ) -> List[Tuple[str, float]]:
+        """
+        Return up to k (name, similarity) pairs for products similar to, but not
+        the same as, product_name. Only neighbours above min_similarity count.
+        """
+        with self._lock:
+            self._reload()
+        if not self.names:
+            return []
+        query = self._embed([product_name])[0]
+        with self._lock:
+            sims = self.vectors @ query
+            names = list(self.names)
+        order = np.argsort(-sims)
+        own_key = _normalize(product_name)
+        results: List[Tuple[str, float]] = []
+        for i in order:
+            sim = float(sims[i])
+            if sim < min_similarity:
+                break
+            if sim >= DUPLICATE_SIMILARITY or _normalize(names[i]) == own_key:
+                continue
+            results.append((names[i], sim))
+            if len(results) >= k:
+                break
+        return results
+
+    def bootstrap_from_cache(self, cache) -> int:
+        """Index every product analyzed or recommended in the LLM cache ("kw:sim:<name>" and legacy "<name>sim")."""
+        prefix = keyword_cache.cache_key("", "sim")
+        names: List[str] = []
+        keys: List[str] = []
+        for key in list(cache.keys()):
+            if key.startswith(prefix):
+                names.append(key[len(prefix):])
+            elif key.endswith("sim") and not key.startswith("kw:"):
+                names.append(key[: -len("sim")])
+            else:
+                continue
+            keys.append(key)
+        # One backend round trip for every recommendation list
+        for value in cache.get_many(keys).values():
+            if isinstance(value, list):
+                names.extend(str(v) for v in value)
+        return self.add(names)
+
+
+_index: Optional[ProductIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_product_index(cache=None) -> ProductIndex:
+    """Shared index, loaded from disk (and seeded from `cache` on first use)."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ProductIndex()
+            if cache is not None:
+                added = _index.bootstrap_from_cache(cache)
+                if added:
+                    print(f"Indexed {added} products from cache")
+        return _index
@@ -0,0 +1,174 @@
+"""
+Opt-in, admin-only profiling of single requests.
+
+Add `X-Profile: sample` (or `cprofile`) — or `?profile=sample` — to a request on
+a profiled path, together with `X-Admin-Token: $PROFILE_ADMIN_TOKEN`, and that
+one request is profiled. The profile is written to profiles/ and its file name
+returned in the `X-Profile-File` response header.
+
+  sample    samples the stacks of every thread (event loop plus the worker
+            threads running PRAW / sync endpoints) every few milliseconds and
+            writes collapsed stacks (.folded), the input format of flamegraph.pl,
+            speedscope and inferno.
+  cprofile  deterministic cProfile of the event-loop thread only, written as a
+            .prof file (snakeviz, flameprof, pstats). Work done in the
+            threadpool (sync endpoints, asyncio.to_thread) is not in it; the
+            response says so in `X-Profile-Scope: event-loop-thread`. Paths
+            passed as threaded_paths (whose work runs in worker threads, e.g.
+            api.py's sync /post) reject cprofile with a 400 pointing to sample.
+
+Profiling is done in a plain ASGI middleware around the whole request, so JSON
+serialization is included. Without the flag the middleware only does a header
+lookup and passes the request straight through. Profiling is disabled entirely
+when PROFILE_ADMIN_TOKEN is unset, and only one request is profiled at a time.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Iterable, Optional
+from urllib.parse import parse_qs
+
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL_SECONDS = 0.005
+MODES = ("sample", "cprofile")
+
+_busy = threading.Lock()
+
+
+class StackSampler:
+    """Collects collapsed stacks of all threads (except its own) on a timer."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update({t.ident: t.name for t in threading.enumerate()})
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _requested_mode(scope) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == b"x-profile":
+            return value.decode() or "sample"
+    query = scope.get("query_string", b"")
+    if b"profile=" in query:
+        return parse_qs(query.decode()).get("profile", ["sample"])[0]
+    return None
+
+
+def _is_admin(scope) -> bool:
+    expected = os.getenv("PROFILE_ADMIN_TOKEN")
+    if not expected:
+        return False
+    for name, value in scope.get("headers", ()):
+        if name == b"x-admin-token":
+            return hmac.compare_digest(value.decode(), expected)
+    return False
+
+
+async def _send_error(send, status: int, detail: str) -> None:
+    body = ('{"detail": "%s"}' % detail).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, paths: Iterable[str], threaded_paths: Iterable[str] = ()) -> None:
+        self.app = app
+        self.paths = set(paths)
+        self.threaded_paths = set(threaded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        mode = _requested_mode(scope)
+        if mode is None:
+            return await self.app(scope, receive, send)
+
+        if not _is_admin(scope):
+            return await _send_error(send, 403, "Profiling requires a valid X-Admin-Token")
+        if mode not in MODES:
+            return await _send_error(send, 400, f"Unknown profile mode; use one of {', '.join(MODES)}")
+        if mode == "cprofile" and scope["path"] in self.threaded_paths:
+            return await _send_error(send, 400, f"{scope['path']} runs in worker threads, which cprofile "
+                                                "(event-loop thread only) does not see; use X-Profile: sample")
+        if not _busy.acquire(blocking=False):
+            return await _send_error(send, 409, "Another request is already being profiled")
+
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+            name = f"{scope['path'].strip('/').replace('/', '_')}-{stamp}.{'folded' if mode == 'sample' else 'prof'}"
+            path = os.path.join(PROFILE_DIR, name)
+
+            async def send_with_header(message):
+                if message["type"] == "http.response.start":
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-file", name.encode())]
+                    if mode == "cprofile":
+                        message["headers"].append((b"x-profile-scope", b"event-loop-thread"))
+                await send(message)
+
+            if mode == "sample":
+                sampler = StackSampler()
+                sampler.start()
+                try:
+                    await self.app(scope, receive, send_with_header)
+                finally:
+                    sampler.stop()
+                    sampler.write(path)
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await self.app(scope, receive, send_with_header)
+                finally:
+                    profiler.disable()
+                    profiler.dump_stats(path)
+            print(f"📈 Wrote {mode} profile for {scope['path']} to {path}")
+        finally:
+            _busy.release()
+
+
+def profile_path(name: str, admin_token: Optional[str]) -> Optional[str]:
+    """Path of a stored profile if the token is valid and the file exists, else None."""
+    expected = os.getenv("PROFILE_ADMIN_TOKEN")
+    if not expected or not admin_token or not hmac.compare_digest(admin_token, expected):
+        return None
+    path = os.path.join(PROFILE_DIR, os.path.basename(name))
+    return path if os.path.isfile(path) else None
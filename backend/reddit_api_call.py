@@ -13,7 +13,8 @@ Returns a list of tuples shaped like:
     (
       comment_text: str,
       comment_url: str,
-      [post_score: int, user_total_karma: int | None, comment_score: int, post_age_months: float]
+      [post_score: int, user_total_karma: int | None, comment_score: int, post_age_months: float,
+       comment_created_utc: float]
     )
 
 CLI usage:
@@ -23,6 +24,10 @@ To use Google Custom Search instead of Reddit search:
     python backend/reddit_api_call.py "MacBook Air" --source google --limit 10 --comments 30
 Requires GOOGLE_API_KEY and GOOGLE_CSE_ID in your environment.
 
+The default source is "reddit" (REDDIT_TUPLE_SOURCE). With "local", fresh posts
+already in the local comment index (backend/comment_index.py) are used first and
+only the remaining posts are fetched from the Reddit API.
+
 Requires env vars for PRAW:
   REDDIT_CLIENT_ID, REDDIT_CLIENT_SECRET, REDDIT_USER_AGENT
 """
@@ -43,19 +48,23 @@ if str(REPO_ROOT) not in sys.path:
 
 try:
     # When executed as a package module: python -m backend.reddit_api_call
-    from .data import search_and_fetch  # type: ignore
+    from .data import PostCache, find_submissions, get_reddit_client, iter_fetch_posts, search_and_fetch  # type: ignore
     from .data_refactor import build_comment_tuples_from_jsonl  # type: ignore
+    from .comment_index import INDEX_MIN_POSTS, get_index, index_post  # type: ignore
     from .data import fetch_post_data  # type: ignore
     from .google_search import get_top_reddit_reviews  # type: ignore
 except Exception:
     # When executed as a script: python backend/reddit_api_call.py
-    from backend.data import search_and_fetch  # type: ignore
+    from backend.data import PostCache, find_submissions, get_reddit_client, iter_fetch_posts, search_and_fetch  # type: ignore
     from backend.data_refactor import build_comment_tuples_from_jsonl  # type: ignore
+    from backend.comment_index import INDEX_MIN_POSTS, get_index, index_post  # type: ignore
     from backend.data import fetch_post_data  # type: ignore
     from backend.google_search import get_top_reddit_reviews  # type: ignore
 
 
 TmpMeta = "_tmp_search_meta.json"
+# "reddit", "google" or "local" (local comment index first, Reddit only for the gap)
+DEFAULT_SOURCE = os.getenv("REDDIT_TUPLE_SOURCE", "reddit")
 TmpJsonl = "_tmp_search_results.jsonl"
 
 
@@ -65,7 +74,13 @@ def _write_jsonl(records: list[dict], path: str) -> None:
             f.write(json.dumps(rec, ensure_ascii=False) + "\n")
 
 
-def _fetch_via_google(product_name: str, limit: int, comments: int) -> None:
+def _fetch_via_google(
+    product_name: str,
+    limit: int,
+    comments: int,
+    meta_path: str = TmpMeta,
+    jsonl_path: str = TmpJsonl,
+) -> None:
     # Use Google Custom Search to find top Reddit URLs and fetch them one by one.
     urls = get_top_reddit_reviews(product_name, num_results=limit)
     results: list[dict] = []
@@ -73,16 +88,17 @@ def _fetch_via_google(product_name: str, limit: int, comments: int) -> None:
         try:
             data_obj = fetch_post_data(url, max_comments=comments)
             if data_obj:
+                index_post(data_obj)
                 results.append(data_obj)
         except Exception as e:
             # Skip bad URLs but continue
             print(f"[google-fetch] Skipping URL {i}/{len(urls)}: {url} ({e})")
             continue
     # Write JSONL so data_refactor can consume it directly
-    _write_jsonl(results, TmpJsonl)
+    _write_jsonl(results, jsonl_path)
     # Also write a tiny meta file for parity with search_and_fetch
     meta = {"source": "google", "keyword": product_name, "count": len(results), "urls": urls}
-    with open(TmpMeta, "w", encoding="utf-8") as f:
+    with open(meta_path, "w", encoding="utf-8") as f:
         json.dump(meta, f, ensure_ascii=False, indent=2)
 
 
@@ -98,6 +114,81 @@ def _default_query_for_product(product_name: str) -> str:
     return f"title:{pname_token} AND title:review nsfw:no"
 
 
+def _fetch_local_first(
+    product_name: str,
+    query: str,
+    *,
+    subreddit: Optional[str],
+    time_filter: str,
+    sort: str,
+    limit: int,
+    comments: int,
+    include_commenter_karma: bool,
+    max_commenter_profiles: int,
+    post_cache: Optional[PostCache],
+    meta_path: str,
+    jsonl_path: str,
+    search_kwargs: dict,
+) -> None:
+    # Serve as many posts as possible from the local comment index and fetch only the gap.
+    # With fewer than INDEX_MIN_POSTS local matches the index's coverage isn't trusted:
+    # Reddit search picks every post and the index only saves refetching fresh ones.
+    index = get_index()
+    matches = index.search(product_name, max(limit, INDEX_MIN_POSTS), max_comments=comments)
+    records = matches[:limit] if len(matches) >= INDEX_MIN_POSTS else []
+    from_index = len(records)
+    fetched = 0
+    if len(records) < limit:
+        reddit = get_reddit_client()
+        submissions = find_submissions(reddit, query, subreddit, sort, time_filter, limit, **search_kwargs)
+        have = {r["post"]["id"] for r in records}
+        candidates = [m for m in submissions if m["id"] not in have]
+        fresh = index.fresh_ids(m["id"] for m in candidates)
+        need = limit - len(records)
+        for rec in index.get_records([m["id"] for m in candidates if m["id"] in fresh][:need]):
+            rec["comments"] = rec["comments"][:comments]
+            records.append(rec)
+        from_index = len(records)
+        gap = [m for m in candidates if m["id"] not in fresh][:limit - len(records)]
+        for post_data in iter_fetch_posts(
+            reddit,
+            gap,
+            max_comments=comments,
+            include_commenter_karma=include_commenter_karma,
+            max_commenter_profiles=max_commenter_profiles,
+            post_cache=post_cache,
+        ):
+            records.append(post_data)
+            fetched += 1
+    print(f"[local-first] {from_index} posts from the local index, {fetched} fetched from Reddit")
+    _write_jsonl(records, jsonl_path)
+    meta = {"source": "local", "keyword": product_name, "from_index": from_index, "fetched": fetched,
+            "ids": [r["post"]["id"] for r in records]}
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+
+# Extra sorts searched alongside `sort` when fanning out.
+FAN_OUT_SORTS = ("relevance", "top", "comments")
+
+
+def _query_variants_for_product(product_name: str) -> List[str]:
+    # Looser variants than the default title:review query, merged in by fan-out search
+    pname = product_name.strip()
+    quoted = f'"{pname}"' if " " in pname else pname
+    return [f"title:{quoted} nsfw:no", f"{quoted} review nsfw:no"]
+
+
+def fan_out_kwargs(product_name: str, fan_out: bool, sort: str = "relevance",
+                   query: Optional[str] = None) -> dict:
+    """Search kwargs (fan_out, sorts, query_variants) for data.find_submissions and friends."""
+    return {
+        "fan_out": fan_out,
+        "sorts": list(dict.fromkeys([sort, *FAN_OUT_SORTS])) if fan_out else None,
+        "query_variants": [] if query or not fan_out else _query_variants_for_product(product_name),
+    }
+
+
 def get_reddit_tuples(
     product_name: str,
     *,
@@ -109,18 +200,49 @@ def get_reddit_tuples(
     include_commenter_karma: bool = False,
     max_commenter_profiles: int = 200,
     query: Optional[str] = None,
-    source: str = "reddit",
+    source: str = DEFAULT_SOURCE,
+    post_cache: Optional[PostCache] = None,
+    meta_path: str = TmpMeta,
+    jsonl_path: str = TmpJsonl,
+    fan_out: bool = False,
 ) -> List[Tuple[str, str, list[Any]]]:
     """
     Orchestrate search -> fetch -> refactor and return comment tuples.
+
+    `post_cache` lets concurrent callers share fetched posts; pass distinct
+    `meta_path`/`jsonl_path` values when running several searches at once so
+    they do not overwrite each other's temp files. `fan_out` searches every
+    subreddit of a multi, FAN_OUT_SORTS and looser query variants in parallel
+    and merges the results (reddit and local sources).
     """
     q = query or _default_query_for_product(product_name)
 
+    search_kwargs = fan_out_kwargs(product_name, fan_out, sort, query)
+    if source == "local" and get_index() is None:
+        source = "reddit"  # indexing disabled (COMMENT_INDEX_PATH is empty)
+
     if source == "google":
         # Fetch via Google → URLs → JSONL
-        _fetch_via_google(product_name, limit=limit, comments=comments)
+        _fetch_via_google(product_name, limit=limit, comments=comments, meta_path=meta_path, jsonl_path=jsonl_path)
+    elif source == "local":
+        # Local comment index first, Reddit API only for the posts it can't cover
+        _fetch_local_first(
+            product_name,
+            q,
+            subreddit=subreddit,
+            time_filter=time_filter,
+            sort=sort,
+            limit=limit,
+            comments=comments,
+            include_commenter_karma=include_commenter_karma,
+            max_commenter_profiles=max_commenter_profiles,
+            post_cache=post_cache,
+            meta_path=meta_path,
+            jsonl_path=jsonl_path,
+            search_kwargs=search_kwargs,
+        )
     else:
-        # Default: Reddit API search → JSONL
+        # Reddit API search → JSONL
         search_and_fetch(
             query=q,
             subreddit=subreddit,
@@ -130,11 +252,13 @@ def get_reddit_tuples(
             max_comments=comments,
             include_commenter_karma=include_commenter_karma,
             max_commenter_profiles=max_commenter_profiles,
-            posts_json_path=TmpMeta,
-            posts_jsonl_path=TmpJsonl,
+            posts_json_path=meta_path,
+            posts_jsonl_path=jsonl_path,
+            post_cache=post_cache,
+            **search_kwargs,
         )
 
-    tuples = build_comment_tuples_from_jsonl(TmpJsonl)
+    tuples = build_comment_tuples_from_jsonl(jsonl_path)
     return tuples
 
 
@@ -146,11 +270,11 @@ def main() -> None:
     ap.add_argument("--sort", default="relevance", choices=["relevance","hot","top","new","comments"], help="Search sort")
     ap.add_argument("--limit", type=int, default=100, help="Max posts to fetch (API cap ~1000)")
     ap.add_argument("--comments", type=int, default=10, help="Max comments per post")
-    ap.add_argument("--source", default="reddit", choices=["reddit", "google"], help="Where to get candidate posts from")
-    ap.add_argument("--source", default="reddit", choices=["reddit", "google"], help="Where to get candidate posts from")
+    ap.add_argument("--source", default=DEFAULT_SOURCE, choices=["reddit", "google", "local"], help="Where to get candidate posts from")
     ap.add_argument("--commenter-karma", action="store_true", help="Try to fetch commenter karma (slower)")
     ap.add_argument("--max-commenter-profiles", type=int, default=200, help="Max distinct profiles to look up for karma")
     ap.add_argument("--query", default=None, help="Override auto query (advanced)")
+    ap.add_argument("--fan-out", action="store_true", help="Parallel shard search over subreddits, sorts and query variants")
     args = ap.parse_args()
 
     tuples = get_reddit_tuples(
@@ -164,6 +288,7 @@ def main() -> None:
         max_commenter_profiles=args.max_commenter_profiles,
         query=args.query,
         source=args.source,
+        fan_out=args.fan_out,
     )
 
     # Print as JSON for quick consumption
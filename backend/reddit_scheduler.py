@@ -0,0 +1,199 @@
+"""
+Rate-limit-aware scheduler for Reddit API calls.
+
+Every request that hits Reddit (search pages, post fetches, profile lookups)
+takes a token from one process-wide token bucket first. The bucket starts from
+Reddit's documented OAuth quota and is corrected from the X-Ratelimit-* headers
+PRAW exposes as `reddit.auth.limits` after each call.
+
+When the bucket is empty, waiting callers are served by priority
+(interactive /analyze work before background refresh before profile lookups)
+and give up with DeadlineExceeded once their deadline passes.
+
+Priority and deadline are carried in context variables, so they flow from an
+endpoint through asyncio.to_thread into the blocking PRAW code:
+
+    with request_context(priority=INTERACTIVE, timeout=30):
+        await asyncio.to_thread(get_reddit_tuples, keyword)
+
+The bucket is per process. serve.py sets REDDIT_SCHEDULER_WORKERS to its
+worker count, and each process takes that share of the quota (and of the
+remaining requests reported by the headers), so N workers together stay
+within one client's limit.
+
+The module registers itself as both `reddit_scheduler` and
+`backend.reddit_scheduler`, so every importer gets the same scheduler.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+for _name in ("reddit_scheduler", "backend.reddit_scheduler"):
+    sys.modules.setdefault(_name, sys.modules[__name__])
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PROFILE = 2
+
+# Reddit OAuth clients get 100 requests/minute averaged over a 10 minute window.
+DEFAULT_RATE_PER_SECOND = 100 / 60
+DEFAULT_BURST = 60
+# Processes sharing the Reddit client's quota (set by serve.py).
+WORKERS = max(1, int(os.getenv("REDDIT_SCHEDULER_WORKERS", "1")))
+# Search listings are fetched in pages of this many results.
+SEARCH_PAGE_SIZE = 100
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("reddit_priority", default=INTERACTIVE)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("reddit_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a Reddit call could not be scheduled before its deadline."""
+
+
+@contextmanager
+def request_context(priority: Optional[int] = None, timeout: Optional[float] = None):
+    """Set the priority and/or deadline (seconds from now) for Reddit calls made inside."""
+    tokens = []
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    if timeout is not None:
+        tokens.append((_deadline, _deadline.set(time.monotonic() + timeout)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_priority() -> int:
+    """Priority set by the enclosing request_context() (INTERACTIVE if none)."""
+    return _priority.get()
+
+
+class RedditScheduler:
+    def __init__(
+        self,
+        rate_per_second: float = DEFAULT_RATE_PER_SECOND,
+        burst: float = DEFAULT_BURST,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time,
+        workers: int = WORKERS,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.rate = rate_per_second / self.workers
+        self.burst = max(1.0, burst / self.workers)
+        self.tokens = self.burst
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._updated = clock()
+        self._cond = threading.Condition()
+        self._waiters: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self.stats: Dict[str, Any] = {"granted": 0, "waited": 0, "deadline_exceeded": 0, "throttled_updates": 0}
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority: Optional[int] = None, deadline: Optional[float] = None) -> None:
+        """
+        Block until a request token is available for this caller.
+        Defaults to the priority/deadline from request_context().
+        """
+        priority = _priority.get() if priority is None else priority
+        deadline = _deadline.get() if deadline is None else deadline
+        with self._cond:
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiters, entry)
+            waited = False
+            try:
+                while True:
+                    self._refill()
+                    if self._waiters[0] == entry and self.tokens >= 1:
+                        self.tokens -= 1
+                        self.stats["granted"] += 1
+                        self.stats["waited"] += int(waited)
+                        return
+                    wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.05
+                    if deadline is not None:
+                        remaining = deadline - self._clock()
+                        if remaining <= 0:
+                            self.stats["deadline_exceeded"] += 1
+                            raise DeadlineExceeded("Reddit request could not be scheduled before its deadline")
+                        wait = min(wait, remaining)
+                    waited = True
+                    self._cond.wait(max(wait, 0.001))
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def update_from_limits(self, limits: Optional[Dict[str, Any]]) -> None:
+        """
+        Correct the bucket from PRAW's `reddit.auth.limits`
+        ({"remaining", "reset_timestamp", "used"}, parsed from X-Ratelimit-* headers).
+        """
+        if not limits:
+            return
+        remaining = limits.get("remaining")
+        reset_timestamp = limits.get("reset_timestamp")
+        if remaining is None or reset_timestamp is None:
+            return
+        # the headers describe the whole client; this process gets its share
+        remaining = remaining / self.workers
+        with self._cond:
+            self._refill()
+            seconds_to_reset = max(reset_timestamp - self._wall_clock(), 1.0)
+            # Spread what's left of the window evenly over the time until it resets.
+            self.rate = max(float(remaining), 1.0 / self.workers) / seconds_to_reset
+            if remaining < self.tokens:
+                self.tokens = float(remaining)
+                self.stats["throttled_updates"] += 1
+            self._cond.notify_all()
+
+    def update_from_reddit(self, reddit: Any) -> None:
+        try:
+            self.update_from_limits(reddit.auth.limits)
+        except Exception:
+            pass
+
+    def throttled(self, reddit: Any, items: Iterable[Any], page_size: int = SEARCH_PAGE_SIZE) -> Iterator[Any]:
+        """Wrap a PRAW listing so a token is taken before each page is requested."""
+        iterator = iter(items)
+        i = 0
+        while True:
+            if i % page_size == 0:
+                self.acquire()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                if i % page_size == 0:
+                    self.update_from_reddit(reddit)
+            i += 1
+            yield item
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            self._refill()
+            return {
+                "tokens": round(self.tokens, 2),
+                "rate_per_second": round(self.rate, 3),
+                "waiting": len(self._waiters),
+                **self.stats,
+            }
+
+
+scheduler = RedditScheduler()
@@ -0,0 +1,220 @@
+"""
+Time-windowed score history for a keyword.
+
+process_comments folds every comment into one all-time RunningAggregate. To
+answer "how has sentiment changed over the last 12 months" without redoing
+that aggregation for every window, ScoreHistory keeps each comment's weighted
+contributions (the same terms RunningAggregate.add accumulates) sorted by
+timestamp, with a cumulative-sum array per term. Any window [start, end) then
+takes two bisects and one subtraction per term, O(log n), and becomes a
+RunningAggregate, so final_score, final_metrics and uncertainty come from the
+exact same formulas as the main score.
+
+Each comment is dated by its own created_utc (weight_factors[4]); tuples
+without it fall back to the post's age (weight_factors[3], in 30-day months),
+i.e. the post's creation time. fetch_data
+merges each run's comments into the keyword's stored history (deduplicated by
+comment URL, newest MAX_COMMENTS kept), so the history grows as the keyword is
+re-analyzed.
+
+Histories are stored in their own SQLite database (SCORE_HISTORY_PATH, default
+score_history.db; an empty string disables history), one row per keyword and
+comment, not in cache.json: each row is a URL plus 13 floats (~300 bytes as
+JSON), so a full history is about MAX_COMMENTS * 300 bytes per keyword, and the
+disk cache backend would rewrite all of them on every save. Here an analysis
+only upserts its own comments and trims the keyword to MAX_COMMENTS rows.
+Keywords are keyed by keyword_cache.canonical_keyword, like the cache.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from calculate import RunningAggregate, compute_weight
+from keyword_cache import canonical_keyword
+
+HISTORY_PATH = os.getenv("SCORE_HISTORY_PATH", "score_history.db")
+# Newest comments kept per keyword (~300 bytes each on disk, 13 floats each in memory).
+MAX_COMMENTS = int(os.getenv("SCORE_HISTORY_MAX_COMMENTS", "2000"))
+MONTH_SECONDS = 30 * 24 * 60 * 60  # data_refactor's age_months unit
+
+# Per-comment terms, in RunningAggregate field order:
+# count, total_weight, weight_sq_sum, weighted_metrics_sum[0..3], total_metric_weights[0..3],
+# weighted_score_sum, weighted_score_sq_sum
+_TERMS = 13
+
+
+def _terms(metrics: Sequence[float], weight: float) -> List[float]:
+    agg = RunningAggregate()
+    agg.add(metrics, weight)
+    return [agg.count, agg.total_weight, agg.weight_sq_sum, *agg.weighted_metrics_sum,
+            *agg.total_metric_weights, agg.weighted_score_sum, agg.weighted_score_sq_sum]
+
+
+def _aggregate(sums: Sequence[float]) -> RunningAggregate:
+    agg = RunningAggregate()
+    agg.count = int(round(sums[0]))
+    agg.total_weight, agg.weight_sq_sum = sums[1], sums[2]
+    agg.weighted_metrics_sum = list(sums[3:7])
+    agg.total_metric_weights = list(sums[7:11])
+    agg.weighted_score_sum, agg.weighted_score_sq_sum = sums[11], sums[12]
+    return agg
+
+
+def _month_start(ts: float) -> datetime:
+    dt = datetime.fromtimestamp(ts, timezone.utc)
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    index = dt.year * 12 + dt.month - 1 + months
+    return dt.replace(year=index // 12, month=index % 12 + 1)
+
+
+class ScoreHistory:
+    def __init__(self, rows: Sequence[Tuple[float, str, List[float]]] = ()) -> None:
+        # rows: (timestamp, comment_url, terms); keep the newest MAX_COMMENTS per URL-unique comment
+        unique = {url: (ts, url, terms) for ts, url, terms in sorted(rows, key=lambda r: r[0])}
+        self.rows = sorted(unique.values(), key=lambda r: r[0])[-MAX_COMMENTS:]
+        self.timestamps = [r[0] for r in self.rows]
+        # prefix[k][i] = sum of term k over the first i rows
+        self.prefix = [[0.0, *accumulate(r[2][k] for r in self.rows)] for k in range(_TERMS)]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def merge(self, other: "ScoreHistory") -> "ScoreHistory":
+        return ScoreHistory([*self.rows, *other.rows])
+
+    def window(self, start: Optional[float] = None, end: Optional[float] = None) -> RunningAggregate:
+        """Aggregate of comments with start <= timestamp < end (None = unbounded), in O(log n)."""
+        lo = 0 if start is None else bisect.bisect_left(self.timestamps, start)
+        hi = len(self.rows) if end is None else bisect.bisect_left(self.timestamps, end)
+        hi = max(lo, hi)
+        return _aggregate([p[hi] - p[lo] for p in self.prefix])
+
+    def summary(self, start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, Any]:
+        agg = self.window(start, end)
+        uncertainty = agg.uncertainty()
+        return {
+            "comments": agg.count,
+            "final_rating": agg.final_score if agg.count else None,
+            "subscores": agg.final_metrics if agg.count else None,
+            "score_uncertainty": None if math.isinf(uncertainty) else round(uncertainty, 3),
+        }
+
+    def monthly(self, months: int = 12, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """One summary per calendar month (UTC) for the last `months` months, oldest first."""
+        current = _month_start(time.time() if now is None else now)
+        series = []
+        for back in range(months - 1, -1, -1):
+            begin = _add_months(current, -back)
+            end = _add_months(begin, 1)
+            series.append({"month": begin.strftime("%Y-%m"),
+                           **self.summary(begin.timestamp(), end.timestamp())})
+        return series
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"rows": [[ts, url, [round(t, 6) for t in terms]] for ts, url, terms in self.rows]}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "ScoreHistory":
+        if not data:
+            return cls()
+        return cls([(ts, url, terms) for ts, url, terms in data.get("rows", [])])
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS score_history (
+    keyword TEXT NOT NULL,
+    comment_url TEXT NOT NULL,
+    ts REAL NOT NULL,
+    terms TEXT NOT NULL,
+    PRIMARY KEY (keyword, comment_url)
+);
+CREATE INDEX IF NOT EXISTS score_history_keyword_ts ON score_history(keyword, ts);
+"""
+
+
+class HistoryStore:
+    """Per-keyword ScoreHistory rows in SQLite (WAL, one connection per thread, shared by forked workers)."""
+
+    def __init__(self, path: str = HISTORY_PATH) -> None:
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def load(self, keyword: str) -> ScoreHistory:
+        rows = self._connect().execute(
+            "SELECT ts, comment_url, terms FROM score_history WHERE keyword = ? ORDER BY ts DESC LIMIT ?",
+            (canonical_keyword(keyword), MAX_COMMENTS),
+        )
+        return ScoreHistory([(ts, url, json.loads(terms)) for ts, url, terms in rows])
+
+    def add(self, keyword: str, history: ScoreHistory) -> None:
+        """Upsert history's comments for keyword, then drop all but its newest MAX_COMMENTS."""
+        canonical = canonical_keyword(keyword)
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO score_history VALUES (?, ?, ?, ?)",
+                [(canonical, url, ts, json.dumps([round(t, 6) for t in terms]))
+                 for ts, url, terms in history.rows],
+            )
+            conn.execute(
+                "DELETE FROM score_history WHERE keyword = ? AND comment_url NOT IN ("
+                "SELECT comment_url FROM score_history WHERE keyword = ? ORDER BY ts DESC LIMIT ?)",
+                (canonical, canonical, MAX_COMMENTS),
+            )
+
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[HistoryStore]:
+    """The process-wide history store, or None when SCORE_HISTORY_PATH is empty."""
+    global _store
+    if not HISTORY_PATH:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore(HISTORY_PATH)
+        return _store
+
+
+async def build_history(newdata, now: Optional[float] = None) -> ScoreHistory:
+    """ScoreHistory from fetch_data's (text, url, metrics, weight_factors) tuples, weighted like process_comments."""
+    now = time.time() if now is None else now
+    rows = []
+    for _, url, metrics, weight_factors in newdata:
+        if metrics[-1] == -1:
+            continue
+        weight = await compute_weight(weight_factors, metrics[-1])
+        if weight_factors and len(weight_factors) >= 5 and weight_factors[4]:
+            timestamp = float(weight_factors[4])
+        else:
+            age_months = weight_factors[3] if weight_factors and len(weight_factors) >= 4 else 0
+            timestamp = now - (age_months or 0) * MONTH_SECONDS
+        rows.append((timestamp, url, _terms(metrics, weight)))
+    return ScoreHistory(rows)
@@ -2,7 +2,6 @@ import asyncio
 import subprocess
 import json
 import os
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from reddit_api_call import get_reddit_tuples
 from Classification import analyze_comment
@@ -11,26 +10,39 @@ from data import *
 from cache import *
 import hashlib
 import re
+import uuid
+from typing import Optional
+import keyword_cache
+import llm
+import deadline
+import usage
+from prefilter import prefilter_comments
+from adaptive import adaptive_fetch
+from pipeline import stream_fetch
+from local_pros_cons import PROS_CONS_MODE, apply_polish, extract_pros_cons, polish_prompt
+from score_history import build_history, get_store
 cache = load_cache()
 load_dotenv()
-API_KEY = os.getenv("subscription_key")
 MODEL = "gpt-5-mini"
 REASONING = "low"
-client = AsyncOpenAI(
-    api_key=API_KEY
-)
 
 
 commentlist = []
 newdata = []
 
 
-async def generate_gpt_summary(product_name: str) -> str:
-    cache_key = product_name + "sum"
-    if cache_key in cache:
+async def generate_gpt_summary(product_name: str) -> Optional[str]:
+    """
+    Generate a product summary using GPT when no Reddit comments are found.
+    None if the request deadline or token budget doesn't allow the LLM call.
+    """
+    cached = keyword_cache.lookup(cache, product_name, "sum")
+    if cached is not keyword_cache.MISS:
         print("Cache hit")
-        return cache[cache_key]
-    """Generate a product summary using GPT when no Reddit comments are found"""
+        usage.record_cache_hit("gpt_summary")
+        return cached
+    if not deadline.allows("gpt_summary") or not usage.allows("gpt_summary"):
+        return None
     try:
         prompt = f"""First, determine if "{product_name}" is a product that can be reviewed. If it's a product, create a review with 3 pros and 3 cons. If it's not a product (like a person, place, concept, etc.), respond with "NOT_A_PRODUCT".
 
@@ -48,7 +60,8 @@ CONS:
 
 Make each point specific and brief."""
         
-        response = await client.responses.create(
+        response = await llm.create_response(
+            llm.get_client(), "gpt_summary",
             model=MODEL,
             input=prompt,
             max_output_tokens=500
@@ -63,7 +76,7 @@ Make each point specific and brief."""
         if summary and "NOT_A_PRODUCT" in summary.upper():
             print(f"GPT determined '{product_name}' is not a product")
             response = f"'{product_name}' is not a product that can be reviewed. Please search for an actual product instead."
-            cache[cache_key] = response
+            keyword_cache.store(cache, product_name, "sum", response)
             save_cache(cache)
             return response
         
@@ -73,7 +86,8 @@ Make each point specific and brief."""
             
             # Try a much simpler prompt
             simple_prompt = f"Is {product_name} a product? If yes, list 3 pros and 3 cons. If no, say 'NOT_A_PRODUCT'."
-            simple_response = await client.responses.create(
+            simple_response = await llm.create_response(
+                llm.get_client(), "gpt_summary",
                 model=MODEL,
                 input=simple_prompt,
                 max_output_tokens=500
@@ -86,19 +100,19 @@ Make each point specific and brief."""
             if summary and "NOT_A_PRODUCT" in summary.upper():
                 print(f"Fallback GPT determined '{product_name}' is not a product")
                 summary = f"'{product_name}' is not a product that can be reviewed. Please search for an actual product instead."
-                cache[cache_key] = summary
+                keyword_cache.store(cache, product_name, "sum", summary)
                 save_cache(cache)
                 return summary
             # If still empty, provide a basic product summary
             if not summary or len(summary.strip()) == 0:
                 print(f"WARNING: Even simple prompt returned empty content.")
                 summary = f"The {product_name} is a product that may not have extensive Reddit discussion. For detailed reviews, consider checking manufacturer websites, Amazon reviews, or other review platforms. This product might be better known by alternative names or in specific communities."
-                cache[cache_key] = summary
+                keyword_cache.store(cache, product_name, "sum", summary)
                 save_cache(cache)
                 return summary
         
         print(f"GPT Summary generated successfully ({len(summary)} characters)")
-        cache[cache_key] = summary
+        keyword_cache.store(cache, product_name, "sum", summary)
         save_cache(cache)
         return summary
         
@@ -108,17 +122,72 @@ Make each point specific and brief."""
         traceback.print_exc()
         return f"Unable to generate summary due to an error: {str(e)}"
 
-async def fetch_data(keyword):   
+async def fetch_data(keyword, post_cache=None, metric_cache=None, tmp_tag=None, progress=None,
+                     adaptive=False, info=None, classify=None, streaming=False, fan_out=False):
     # get reddit data: ("comment", "url", [weight factors])
     # send classification ["comment"] and get ("comment", [metrics])
-    reddit_data = get_reddit_tuples(keyword, limit = 1)
+    # post_cache / metric_cache are shared by batch runs so overlapping posts and
+    # comments are fetched and classified once; tmp_tag names this run's temp files.
+    # progress, if given, is called with the name of each stage as it starts.
+    # adaptive fetches posts until the score converges instead of a fixed limit.
+    # info, if given, is a dict filled with extra details about the run
+    # (e.g. posts_used / score_uncertainty in adaptive mode).
+    # classify, if given, replaces analyze_comment (e.g. to run it in a process pool).
+    # streaming fetches several posts and classifies each while the next downloads.
+    # fan_out searches in parallel shards (subreddits, sorts, query variants) and merges them.
+    def _stage(name):
+        if progress is not None:
+            progress(name)
+
+    if info is None:
+        info = {}
+    metrics = None
+    aggregate = None  # set when the comments were already scored while streaming
+    _stage("fetching")
+    if adaptive:
+        reddit_data, metrics, adaptive_stats = await adaptive_fetch(
+            keyword, post_cache=post_cache, metric_cache=metric_cache, classify=classify, fan_out=fan_out,
+        )
+        info.update(adaptive_stats)
+    elif streaming:
+        reddit_data, metrics, stream_stats, aggregate = await stream_fetch(
+            keyword, post_cache=post_cache, metric_cache=metric_cache, classify=classify, fan_out=fan_out,
+        )
+        info.update(stream_stats)
+    else:
+        # Run the blocking Reddit calls in a worker thread (so the scheduler can
+        # make them wait without stalling the event loop), with per-call temp files.
+        tmp_tag = tmp_tag or uuid.uuid4().hex[:8]
+        meta_path = f"_tmp_search_meta.{tmp_tag}.json"
+        jsonl_path = f"_tmp_search_results.{tmp_tag}.jsonl"
+        try:
+            reddit_data = await asyncio.to_thread(
+                get_reddit_tuples, keyword, limit=1, post_cache=post_cache,
+                meta_path=meta_path, jsonl_path=jsonl_path, fan_out=fan_out,
+            )
+        finally:
+            for path in (meta_path, jsonl_path):
+                if os.path.exists(path):
+                    os.remove(path)
     
+    # Drop one-word reactions and off-topic replies before they reach the encoder/LLM
+    # (adaptive_fetch and stream_fetch already prefilter each post as it arrives)
+    if reddit_data and metrics is None:
+        reddit_data, prefilter_stats = prefilter_comments(reddit_data, keyword)
+        print(f"Prefilter kept {prefilter_stats['kept']}/{prefilter_stats['seen']} comments "
+              f"(~{prefilter_stats['tokens_saved']} prompt tokens saved)")
+
     # Check if no comments were found
     if not reddit_data or len(reddit_data) == 0:
         print(f"No Reddit comments found for '{keyword}'. Generating GPT summary...")
         
         # Generate GPT summary for the product
+        _stage("summarizing")
         gpt_summary = await generate_gpt_summary(keyword)
+        if gpt_summary is None:
+            info.setdefault("degraded", []).append("summary")
+            gpt_summary = _stale(keyword, "fallback_summary",
+                                 f"A summary for {keyword} isn't available right now; no Reddit discussion was found.")
         
         # Check if GPT determined it's not a product
         if gpt_summary and "not a product" in gpt_summary.lower():
@@ -131,7 +200,12 @@ async def fetch_data(keyword):
     commentlist = []
     for data in reddit_data:
         commentlist.append(data[0])
-    metrics =  await analyze_comment(commentlist)
+    if metrics is None:
+        _stage("classifying")
+        if classify is not None:
+            metrics = await classify(commentlist)
+        else:
+            metrics =  await analyze_comment(commentlist, memo=metric_cache)
     # metrics = json.loads(metricstring)
     index = 0
     newdata = []
@@ -141,32 +215,123 @@ async def fetch_data(keyword):
         newdata.append((comment, url, metric, weights))
         index+=1
     
-    p, fs, fm, summ = await process_comments(newdata)
+    # Optional LLM stages are skipped (cache only) when the request deadline is
+    # too close or, on a cache miss, the token budget is spent; anything missing
+    # is served from the keyword's last good result (or the local pros/cons extraction).
+    degraded = info.setdefault("degraded", [])
+    _stage("scoring")
+    p, fs, fm, summ = await process_comments(
+        newdata, allow_llm=deadline.allows("summary"), aggregate=aggregate)
+    if summ is None:
+        degraded.append("summary")
+        summ = _stale(keyword, "fallback_summary", "Summary unavailable right now; see the top comments below.")
+    else:
+        keyword_cache.store(cache, keyword, "fallback_summary", summ)
+    await _store_history(keyword, newdata)
     
     # Extract pros and cons from Reddit comments
+    _stage("pros_cons")
     print(f"🔍 Extracting pros and cons from Reddit comments...")
     print(f"DEBUG: commentlist length: {len(commentlist)}")
     print(f"DEBUG: newdata length: {len(newdata)}")
+    pros, cons = None, None
     try:
-        pros, cons = await fetch_pros_cons(commentlist, newdata)
+        pc_stage = "pros_cons" if PROS_CONS_MODE == "llm" else "pros_cons_polish"
+        pros, cons, skipped = await fetch_pros_cons(commentlist, newdata,
+                                                    allow_llm=deadline.allows(pc_stage))
         print(f"✓ Found {len(pros)} pros and {len(cons)} cons from Reddit comments")
     except Exception as e:
         print(f"⚠️ Failed to extract pros/cons from Reddit comments: {e}")
-        import traceback
-        traceback.print_exc()
-        pros, cons = [], []
+        skipped = True
+    if not skipped:
+        keyword_cache.store(cache, keyword, "fallback_pros_cons", [pros, cons])
+    else:
+        # LLM skipped or failed: the last good result first, else the extraction
+        degraded.append("pros_cons")
+        stale = _stale(keyword, "fallback_pros_cons", None)
+        if stale and (stale[0] or stale[1]):
+            pros, cons = stale
+        elif pros is None:
+            try:
+                pros, cons, _ = await _local_pros_cons(commentlist, newdata)
+            except Exception as e:
+                print(f"⚠️ Local pros/cons failed too: {e}")
+                pros, cons = [], []
+    save_cache(cache)
 
     return p, fs, fm, summ, pros, cons, False  # is_not_product = False for normal products
 
-async def fetch_pros_cons(commentlist, newdata):
+async def _store_history(keyword, newdata):
+    # Fold this run's comments into the keyword's time-indexed score history
+    # (served by GET /analyze/{keyword}/history)
+    store = get_store()
+    if store is None:
+        return
+    try:
+        history = await build_history(newdata)
+        await asyncio.to_thread(store.add, keyword, history)
+    except Exception as e:
+        print(f"⚠️ Could not update score history: {e}")
+
+def _stale(keyword, suffix, default):
+    # Last good result stored for this keyword, used when a stage is degraded
+    cached = keyword_cache.lookup(cache, keyword, suffix, semantic=False)
+    return default if cached is keyword_cache.MISS else cached
+
+async def _local_pros_cons(commentlist, newdata, polish=False, allow_llm=True):
+    # Extractive pros/cons from comment clusters (see local_pros_cons.py); with
+    # polish=True one small LLM call rewrites just the picked sentences.
+    # Returns (pros, cons, skipped): skipped if a wanted polish didn't happen.
+    mode = "hybrid" if polish and allow_llm else "local"
+    cache_key = hashlib.sha256(("\n".join(sorted(commentlist)) + "pc-" + mode).encode()).hexdigest()
+    if cache_key in cache:
+        print("Cache hit")
+        pros, cons = cache[cache_key]
+        return pros, cons, polish and mode != "hybrid"
+    if mode == "hybrid" and not usage.allows("pros_cons_polish"):
+        pros, cons, _ = await _local_pros_cons(commentlist, newdata)
+        return pros, cons, True
+    weights = [await compute_weight(w, m[-1]) if m[-1] != -1 else 0.0 for _, _, m, w in newdata]
+    pros, cons = await asyncio.to_thread(extract_pros_cons, newdata, weights)
+    if mode == "hybrid" and (pros or cons):
+        try:
+            response = await llm.create_response(
+                llm.get_client(), "pros_cons_polish",
+                timeout=20,
+                model=MODEL,
+                input=polish_prompt(pros, cons),
+                max_output_tokens=800
+            )
+            result = json.loads(response.output_text)
+            pros = apply_polish(pros, result.get("pros", []))
+            cons = apply_polish(cons, result.get("cons", []))
+        except Exception as e:
+            # the unpolished sentences are still usable; just don't cache them as hybrid
+            print(f"⚠️ Pros/cons polish failed, using extracted sentences: {e}")
+            return pros, cons, True
+    cache[cache_key] = [pros, cons]
+    save_cache(cache)
+    return pros, cons, polish and mode != "hybrid"
+
+async def fetch_pros_cons(commentlist, newdata, allow_llm=True):
+    # PROS_CONS_MODE picks llm / local / hybrid. allow_llm=False (request deadline
+    # too close) or a spent token budget serves the LLM result from cache, else
+    # the local extraction. Returns (pros, cons, skipped); skipped means the
+    # configured LLM step didn't run, so the caller should flag it as degraded.
+    if PROS_CONS_MODE != "llm":
+        return await _local_pros_cons(commentlist, newdata, polish=PROS_CONS_MODE == "hybrid", allow_llm=allow_llm)
     normalized = sorted(commentlist)
     joined = "\n".join(normalized)
     hash_value = hashlib.sha256(joined.encode()).hexdigest()
     cache_key = hash_value
     if cache_key in cache:
         print("Cache hit")
+        usage.record_cache_hit("pros_cons")
         pros, cons = cache[cache_key]
-        return pros, cons
+        return pros, cons, False
+    if not allow_llm or not usage.allows("pros_cons"):
+        pros, cons, _ = await _local_pros_cons(commentlist, newdata)
+        return pros, cons, True
     prompt = f"""
     Given a list of Reddit reviews of a product, extract the main pros and cons based on the comments.
     For each pro or con, provide the text and the index of the review from the list it was based on.
@@ -186,7 +351,9 @@ async def fetch_pros_cons(commentlist, newdata):
     Reviews: {commentlist}
     """
     
-    response = await client.responses.create(
+    response = await llm.create_response(
+        llm.get_client(), "pros_cons",
+        timeout=90,  # up to 5000 output tokens
         model=MODEL,
         input=prompt,
         max_output_tokens=5000
@@ -208,7 +375,7 @@ async def fetch_pros_cons(commentlist, newdata):
         cons.append((item["text"], url))
     cache[cache_key] = [pros, cons]
     save_cache(cache)
-    return pros, cons        
+    return pros, cons, False
             
 
 
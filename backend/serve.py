@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Multi-worker server with the models loaded once.
+
+`uvicorn --workers N` starts N fresh interpreters and each one loads the
+SentenceTransformer + SimpleRegressor from Classification.py again. This script
+instead imports the app (and with it the models) once in the parent, moves the
+weights into shared memory, and forks N workers that serve from one listening
+socket. Workers share the weight pages copy-on-write and each is pinned to its
+own number of torch threads.
+
+Run from backend/:
+    python serve.py --workers 4 --threads-per-worker 1 --port 8000
+
+Every worker runs the background job queue and gets 1/N of the Reddit API
+quota (REDDIT_SCHEDULER_WORKERS). Workers share jobs.json and
+cache.json through a file lock (see jobs.py and cache.DiskBackend), so a job
+submitted to one worker can run on any of them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+WORKER_INDEX_ENV = "REVIEWRADAR_WORKER_INDEX"
+# Read by reddit_scheduler: each worker takes 1/N of the Reddit API quota.
+REDDIT_WORKERS_ENV = "REDDIT_SCHEDULER_WORKERS"
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(index: int, sock: socket.socket, threads: int, log_level: str) -> None:
+    import uvicorn
+    from Classification import configure_worker_threads
+    from server import app
+
+    os.environ[WORKER_INDEX_ENV] = str(index)
+    configure_worker_threads(threads)
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(index: int, sock: socket.socket, threads: int, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            _run_worker(index, sock, threads, log_level)
+        except Exception as e:
+            print(f"❌ Worker {index} crashed: {e}")
+            code = 1
+        os._exit(code)
+    return pid
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve the backend from N forked workers sharing one copy of the models.")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    ap.add_argument("--threads-per-worker", type=int, default=None,
+                    help="torch threads per worker (default: cpu_count // workers, at least 1)")
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args()
+
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+
+    # before importing server, which creates the scheduler
+    os.environ[REDDIT_WORKERS_ENV] = str(args.workers)
+    print(f"Loading models once in parent (pid {os.getpid()})...")
+    import Classification
+    import server  # noqa: F401  (imports the whole pipeline before forking)
+
+    Classification.share_model_memory()
+    # Keep the GC from touching (and so copying) every inherited object in each worker.
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(args.host, args.port)
+    print(f"🚀 Serving on http://{args.host}:{args.port} with {args.workers} workers x {threads} torch threads")
+
+    children = {_spawn(i, sock, threads, args.log_level): i for i in range(args.workers)}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        print(f"⚠️ Worker {index} (pid {pid}) exited with status {status}; restarting")
+        time.sleep(1)
+        children[_spawn(index, sock, threads, args.log_level)] = index
+
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,33 @@ HTTP server that exposes script.py to the frontend.
 Run this with: python server.py
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
+from typing import Optional
 import asyncio
+import os
+import time
+import uuid
 
 # Import your existing script
 from script import fetch_data
-from simprod import fetch_similar_products
+from simprod import fetch_similar_products, remember_product
+from reddit_api_call import PostCache, get_index
+from reddit_scheduler import BACKGROUND, INTERACTIVE, request_context, scheduler
+from jobs import JobQueue
+import keyword_cache
+import llm
+import deadline
+import usage
+from profiling import ProfilingMiddleware, profile_path
+from cache import load_cache, save_cache
+import prefilter
+from admission import Overloaded, admission, client_id
+import encoding
+from score_history import get_store
 
 app = FastAPI()
 
@@ -30,73 +49,202 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reddit calls for an interactive /analyze give up after this many seconds in the queue.
+INTERACTIVE_REDDIT_DEADLINE = 60
+# Full /analyze responses are reused for this long (see warm_cache.py).
+ANALYSIS_TTL_SECONDS = 6 * 60 * 60
+# Default latency budget for /analyze; optional stages degrade once it runs low.
+# It has to cover a cold fetch plus the summary, pros/cons (STAGE_SECONDS 20) and
+# similar-products calls, or cold requests would skip the LLM stages every time.
+ANALYZE_DEADLINE_SECONDS = float(os.getenv("ANALYZE_DEADLINE_SECONDS", "60"))
+MAX_BATCH_KEYWORDS = 10
+SIMILAR_PRODUCTS = 3
+MAX_BATCH_CONCURRENCY = 4
+# Responses smaller than this aren't worth gzipping.
+GZIP_MIN_BYTES = 1000
+
+# Opt-in per-request profiling (X-Profile header + X-Admin-Token), see profiling.py
+app.add_middleware(ProfilingMiddleware, paths=["/analyze", "/analyze/batch"])
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES)
+
 class AnalyzeRequest(BaseModel):
     keyword: str
+    adaptive: bool = False  # fetch posts until the score converges instead of a fixed limit
+    streaming: bool = False  # classify each post while later ones are still downloading
+    fan_out: bool = False  # search subreddits, sorts and query variants in parallel for broader coverage
+    deadline_seconds: float | None = ANALYZE_DEADLINE_SECONDS  # None = no latency budget
+
+class JobRequest(BaseModel):
+    keyword: str
+
+class BatchAnalyzeRequest(BaseModel):
+    keywords: list[str]
+    max_concurrency: int = MAX_BATCH_CONCURRENCY
 
 @app.get("/")
 def root():
     return {
         "status": "Server running ✓",
-        "message": "POST to /analyze with {keyword: 'product_name'}"
+        "message": "POST to /analyze with {keyword: 'product_name'} or /analyze/batch with {keywords: [...]}"
     }
 
-@app.post("/analyze")
-async def analyze(request: AnalyzeRequest):
+async def _similar_products(keyword: str, info: dict) -> list:
+    # Index/cache only (no LLM call) once the request's time or token budget is tight.
+    # Only degraded if that actually left the list short; a full cache/index answer is complete.
+    allow_llm = deadline.allows("similar_products")
+    similar = await fetch_similar_products(keyword, allow_llm=allow_llm)
+    request_usage = usage.current()
+    over_budget = request_usage is not None and "similar_products" in request_usage.budget_skips
+    if (not allow_llm or over_budget) and len(similar) < SIMILAR_PRODUCTS:
+        info.setdefault("degraded", []).append("similar_products")
+    return similar
+
+def _analysis_kind(adaptive: bool = False, streaming: bool = False, fan_out: bool = False) -> str:
+    # Fetch modes read different posts, so each gets its own cached response.
+    return ("analysis" + ("_adaptive" if adaptive else "") + ("_streaming" if streaming else "")
+            + ("_fanout" if fan_out else ""))
+
+def cached_analysis(keyword: str, adaptive: bool = False, streaming: bool = False, fan_out: bool = False):
+    """Full /analyze response for these options computed within ANALYSIS_TTL_SECONDS (e.g. by warm_cache.py), else None."""
+    entry = keyword_cache.lookup(load_cache(), keyword, _analysis_kind(adaptive, streaming, fan_out), semantic=False)
+    if entry is keyword_cache.MISS or time.time() - entry.get("computed_at", 0) > ANALYSIS_TTL_SECONDS:
+        return None
+    return {**entry["response"], "llm_tokens": 0}  # serving it spends no tokens
+
+def store_analysis(keyword: str, response: dict, adaptive: bool = False, streaming: bool = False,
+                   fan_out: bool = False) -> None:
+    if response.get("degraded"):
+        return  # don't pin a partial result for the whole TTL
+    store = load_cache()
+    keyword_cache.store(store, keyword, _analysis_kind(adaptive, streaming, fan_out),
+                        {"computed_at": time.time(), "response": response})
+    save_cache(store)
+
+async def run_analysis(keyword: str, progress=None, use_cache=True, **fetch_kwargs) -> dict:
     """
-    Runs script.py's fetch_data() and returns formatted results
+    Runs script.py's fetch_data() for one keyword and returns the response dict
+    the frontend expects. Extra kwargs are passed through to fetch_data.
+    A full response computed in the last ANALYSIS_TTL_SECONDS with the same
+    adaptive/streaming/fan_out options is reused (use_cache=False forces a fresh run,
+    e.g. when warming the cache).
     """
-    try:
-        print(f"\n🔍 Analyzing: {request.keyword}")
-        
-        # Call your existing script.py function
-        # Returns: (processed, final_score, final_metrics, summary, pros, cons, is_not_product)
-        processed, final_score, final_metrics, summary, pros, cons, is_not_product = await fetch_data(request.keyword)
-        
-        # Check if we have empty data (no Reddit comments found)
-        if not processed or len(processed) == 0:
-            print(f"✓ GPT Summary generated for '{request.keyword}' (no Reddit data available)")
-            
-            # Only fetch similar products if it's actually a product
-            similar_products = []
-            if not is_not_product:
-                print(f"🔍 Finding similar products...")
-                similar_products = await fetch_similar_products(request.keyword)
-                print(f"✓ Found {len(similar_products)} similar products")
-            else:
-                print(f"⚠️ Skipping similar products search - not a product")
-            
-            return {
-                "final_rating": 0.0,              # No rating available
-                "subscores": [0.0, 0.0, 0.0, 0.0], # No subscores available
-                "ai_summary": summary,            # GPT-generated summary
-                "comments": [],                    # No comments available
-                "pros": [],                        # No pros from Reddit comments
-                "cons": [],                        # No cons from Reddit comments
-                "similar_products": similar_products  # Similar products (empty if not a product)
-            }
-        
-        print(f"✓ Analysis complete! Score: {final_score:.2f}/5.0")
-        
-        # Extract top 5 comments from processed
-        # Each item is [text, url, score, metrics, weight]
-        top_comments = [[item[0], item[1]] for item in processed[:5]]
-        
-        # Fetch similar products
-        print(f"🔍 Finding similar products...")
-        similar_products = await fetch_similar_products(request.keyword)
-        print(f"✓ Found {len(similar_products)} similar products")
-        
-        # Return in format frontend expects
+    options = {name: bool(fetch_kwargs.get(name)) for name in ("adaptive", "streaming", "fan_out")}
+    if use_cache:
+        cached = cached_analysis(keyword, **options)
+        if cached is not None:
+            print(f"\n✓ Serving cached analysis for: {keyword}")
+            return cached
+
+    with usage.track_request(keyword) as request_usage:
+        response = await _run_analysis(keyword, progress=progress, **fetch_kwargs)
+    response["llm_tokens"] = int(request_usage.totals["total_tokens"])
+    if request_usage.budget_skips:
+        print(f"💸 Token budget skipped: {request_usage.budget_skips} for '{keyword}'")
+    if response["final_rating"]:
+        store_analysis(keyword, response, **options)
+    return response
+
+async def _run_analysis(keyword: str, progress=None, **fetch_kwargs) -> dict:
+    print(f"\n🔍 Analyzing: {keyword}")
+
+    # Call your existing script.py function
+    # Returns: (processed, final_score, final_metrics, summary, pros, cons, is_not_product)
+    info = {}
+    processed, final_score, final_metrics, summary, pros, cons, is_not_product = await fetch_data(
+        keyword, progress=progress, info=info, **fetch_kwargs
+    )
+    if progress is not None:
+        progress("similar_products")
+
+    # Check if we have empty data (no Reddit comments found)
+    if not processed or len(processed) == 0:
+        print(f"✓ GPT Summary generated for '{keyword}' (no Reddit data available)")
+
+        # Only fetch similar products if it's actually a product
+        similar_products = []
+        if not is_not_product:
+            print(f"🔍 Finding similar products...")
+            similar_products = await _similar_products(keyword, info)
+            await remember_product(keyword)
+            print(f"✓ Found {len(similar_products)} similar products")
+        else:
+            print(f"⚠️ Skipping similar products search - not a product")
+
         return {
-            "final_rating": final_score,      # double
-            "subscores": final_metrics,       # [quality, cost, availability, utility]
-            "ai_summary": summary,            # string
-            "comments": top_comments,         # [[text, url], [text, url], ...]
-            "pros": pros, # List of pros with URLs [(text, url), ...]
-            "cons": cons, # List of cons with URLs [(text, url), ...]
-            "similar_products": similar_products[:3]  # List of 3 product names
+            "final_rating": 0.0,              # No rating available
+            "subscores": [0.0, 0.0, 0.0, 0.0], # No subscores available
+            "ai_summary": summary,            # GPT-generated summary
+            "comments": [],                    # No comments available
+            "pros": [],                        # No pros from Reddit comments
+            "cons": [],                        # No cons from Reddit comments
+            "similar_products": similar_products,  # Similar products (empty if not a product)
+            **info,
         }
-        
+
+    print(f"✓ Analysis complete! Score: {final_score:.2f}/5.0")
+
+    # Extract top 5 comments from processed
+    # Each item is [text, url, score, metrics, weight]
+    top_comments = [[item[0], item[1]] for item in processed[:5]]
+
+    # Fetch similar products
+    print(f"🔍 Finding similar products...")
+    similar_products = await _similar_products(keyword, info)
+    print(f"✓ Found {len(similar_products)} similar products")
+    await remember_product(keyword)
+
+    # Return in format frontend expects
+    return {
+        "final_rating": final_score,      # double
+        "subscores": final_metrics,       # [quality, cost, availability, utility]
+        "ai_summary": summary,            # string
+        "comments": top_comments,         # [[text, url], [text, url], ...]
+        "pros": pros, # List of pros with URLs [(text, url), ...]
+        "cons": cons, # List of cons with URLs [(text, url), ...]
+        "similar_products": similar_products[:SIMILAR_PRODUCTS],  # List of 3 product names
+        **info,                           # e.g. posts_used / score_uncertainty in adaptive mode
+    }
+
+def _client(http_request: Request, api_key: Optional[str]) -> str:
+    return client_id(http_request.client.host if http_request.client else None,
+                     http_request.headers.get("x-forwarded-for"), api_key)
+
+def _too_busy(e: Overloaded) -> HTTPException:
+    print(f"⏳ Rejected /analyze request ({e.reason}); retry after {e.retry_after}s")
+    return HTTPException(status_code=429, detail=f"Server busy ({e.reason}), please retry later",
+                         headers={"Retry-After": str(e.retry_after)})
+
+@app.post("/analyze")
+async def analyze(request: AnalyzeRequest, http_request: Request, x_api_key: Optional[str] = Header(None),
+                  fields: Optional[str] = Query(None)):
+    """
+    Runs script.py's fetch_data() and returns formatted results.
+    Cached results are served immediately; fresh analyses go through admission
+    control and get 429 + Retry-After when the server is saturated.
+    ?fields=final_rating,subscores (or ?fields=summary) returns only those keys,
+    and `Accept: application/msgpack` returns MessagePack instead of JSON.
+    """
+    selected = encoding.parse_fields(fields)
+    accept = http_request.headers.get("accept")
+    cached = cached_analysis(request.keyword, adaptive=request.adaptive, streaming=request.streaming,
+                             fan_out=request.fan_out)
+    if cached is not None:
+        admission.stats["cache_hits"] += 1
+        return encoding.render(encoding.select_fields(cached, selected), accept)
+    try:
+        async with admission.slot(_client(http_request, x_api_key)):
+            response = await _analyze(request)
+    except Overloaded as e:
+        raise _too_busy(e)
+    return encoding.render(encoding.select_fields(response, selected), accept)
+
+async def _analyze(request: AnalyzeRequest):
+    try:
+        reddit_deadline = min(INTERACTIVE_REDDIT_DEADLINE, request.deadline_seconds or INTERACTIVE_REDDIT_DEADLINE)
+        with request_context(priority=INTERACTIVE, timeout=reddit_deadline), \
+                deadline.request_deadline(request.deadline_seconds):
+            return await run_analysis(request.keyword, adaptive=request.adaptive, streaming=request.streaming,
+                                      fan_out=request.fan_out)
     except Exception as e:
         import traceback
         error_msg = str(e)
@@ -104,6 +252,190 @@ async def analyze(request: AnalyzeRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=error_msg)
 
+@app.post("/analyze/batch")
+async def analyze_batch(request: BatchAnalyzeRequest, http_request: Request, x_api_key: Optional[str] = Header(None),
+                        fields: Optional[str] = Query(None)):
+    """
+    Analyzes several products concurrently (e.g. "MacBook Air" vs "Dell XPS").
+
+    All products share one concurrency budget, one post cache and one
+    classification memo, so posts/comments that show up for more than one
+    product are fetched and classified once. Returns per-product results plus
+    a comparison table of final_rating and subscores. A batch takes one
+    admission slot, like a single /analyze. ?fields= and Accept apply to each
+    per-product result, as for /analyze.
+    """
+    try:
+        async with admission.slot(_client(http_request, x_api_key)):
+            response = await _analyze_batch(request)
+    except Overloaded as e:
+        raise _too_busy(e)
+    selected = encoding.parse_fields(fields)
+    if selected is not None:
+        response["results"] = {
+            keyword: result if "error" in result else encoding.select_fields(result, selected)
+            for keyword, result in response["results"].items()
+        }
+    return encoding.render(response, http_request.headers.get("accept"))
+
+async def _analyze_batch(request: BatchAnalyzeRequest):
+    keywords = list(dict.fromkeys(k.strip() for k in request.keywords if k.strip()))
+    if not keywords:
+        raise HTTPException(status_code=400, detail="keywords must contain at least one product")
+    if len(keywords) > MAX_BATCH_KEYWORDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_KEYWORDS} keywords per batch")
+
+    concurrency = max(1, min(request.max_concurrency, MAX_BATCH_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+    post_cache = PostCache()
+    metric_cache: dict = {}
+    # Unique per batch, so concurrent batches never share (or delete) each other's temp files
+    batch_id = uuid.uuid4().hex[:12]
+    print(f"\n📦 Batch analyzing {len(keywords)} products (concurrency={concurrency})")
+
+    async def _one(index: int, keyword: str):
+        async with semaphore:
+            try:
+                with request_context(priority=INTERACTIVE, timeout=INTERACTIVE_REDDIT_DEADLINE):
+                    return await run_analysis(
+                        keyword,
+                        post_cache=post_cache,
+                        metric_cache=metric_cache,
+                        tmp_tag=f"batch-{batch_id}-{index}",
+                    )
+            except Exception as e:
+                import traceback
+                print(f"\n❌ Error analyzing '{keyword}': {e}")
+                traceback.print_exc()
+                return {"error": str(e)}
+
+    results = await asyncio.gather(*(_one(i, k) for i, k in enumerate(keywords)))
+    print(f"✓ Batch complete! Posts fetched: {post_cache.misses}, reused: {post_cache.hits}")
+
+    comparison = [
+        {
+            "keyword": keyword,
+            "final_rating": result.get("final_rating"),
+            "subscores": result.get("subscores"),
+        }
+        for keyword, result in zip(keywords, results)
+        if "error" not in result
+    ]
+    return {
+        "results": dict(zip(keywords, results)),
+        "comparison": comparison,             # [{keyword, final_rating, subscores}, ...]
+        "shared_posts_reused": post_cache.hits,
+    }
+
+@app.get("/analyze/{keyword}/history")
+def analyze_history(keyword: str, months: int = Query(12, ge=1, le=60),
+                    start: Optional[float] = None, end: Optional[float] = None):
+    """
+    How the score for `keyword` changed over time: one entry per calendar month
+    for the last `months` months, plus the all-time score and, if start/end
+    (unix seconds) are given, the score for that range. Built from every
+    comment seen by past analyses of the keyword; 404 if it was never analyzed.
+    """
+    store = get_store()
+    history = store.load(keyword) if store is not None else None
+    if not history:
+        raise HTTPException(status_code=404, detail=f"No history for '{keyword}'; POST /analyze first")
+    response = {
+        "keyword": keyword,
+        "comments": len(history),
+        "first_seen": history.timestamps[0] if len(history) else None,
+        "last_seen": history.timestamps[-1] if len(history) else None,
+        "all_time": history.summary(),
+        "months": history.monthly(months),
+    }
+    if start is not None or end is not None:
+        response["range"] = {"start": start, "end": end, **history.summary(start, end)}
+    return response
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    """Keyword cache lookups by kind (raw/canonical/semantic/miss), LLM calls avoided, and L1/backend hits."""
+    store = load_cache()
+    return {
+        **keyword_cache.get_stats(),
+        "store": {"backend": type(store.backend).__name__, **store.stats},
+    }
+
+@app.get("/metrics/prefilter")
+def prefilter_metrics():
+    """Comments seen/kept by the relevance prefilter and estimated prompt tokens saved."""
+    return prefilter.get_totals()
+
+@app.get("/profiles/{name}")
+def download_profile(name: str, x_admin_token: str | None = Header(default=None)):
+    """Download a profile written by ProfilingMiddleware (admin only)."""
+    path = profile_path(name, x_admin_token)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=name)
+
+@app.get("/metrics/llm")
+def llm_metrics():
+    """Shared LLM limiter state plus per-stage counters: retries, timeouts, hedges, p95 latency and queue time."""
+    return llm.get_metrics()
+
+@app.get("/usage")
+def llm_usage():
+    """LLM tokens by stage, keyword and hour, today's total vs. budget, and tokens saved by cache hits."""
+    return usage.get_usage()
+
+@app.get("/metrics/admission")
+def admission_metrics():
+    """Analyses in flight and queued, average duration, and admitted/rejected counters (per worker)."""
+    return admission.snapshot()
+
+@app.get("/metrics/index")
+def index_metrics():
+    """Size of the local comment index used by the local-first Reddit source."""
+    index = get_index()
+    return index.stats() if index is not None else {"enabled": False}
+
+@app.get("/metrics/reddit")
+def reddit_metrics():
+    """Reddit request scheduler state: bucket tokens, current rate, waiters and counters."""
+    return scheduler.snapshot()
+
+async def run_background_analysis(keyword: str, progress=None) -> dict:
+    # Queued jobs yield Reddit quota to interactive /analyze requests.
+    with request_context(priority=BACKGROUND):
+        return await run_analysis(keyword, progress=progress)
+
+job_queue = JobQueue(run_background_analysis)
+
+@app.on_event("startup")
+async def start_job_queue():
+    # Every worker (see serve.py) consumes from the shared jobs.json.
+    job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+
+@app.post("/jobs")
+async def submit_job(request: JobRequest):
+    """
+    Queues an analysis and returns its job ID immediately.
+    Submitting the same keyword again returns the existing job.
+    """
+    keyword = request.keyword.strip()
+    if not keyword:
+        raise HTTPException(status_code=400, detail="keyword must not be empty")
+    job = await asyncio.to_thread(job_queue.submit, keyword)
+    return {"job_id": job["id"], "status": job["status"]}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Returns the job's status, current stage, progress (0-1) and result when done."""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
 if __name__ == "__main__":
     import uvicorn
     print("\n" + "="*60)
@@ -4,23 +4,23 @@ from __future__ import annotations
 
 import asyncio
 import json
-import os
 import sys
 from typing import List
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from cache import *
 from script import cache
+from product_index import get_product_index
+import keyword_cache
+import llm
+import usage
 
 load_dotenv()
-API_KEY = os.getenv("subscription_key")
 MODEL = "gpt-5-mini"
 REASONING = "low"
-client = AsyncOpenAI(
-    api_key=API_KEY
-)
 
 DEBUG = False
+# How many confident index neighbours we need before skipping the LLM.
+MIN_INDEX_NEIGHBOURS = 3
 
 
 def _parse_response(raw_response: str) -> List[str]:
@@ -37,12 +37,28 @@ def _parse_response(raw_response: str) -> List[str]:
     return [line.strip("-• ").strip() for line in raw_response.splitlines() if line.strip()]
 
 
-async def fetch_similar_products(product_name: str) -> List[str]:
-    cache_key = product_name + "sim"
-    if cache_key in cache:
+async def fetch_similar_products(product_name: str, allow_llm: bool = True) -> List[str]:
+    """
+    Return three similar products: from the cache, then from the local product
+    index, and only ask the LLM when the index has too few confident neighbours.
+    With allow_llm=False, or once the token budget is spent, whatever the index
+    has (possibly fewer than three) is returned.
+    """
+    cached = keyword_cache.lookup(cache, product_name, "sim")
+    if cached is not keyword_cache.MISS:
         print("Cache hit")
-        return cache[cache_key]
-    """Ask the LLM for three similar products."""
+        usage.record_cache_hit("similar_products")
+        return cached
+
+    index = get_product_index(cache)
+    neighbours = await asyncio.to_thread(index.neighbours, product_name, MIN_INDEX_NEIGHBOURS)
+    if len(neighbours) >= MIN_INDEX_NEIGHBOURS or not allow_llm or not usage.allows("similar_products"):
+        if len(neighbours) >= MIN_INDEX_NEIGHBOURS:
+            usage.record_cache_hit("similar_products")
+        if DEBUG:
+            print(f"Index neighbours for '{product_name}': {neighbours}")
+        return [name for name, _ in neighbours]
+
     prompt = f"""
     You are a helpful retail assistant.
     The user is considering the product "{product_name}".
@@ -54,7 +70,8 @@ async def fetch_similar_products(product_name: str) -> List[str]:
     """
 
     try:
-        response = await client.responses.create(
+        response = await llm.create_response(
+            llm.get_client(), "similar_products",
             model=MODEL,
             input=prompt,
             max_output_tokens=500
@@ -69,13 +86,15 @@ async def fetch_similar_products(product_name: str) -> List[str]:
         
         if content is None or content.strip() == "":
             print(f"WARNING: LLM returned empty content. Model: {MODEL}")
-            cache[cache_key] = []
+            keyword_cache.store(cache, product_name, "sim", [])
             save_cache(cache)
             return []
             
         result = _parse_response(content)
-        cache[cache_key] = result
+        keyword_cache.store(cache, product_name, "sim", result)
         save_cache(cache)
+        # Feed the recommendations back so future lookups can use them.
+        await asyncio.to_thread(index.add, result)
         return result
     except Exception as e:
         print(f"ERROR calling Azure OpenAI API: {type(e).__name__}: {e}")
@@ -85,6 +104,17 @@ async def fetch_similar_products(product_name: str) -> List[str]:
         return []
 
 
+async def remember_product(product_name: str) -> None:
+    """
+    Index a product the analysis confirmed is real (Reddit discussion found, or the
+    GPT summary didn't reject it), under its canonical name, so it can be
+    recommended to others. Raw queries are never indexed: typos and "xyz review"
+    variants would otherwise show up as similar products.
+    """
+    index = get_product_index(cache)
+    await asyncio.to_thread(index.add, [keyword_cache.canonical_keyword(product_name)])
+
+
 async def _amain(product_name: str) -> None:
     products = await fetch_similar_products(product_name)
     payload = {"similar_products": products[:3]}
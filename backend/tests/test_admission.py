@@ -0,0 +1,122 @@
+"""
+AdmissionController: round-robin hand-off across clients, Overloaded (429)
+rejections with Retry-After, and client_id's fairness keys.
+
+Run from backend/:  python -m pytest tests  (or python -m unittest discover tests)
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController, Overloaded, client_id  # noqa: E402
+
+
+async def _settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class RoundRobinTest(unittest.IsolatedAsyncioTestCase):
+    async def test_freed_slots_alternate_between_clients(self):
+        controller = AdmissionController(max_in_flight=1, max_queue=10, per_client_limit=5, max_wait=5)
+        await controller.acquire("a")
+        order = []
+
+        async def request(client, name):
+            await controller.acquire(client)
+            order.append(name)
+
+        tasks = [asyncio.create_task(request(c, n)) for c, n in (("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"))]
+        await _settle()
+        self.assertEqual((controller.in_flight, controller.queued), (1, 4))
+        for client in ("a", "a", "b", "a"):
+            controller.release(client)
+            await _settle()
+        await asyncio.gather(*tasks)
+        # b arrived last but gets the second freed slot, not the fourth
+        self.assertEqual(order, ["a1", "b1", "a2", "a3"])
+        self.assertEqual((controller.in_flight, controller.queued), (1, 0))
+        self.assertEqual(controller.stats["had_to_wait"], 4)
+
+    async def test_released_slot_goes_back_when_nobody_waits(self):
+        controller = AdmissionController(max_in_flight=2)
+        async with controller.slot("a"):
+            self.assertEqual(controller.in_flight, 1)
+        self.assertEqual(controller.in_flight, 0)
+        self.assertEqual(controller.snapshot()["admitted"], 1)
+
+
+class OverloadedTest(unittest.IsolatedAsyncioTestCase):
+    async def test_client_over_its_limit_is_rejected(self):
+        controller = AdmissionController(max_in_flight=4, per_client_limit=2)
+        await controller.acquire("a")
+        await controller.acquire("a")
+        with self.assertRaises(Overloaded) as caught:
+            await controller.acquire("a")
+        self.assertEqual(caught.exception.reason, "client_limit")
+        await controller.acquire("b")  # other clients are unaffected
+        self.assertEqual(controller.stats["rejected_client_limit"], 1)
+
+    async def test_full_queue_rejects_with_retry_after_from_service_time(self):
+        controller = AdmissionController(max_in_flight=1, max_queue=1, per_client_limit=5, max_wait=5)
+        controller.service_seconds = 8.0
+        await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await _settle()
+        with self.assertRaises(Overloaded) as caught:
+            await controller.acquire("c")
+        # one running + one queued ahead of the new arrival: two 8 s waves
+        self.assertEqual((caught.exception.reason, caught.exception.retry_after), ("queue_full", 16))
+        controller.release("a")
+        await waiter
+        self.assertEqual(controller.stats["rejected_queue_full"], 1)
+
+    async def test_wait_timeout_frees_the_queue_entry(self):
+        controller = AdmissionController(max_in_flight=1, max_queue=4, per_client_limit=5, max_wait=0.01)
+        await controller.acquire("a")
+        with self.assertRaises(Overloaded) as caught:
+            await controller.acquire("b")
+        self.assertEqual(caught.exception.reason, "wait_timeout")
+        self.assertEqual((controller.queued, controller.snapshot()["clients_waiting"]), (0, 0))
+        controller.release("a")
+        self.assertEqual(controller.in_flight, 0)
+
+    async def test_cancelled_waiter_does_not_leak_a_slot(self):
+        controller = AdmissionController(max_in_flight=1, max_queue=4, per_client_limit=1, max_wait=5)
+        await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await _settle()
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        controller.release("a")
+        self.assertEqual((controller.in_flight, controller.queued), (0, 0))
+        await controller.acquire("b")  # b's per-client count was given back
+
+    def test_retry_after_is_capped(self):
+        controller = AdmissionController(max_in_flight=1)
+        controller.service_seconds = 500.0
+        self.assertEqual(controller.retry_after(), 60)
+
+
+class ClientIdTest(unittest.TestCase):
+    def test_configured_api_key_gets_its_own_bucket(self):
+        keyed = client_id("10.0.0.1", api_key="secret", api_keys=frozenset({"secret"}))
+        self.assertTrue(keyed.startswith("key:"))
+        self.assertNotIn("secret", keyed)
+        self.assertEqual(client_id("10.0.0.1", api_key="unknown", api_keys=frozenset({"secret"})), "ip:10.0.0.1")
+
+    def test_forwarded_for_only_as_far_as_trusted_hops(self):
+        forwarded = "6.6.6.6, 1.2.3.4"
+        self.assertEqual(client_id("10.0.0.1", forwarded, trusted_hops=0), "ip:10.0.0.1")
+        self.assertEqual(client_id("10.0.0.1", forwarded, trusted_hops=1), "ip:1.2.3.4")
+        self.assertEqual(client_id("10.0.0.1", "1.2.3.4", trusted_hops=3), "ip:1.2.3.4")
+        self.assertEqual(client_id(None), "ip:unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+RedisBackend against a minimal in-process RESP server.
+
+Run from backend/:  python -m pytest tests  (or python -m unittest discover tests)
+"""
+
+import os
+import socket
+import socketserver
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import Cache, RedisBackend  # noqa: E402
+
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    """Enough of RESP2 for cache.RedisBackend: GET/MGET/SET/SCAN/SELECT/AUTH. SET of a key containing "boom" fails."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.data = {}
+        self.connections = 0
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        assert line[:1] == b"*", line
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    @staticmethod
+    def _bulk(value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        data = value.encode()
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    def handle(self):
+        self.server.connections += 1
+        data = self.server.data
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            name = args[0].upper()
+            if name in ("SELECT", "AUTH"):
+                reply = b"+OK\r\n"
+            elif name == "SET":
+                if "boom" in args[1]:
+                    reply = b"-ERR value rejected\r\n"
+                else:
+                    data[args[1]] = args[2]
+                    reply = b"+OK\r\n"
+            elif name == "GET":
+                reply = self._bulk(data.get(args[1]))
+            elif name == "MGET":
+                reply = b"*%d\r\n" % (len(args) - 1) + b"".join(self._bulk(data.get(k)) for k in args[1:])
+            elif name == "SCAN":
+                prefix = args[args.index("MATCH") + 1].rstrip("*")
+                keys = [k for k in data if k.startswith(prefix)]
+                reply = b"*2\r\n" + self._bulk("0") + b"*%d\r\n" % len(keys) + b"".join(self._bulk(k) for k in keys)
+            else:
+                reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+class RedisBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeRedis()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.backend = RedisBackend(url=self.server.url, prefix="t:")
+
+    def tearDown(self):
+        self.backend._close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_round_trip(self):
+        cache = Cache(self.backend)
+        cache["a"] = {"x": 1}
+        cache.set_many({"b": [1, 2], "c": "three"})
+        self.assertEqual(self.backend.get_many(["a", "b", "c", "missing"]),
+                         {"a": {"x": 1}, "b": [1, 2], "c": "three"})
+        self.assertEqual(sorted(self.backend.keys()), ["a", "b", "c"])
+
+    def test_error_reply_mid_pipeline_does_not_desync(self):
+        self.backend.set_many({"a": 1})
+        with self.assertRaises(RuntimeError):
+            # the error is the first of three replies; the other two must not leak
+            self.backend.set_many({"boom": 1, "b": 2, "c": 3})
+        self.assertEqual(self.backend.get_many(["a", "b", "c"]), {"a": 1, "b": 2, "c": 3})
+        self.assertEqual(self.backend.get_many(["a"]), {"a": 1})
+
+    def test_reconnects_after_server_drops_connection(self):
+        self.backend.set_many({"a": 1})
+        self.backend._sock.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(self.backend.get_many(["a"]), {"a": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
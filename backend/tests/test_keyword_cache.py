@@ -0,0 +1,79 @@
+"""
+keyword_cache: canonical keys, the legacy raw-key fallback and the hit counters.
+
+Run from backend/:  python -m pytest tests  (or python -m unittest discover tests)
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import keyword_cache  # noqa: E402
+from cache import Cache, MemoryBackend  # noqa: E402
+from keyword_cache import MISS, canonical_keyword, lookup, store  # noqa: E402
+
+
+class CanonicalKeywordTest(unittest.TestCase):
+    def test_case_whitespace_punctuation_and_filler_words(self):
+        for keyword in ("MacBook Air", "  macbook   air ", "Macbook Air review", "macbook air: honest reviews?"):
+            self.assertEqual(canonical_keyword(keyword), "macbook air")
+
+    def test_model_numbers_and_plus_are_kept(self):
+        self.assertEqual(canonical_keyword("Sony WH-1000XM5"), "sony wh 1000xm5")
+        self.assertEqual(canonical_keyword("Galaxy S24+"), "galaxy s24+")
+        self.assertNotEqual(canonical_keyword("iPhone 14"), canonical_keyword("iPhone 15"))
+
+    def test_only_filler_words_fall_back_to_the_text(self):
+        self.assertEqual(canonical_keyword("Review"), "review")
+
+
+class LookupTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = Cache(MemoryBackend())
+        patcher = mock.patch.dict(keyword_cache.stats, {kind: 0 for kind in keyword_cache.stats})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_canonical_key_is_shared_by_variants(self):
+        store(self.cache, "MacBook Air review", "sum", "summary")
+        self.assertIn("kw:sum:macbook air", self.cache)
+        self.assertEqual(lookup(self.cache, "macbook air", "sum", semantic=False), "summary")
+        self.assertEqual(lookup(self.cache, "MacBook Air", "sum", semantic=False), "summary")
+        self.assertIs(lookup(self.cache, "macbook pro", "sum", semantic=False), MISS)
+
+    def test_legacy_raw_keys_are_read_for_legacy_kinds_only(self):
+        self.cache["MacBook Airsum"] = "old summary"
+        self.cache["macbook airsim"] = ["old", "similar"]
+        self.cache["MacBook Airhistory"] = {"rows": []}
+        self.assertEqual(lookup(self.cache, "MacBook Air", "sum", semantic=False), "old summary")
+        self.assertEqual(lookup(self.cache, "MacBook Air", "sim", semantic=False), ["old", "similar"])
+        self.assertIs(lookup(self.cache, "MacBook Air", "history", semantic=False), MISS)
+
+    def test_canonical_key_wins_over_legacy_key(self):
+        self.cache["MacBook Airsum"] = "old summary"
+        store(self.cache, "MacBook Air", "sum", "new summary")
+        self.assertEqual(lookup(self.cache, "MacBook Air", "sum", semantic=False), "new summary")
+
+    def test_stats_count_llm_kinds_and_only_canonical_hits_as_avoided(self):
+        store(self.cache, "macbook air", "sum", "summary")
+        self.cache["Dell XPSsim"] = ["legacy"]
+        store(self.cache, "macbook air", "fallback_summary", "stale")
+        lookup(self.cache, "macbook air", "sum", semantic=False)        # exact
+        lookup(self.cache, "MacBook Air review", "sum", semantic=False)  # canonical
+        lookup(self.cache, "Dell XPS", "sim", semantic=False)            # raw
+        lookup(self.cache, "ipad", "sum", semantic=False)                # miss
+        lookup(self.cache, "MacBook Air", "fallback_summary", semantic=False)
+        lookup(self.cache, "ipad", "history", semantic=False)
+        stats = keyword_cache.get_stats()
+        self.assertEqual({k: stats[k] for k in ("exact", "canonical", "raw", "semantic", "miss")},
+                         {"exact": 1, "canonical": 1, "raw": 1, "semantic": 0, "miss": 1})
+        self.assertEqual(stats["lookups"], 4)
+        self.assertEqual(stats["llm_calls_avoided"], 1)
+        self.assertEqual(stats["hit_rate"], 0.75)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+data.PostCache: concurrent callers share one fetch, failures are not cached.
+
+Run from backend/:  python -m pytest tests  (or python -m unittest discover tests)
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from backend.data import PostCache
+except ImportError:  # praw missing
+    PostCache = None
+
+
+@unittest.skipUnless(PostCache is not None, "praw is not installed")
+class PostCacheTest(unittest.TestCase):
+    def test_concurrent_callers_share_one_fetch(self):
+        cache = PostCache()
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"id": "p1", "comments": []}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch("p1", fetch)))
+                   for _ in range(3)]
+        threads[0].start()
+        started.wait(5)
+        for t in threads[1:]:
+            t.start()
+        release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 3)
+
+    def test_exception_clears_pending_and_is_not_cached(self):
+        cache = PostCache()
+
+        def boom():
+            raise RuntimeError("reddit down")
+
+        with self.assertRaises(RuntimeError):
+            cache.get_or_fetch("p1", boom)
+        self.assertEqual(cache._pending, {})
+        self.assertEqual(cache.get_or_fetch("p1", lambda: {"id": "p1", "comments": []}),
+                         {"id": "p1", "comments": []})
+
+    def test_error_comment_records_are_refetched(self):
+        cache = PostCache(ttl_seconds=3600)
+        failed = {"id": "p1", "comments": [{"error": "Failed to fetch/flatten comments: timeout"}]}
+        self.assertIs(cache.get_or_fetch("p1", lambda: failed), failed)
+        ok = {"id": "p1", "comments": [{"id": "c1", "body": "fine"}]}
+        self.assertIs(cache.get_or_fetch("p1", lambda: ok), ok)
+        self.assertIs(cache.get_or_fetch("p1", lambda: failed), ok)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
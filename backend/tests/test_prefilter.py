@@ -0,0 +1,42 @@
+"""
+prefilter.prefilter_comments keep/drop rules.
+
+Run from backend/:  python -m pytest tests  (or python -m unittest discover tests)
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prefilter import prefilter_comments  # noqa: E402
+
+
+def _tuples(*texts):
+    return [(text, f"https://example.com/{i}", [1, 1, 1, 1]) for i, text in enumerate(texts)]
+
+
+class PrefilterTest(unittest.TestCase):
+    def test_drops_short_reactions_keeps_short_verdicts(self):
+        kept, stats = prefilter_comments(_tuples("lol", "this", "Battery is amazing", "Kindle died"), "kindle")
+        self.assertEqual([t[0] for t in kept], ["Battery is amazing", "Kindle died"])
+        self.assertEqual(stats["too_short"], 2)
+
+    def test_long_comments_are_kept_whatever_the_script(self):
+        long_text = "電池の持ちが良くて画面もきれい。" * 15  # few word tokens, 240 chars
+        kept, stats = prefilter_comments(_tuples(long_text, "🔥" * 250), "kindle", use_embedding_check=False)
+        self.assertEqual(len(kept), 2)
+        self.assertEqual(stats["too_short"], 0)
+
+    def test_non_english_words_are_counted(self):
+        kept, _ = prefilter_comments(_tuples("очень хороший товар"), "kindle", use_embedding_check=False)
+        self.assertEqual(len(kept), 1)
+
+    def test_disabled_keeps_everything(self):
+        kept, _ = prefilter_comments(_tuples("lol", "ok"), "kindle", enabled=False)
+        self.assertEqual(len(kept), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,219 @@
+"""
+RedditScheduler on its own (fake clock) and in front of PRAW talking to a
+minimal in-process fake Reddit (REDDIT_OAUTH_URL / REDDIT_URL point at it).
+
+Run from backend/:  python -m pytest tests  (or python -m unittest discover tests)
+"""
+
+import json
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.reddit_scheduler import (  # noqa: E402
+    BACKGROUND, INTERACTIVE, DeadlineExceeded, RedditScheduler, request_context,
+)
+
+try:
+    import praw  # noqa: F401
+except ImportError:
+    praw = None
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_tokens_refill_at_rate(self):
+        clock = FakeClock()
+        scheduler = RedditScheduler(rate_per_second=2, burst=2, clock=clock, wall_clock=clock)
+        scheduler.acquire()
+        scheduler.acquire()
+        with self.assertRaises(DeadlineExceeded):
+            scheduler.acquire(deadline=clock.now)
+        clock.now += 0.5
+        scheduler.acquire(deadline=clock.now)
+        self.assertEqual(scheduler.stats["granted"], 3)
+        self.assertEqual(scheduler.stats["deadline_exceeded"], 1)
+
+    def test_limits_headers_slow_the_bucket_down(self):
+        clock = FakeClock()
+        scheduler = RedditScheduler(rate_per_second=10, burst=60, clock=clock, wall_clock=clock)
+        scheduler.update_from_limits({"remaining": 6, "reset_timestamp": clock.now + 60, "used": 594})
+        self.assertEqual(scheduler.tokens, 6)
+        self.assertAlmostEqual(scheduler.rate, 0.1)
+        self.assertEqual(scheduler.stats["throttled_updates"], 1)
+
+    def test_workers_split_the_quota(self):
+        clock = FakeClock()
+        scheduler = RedditScheduler(rate_per_second=2, burst=60, clock=clock, wall_clock=clock, workers=4)
+        self.assertEqual((scheduler.rate, scheduler.burst, scheduler.tokens), (0.5, 15, 15))
+        scheduler.update_from_limits({"remaining": 40, "reset_timestamp": clock.now + 100, "used": 560})
+        self.assertEqual(scheduler.tokens, 10)
+        self.assertAlmostEqual(scheduler.rate, 0.1)
+
+    def test_one_module_under_both_names(self):
+        import reddit_scheduler
+        import backend.reddit_scheduler
+        self.assertIs(reddit_scheduler, backend.reddit_scheduler)
+        self.assertIs(reddit_scheduler.scheduler, backend.reddit_scheduler.scheduler)
+
+    def test_interactive_waiters_go_first(self):
+        scheduler = RedditScheduler(rate_per_second=20, burst=1)
+        scheduler.acquire()
+        order = []
+
+        def worker(priority):
+            scheduler.acquire(priority=priority)
+            order.append(priority)
+
+        background = threading.Thread(target=worker, args=(BACKGROUND,))
+        background.start()
+        while not scheduler._waiters:
+            pass
+        # queue the interactive caller behind the background one before a token frees up
+        with scheduler._cond:
+            interactive = threading.Thread(target=worker, args=(INTERACTIVE,))
+            interactive.start()
+            while len(scheduler._waiters) < 2:
+                scheduler._cond.wait(0.001)
+        background.join(5)
+        interactive.join(5)
+        self.assertEqual(order, [INTERACTIVE, BACKGROUND])
+
+
+class FakeReddit(ThreadingHTTPServer):
+    """Token endpoint, /r/<sub>/search, /comments/<id> and /user/<name>/about, with X-Ratelimit-* headers."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RedditHandler)
+        self.paths = []
+        self.ratelimit = {"x-ratelimit-remaining": "500", "x-ratelimit-reset": "300", "x-ratelimit-used": "0"}
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+def _post(post_id: str) -> dict:
+    return {"kind": "t3", "data": {
+        "id": post_id, "name": f"t3_{post_id}", "title": f"Widget review {post_id}",
+        "subreddit": "widgets", "author": "alice", "created_utc": 1700000000.0,
+        "permalink": f"/r/widgets/comments/{post_id}/widget_review/", "url": f"https://example.com/{post_id}",
+        "score": 42, "upvote_ratio": 0.9, "num_comments": 2, "over_18": False,
+    }}
+
+
+def _comment(post_id: str, comment_id: str, created: float) -> dict:
+    return {"kind": "t1", "data": {
+        "id": comment_id, "name": f"t1_{comment_id}", "author": "bob", "body": f"Battery is great ({comment_id})",
+        "score": 7, "created_utc": created, "parent_id": f"t3_{post_id}", "link_id": f"t3_{post_id}",
+        "subreddit": "widgets", "replies": "",
+    }}
+
+
+def _listing(children) -> dict:
+    return {"kind": "Listing", "data": {"children": children, "after": None, "before": None}}
+
+
+class _RedditHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in self.server.ratelimit.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.paths.append(urlparse(self.path).path)
+        self._reply({"access_token": "fake", "token_type": "bearer", "expires_in": 3600, "scope": "*"})
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip("/")
+        self.server.paths.append(path)
+        parts = path.split("/")
+        if path.endswith("/search"):
+            self._reply(_listing([_post("p1"), _post("p2")]))
+        elif parts[1] == "comments":
+            post_id = parts[2]
+            self._reply([_listing([_post(post_id)]),
+                         _listing([_comment(post_id, "c1", 1700000100.0), _comment(post_id, "c2", 1700000200.0)])])
+        elif parts[1] == "user":
+            self._reply({"kind": "t2", "data": {"name": parts[2], "link_karma": 10, "comment_karma": 20}})
+        else:
+            self.send_error(404)
+
+
+@unittest.skipUnless(praw is not None, "praw is not installed")
+class FakeRedditTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeReddit()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        env = {
+            "REDDIT_CLIENT_ID": "id", "REDDIT_CLIENT_SECRET": "secret", "REDDIT_USER_AGENT": "tests",
+            "REDDIT_OAUTH_URL": self.server.url, "REDDIT_URL": self.server.url,
+        }
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        from backend import data
+        self.data = data
+        self.scheduler = RedditScheduler(rate_per_second=100, burst=60)
+        scheduler_patch = mock.patch.object(data, "scheduler", self.scheduler)
+        scheduler_patch.start()
+        self.addCleanup(scheduler_patch.stop)
+        self.reddit = data.get_reddit_client()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_search_takes_a_token_per_page(self):
+        posts = self.data.search_submissions(self.reddit, "widget", limit=10)
+        self.assertEqual([p["id"] for p in posts], ["p1", "p2"])
+        self.assertIn("/r/all/search", self.server.paths)
+        self.assertEqual(self.scheduler.stats["granted"], 1)
+
+    def test_fetch_post_records_comments_and_follows_ratelimit_headers(self):
+        self.server.ratelimit = {"x-ratelimit-remaining": "5", "x-ratelimit-reset": "5", "x-ratelimit-used": "0"}
+        post = self.data.fetch_post_data("p1", max_comments=10, reddit=self.reddit)
+        self.assertEqual([c["created_utc"] for c in post["comments"]], [1700000100.0, 1700000200.0])
+        self.assertIn("/comments/p1", self.server.paths)
+        # post fetch + author profile
+        self.assertEqual(self.scheduler.stats["granted"], 2)
+        self.assertLessEqual(self.scheduler.tokens, 5)
+        self.assertAlmostEqual(self.scheduler.rate, 1.0, delta=0.3)
+        self.assertGreaterEqual(self.scheduler.stats["throttled_updates"], 1)
+
+    def test_deadline_stops_the_request_before_it_is_sent(self):
+        self.scheduler.tokens = 0
+        self.scheduler.rate = 0.01
+        with request_context(timeout=0.05):
+            with self.assertRaises(DeadlineExceeded):
+                self.data.fetch_post_data("p1", reddit=self.reddit)
+        self.assertNotIn("/comments/p1", self.server.paths)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+ScoreHistory windows, merges and monthly series against a brute-force
+RunningAggregate over the same comments, and HistoryStore round trips.
+
+Run from backend/:  python -m pytest tests  (or python -m unittest discover tests)
+"""
+
+import asyncio
+import math
+import os
+import random
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(1, os.path.dirname(BACKEND))  # llm.py falls back to backend.reddit_scheduler
+
+try:
+    import score_history
+    from calculate import RunningAggregate
+    from score_history import HistoryStore, ScoreHistory, _terms, build_history
+except ImportError:  # calculate needs dotenv/openai
+    score_history = None
+
+DAY = 24 * 60 * 60
+# 2024-01-01 .. 2024-12-31 UTC
+START = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+END = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def _comments(n, seed=0, url_prefix="c"):
+    rng = random.Random(seed)
+    comments = []
+    for i in range(n):
+        metrics = [rng.choice([-1, rng.uniform(0, 4)]) for _ in range(4)] + [rng.uniform(0, 5)]
+        comments.append((rng.uniform(START, END), f"https://reddit.com/{url_prefix}{i}", metrics, rng.uniform(0.1, 2)))
+    return comments
+
+
+def _history(comments):
+    return ScoreHistory([(ts, url, _terms(metrics, weight)) for ts, url, metrics, weight in comments])
+
+
+def _brute_force(comments, start=None, end=None):
+    agg = RunningAggregate()
+    for ts, _, metrics, weight in sorted(comments):
+        if (start is None or ts >= start) and (end is None or ts < end):
+            agg.add(metrics, weight)
+    return agg
+
+
+class AggregateTestCase(unittest.TestCase):
+    def assertSameAggregate(self, got, expected, places=9):
+        self.assertEqual(got.count, expected.count)
+        self.assertAlmostEqual(got.total_weight, expected.total_weight, places=places)
+        self.assertAlmostEqual(got.final_score, expected.final_score, places=places)
+        for g, e in zip(got.final_metrics, expected.final_metrics):
+            self.assertAlmostEqual(g, e, places=places)
+        if math.isinf(expected.uncertainty()):
+            self.assertTrue(math.isinf(got.uncertainty()))
+        else:
+            self.assertAlmostEqual(got.uncertainty(), expected.uncertainty(), places=places)
+
+
+@unittest.skipUnless(score_history is not None, "calculate.py's dependencies are not installed")
+class ScoreHistoryTest(AggregateTestCase):
+    def test_windows_match_brute_force(self):
+        comments = _comments(300)
+        history = _history(comments)
+        rng = random.Random(1)
+        windows = [(None, None), (START, None), (None, END), (END, None), (START + 100 * DAY, START + 100 * DAY)]
+        windows += [tuple(sorted(rng.uniform(START - DAY, END + DAY) for _ in range(2))) for _ in range(50)]
+        for start, end in windows:
+            with self.subTest(start=start, end=end):
+                self.assertSameAggregate(history.window(start, end), _brute_force(comments, start, end))
+
+    def test_boundaries_are_start_inclusive_end_exclusive(self):
+        comments = [(START, "a", [2, 2, 2, 2, 4], 1.0), (START + DAY, "b", [0, 0, 0, 0, 4], 1.0)]
+        history = _history(comments)
+        self.assertEqual(history.window(START, START + DAY).count, 1)
+        self.assertEqual(history.window(START + DAY, None).count, 1)
+        self.assertEqual(history.window(START + DAY, START).count, 0)
+
+    def test_merge_deduplicates_by_url_and_matches_brute_force(self):
+        first, second = _comments(120, seed=2), _comments(80, seed=3, url_prefix="d")
+        merged = _history(first).merge(_history(second)).merge(_history(first[:40]))
+        self.assertEqual(len(merged), 200)
+        self.assertEqual(merged.timestamps, sorted(merged.timestamps))
+        self.assertSameAggregate(merged.window(), _brute_force(first + second))
+
+    def test_merge_keeps_the_newest_max_comments(self):
+        comments = _comments(50, seed=4)
+        with mock.patch.object(score_history, "MAX_COMMENTS", 20):
+            merged = _history(comments[:30]).merge(_history(comments[30:]))
+        newest = sorted(comments)[-20:]
+        self.assertEqual([r[1] for r in merged.rows], [c[1] for c in newest])
+        self.assertSameAggregate(merged.window(), _brute_force(newest))
+
+    def test_monthly_matches_brute_force_per_calendar_month(self):
+        comments = _comments(400, seed=5)
+        now = datetime(2024, 12, 15, tzinfo=timezone.utc).timestamp()
+        series = _history(comments).monthly(12, now=now)
+        self.assertEqual([m["month"] for m in series], [f"2024-{m:02d}" for m in range(1, 13)])
+        for month, entry in enumerate(series, start=1):
+            begin = datetime(2024, month, 1, tzinfo=timezone.utc).timestamp()
+            end = datetime(2024 + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc).timestamp()
+            expected = _brute_force(comments, begin, end)
+            self.assertEqual(entry["comments"], expected.count)
+            self.assertAlmostEqual(entry["final_rating"], expected.final_score, places=9)
+        self.assertEqual(sum(m["comments"] for m in series), 400)
+
+    def test_empty_month_has_no_rating(self):
+        history = _history([(START, "a", [2, 2, 2, 2, 4], 1.0)])
+        february, january = history.monthly(2, now=START + 40 * DAY)[::-1]
+        self.assertEqual((january["comments"], february["comments"]), (1, 0))
+        self.assertIsNone(february["final_rating"])
+        self.assertIsNone(january["score_uncertainty"])  # one comment: no interval
+
+    def test_build_history_dates_by_created_utc_then_post_age(self):
+        newdata = [
+            ("kept", "u1", [2, 2, 2, 2, 4], [10, 100, 100, 1, START]),
+            ("no created_utc", "u2", [2, 2, 2, 2, 4], [10, 100, 100, 2]),
+            ("not credible", "u3", [2, 2, 2, 2, -1], [10, 100, 100, 1, START]),
+        ]
+        history = asyncio.run(build_history(newdata, now=END))
+        self.assertEqual({url: ts for ts, url, _ in history.rows},
+                         {"u1": START, "u2": END - 2 * score_history.MONTH_SECONDS})
+
+
+@unittest.skipUnless(score_history is not None, "calculate.py's dependencies are not installed")
+class HistoryStoreTest(AggregateTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.store = HistoryStore(os.path.join(self.dir.name, "history.db"))
+
+    def test_round_trip_is_keyed_by_canonical_keyword(self):
+        comments = _comments(30, seed=6)
+        self.store.add("Sony WH-1000XM5 review", _history(comments))
+        loaded = self.store.load("sony wh 1000xm5")
+        self.assertEqual(len(loaded), 30)
+        self.assertSameAggregate(loaded.window(), _brute_force(comments), places=4)  # terms stored to 6 decimals
+        self.assertEqual(len(self.store.load("sony wh 1000xm4")), 0)
+
+    def test_add_upserts_and_trims_to_max_comments(self):
+        first, second = _comments(15, seed=7), _comments(15, seed=8, url_prefix="d")
+        with mock.patch.object(score_history, "MAX_COMMENTS", 20):
+            self.store.add("widget", _history(first))
+            self.store.add("widget", _history(first[:5] + second))
+            loaded = self.store.load("widget")
+        self.assertEqual([r[1] for r in loaded.rows], [c[1] for c in sorted(first + second)[-20:]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+"""
+LLM token usage accounting and budgets.
+
+llm.create_response records the `usage` block of every response: input, cached
+input, output and reasoning tokens, plus latency. Totals are kept per stage,
+per keyword and per hour, and each call is logged. Requests cancelled after
+they were sent (losing hedges, timeouts) are billed all the same, so they are
+charged at the stage's average tokens per call. Cache hits in front of an
+LLM stage are counted too, with an estimate of the tokens they saved (the
+stage's average tokens per call).
+
+Budgets make the pipeline take its cheaper paths once exceeded:
+  LLM_REQUEST_TOKEN_BUDGET  tokens one /analyze request may spend
+  LLM_DAILY_TOKEN_BUDGET    tokens per UTC day (per worker process)
+Callers ask allows(stage) right before an optional LLM call, once its cache
+lookups have missed (so cache hits never count as budget skips). If the
+stage's expected cost would exceed either budget, they serve the stale or
+local result instead (cached summary, extractive pros/cons, product-index
+neighbours). 0 disables a budget.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Optional, Tuple
+
+REQUEST_TOKEN_BUDGET = int(os.getenv("LLM_REQUEST_TOKEN_BUDGET", "30000"))
+DAILY_TOKEN_BUDGET = int(os.getenv("LLM_DAILY_TOKEN_BUDGET", "2000000"))
+# Expected tokens per call until a stage has real history.
+DEFAULT_STAGE_TOKENS = {
+    "pros_cons": 8000,
+    "pros_cons_polish": 1200,
+    "summary": 1500,
+    "gpt_summary": 1000,
+    "similar_products": 700,
+}
+HOURS_KEPT = 48
+KEYWORDS_KEPT = 500
+
+FIELDS = ("calls", "input_tokens", "cached_input_tokens", "output_tokens", "reasoning_tokens",
+          "total_tokens", "latency_seconds")
+
+
+def _empty() -> Dict[str, float]:
+    return {f: 0 for f in FIELDS}
+
+
+class RequestUsage:
+    def __init__(self, keyword: Optional[str], budget: int) -> None:
+        self.keyword = keyword
+        self.budget = budget
+        self.totals = _empty()
+        self.budget_skips: list = []
+
+
+_current: contextvars.ContextVar[Optional[RequestUsage]] = contextvars.ContextVar("llm_usage", default=None)
+
+_stages: Dict[str, Dict[str, float]] = {}
+_keywords: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+_hours: Deque[Tuple[int, Dict[str, float]]] = deque(maxlen=HOURS_KEPT)
+_days: Dict[str, int] = {}
+_cache_hits: Dict[str, int] = {}
+_budget_skips: Dict[str, int] = {}
+_cancelled: Dict[str, int] = {}
+
+
+def _add(target: Dict[str, float], usage: Dict[str, float]) -> None:
+    for key, value in usage.items():
+        target[key] = target.get(key, 0) + value
+
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def tokens_today() -> int:
+    return _days.get(_today(), 0)
+
+
+def _usage_from_response(response: Any, latency: float) -> Dict[str, float]:
+    u = getattr(response, "usage", None)
+    input_details = getattr(u, "input_tokens_details", None)
+    output_details = getattr(u, "output_tokens_details", None)
+    input_tokens = getattr(u, "input_tokens", 0) or 0
+    output_tokens = getattr(u, "output_tokens", 0) or 0
+    return {
+        "calls": 1,
+        "input_tokens": input_tokens,
+        "cached_input_tokens": getattr(input_details, "cached_tokens", 0) or 0,
+        "output_tokens": output_tokens,
+        "reasoning_tokens": getattr(output_details, "reasoning_tokens", 0) or 0,
+        "total_tokens": getattr(u, "total_tokens", None) or input_tokens + output_tokens,
+        "latency_seconds": latency,
+    }
+
+
+def record(stage: str, response: Any, latency: float) -> None:
+    """Account one completed LLM response to its stage, keyword, hour, day and request."""
+    _account(stage, _usage_from_response(response, latency))
+
+
+def record_cancelled(stage: str, latency: float) -> None:
+    """
+    Account a request that was sent but cancelled before its response arrived
+    (e.g. the losing hedge). It is still billed, but there is no usage block,
+    so the stage's average tokens per call is charged instead.
+    """
+    _cancelled[stage] = _cancelled.get(stage, 0) + 1
+    usage = _empty()
+    usage.update(calls=1, total_tokens=int(expected_tokens(stage)), latency_seconds=latency)
+    _account(stage, usage, estimated=True)
+
+
+def _account(stage: str, usage: Dict[str, float], estimated: bool = False) -> None:
+    request = _current.get()
+    keyword = request.keyword if request is not None else None
+
+    _add(_stages.setdefault(stage, _empty()), usage)
+    if keyword:
+        _add(_keywords.setdefault(keyword, _empty()), usage)
+        _keywords.move_to_end(keyword)
+        while len(_keywords) > KEYWORDS_KEPT:
+            _keywords.popitem(last=False)
+    hour = int(time.time() // 3600)
+    if not _hours or _hours[-1][0] != hour:
+        _hours.append((hour, _empty()))
+    _add(_hours[-1][1], usage)
+    today = _today()
+    _days[today] = _days.get(today, 0) + int(usage["total_tokens"])
+    for day in [d for d in _days if d != today]:
+        del _days[day]
+    if request is not None:
+        _add(request.totals, usage)
+
+    latency = usage["latency_seconds"]
+    if estimated:
+        print(f"💸 LLM {stage}{f' [{keyword}]' if keyword else ''}: cancelled after {latency:.2f}s, "
+              f"~{int(usage['total_tokens'])} tokens estimated; today {tokens_today()} tokens")
+        return
+    print(f"💸 LLM {stage}{f' [{keyword}]' if keyword else ''}: in={usage['input_tokens']} "
+          f"(cached {usage['cached_input_tokens']}) out={usage['output_tokens']} "
+          f"(reasoning {usage['reasoning_tokens']}) {latency:.2f}s; today {tokens_today()} tokens")
+
+
+def record_cache_hit(stage: str) -> None:
+    """An LLM call for `stage` was avoided by a cache hit."""
+    _cache_hits[stage] = _cache_hits.get(stage, 0) + 1
+
+
+def expected_tokens(stage: str) -> float:
+    totals = _stages.get(stage)
+    if totals and totals["calls"]:
+        return totals["total_tokens"] / totals["calls"]
+    return DEFAULT_STAGE_TOKENS.get(stage, 1000)
+
+
+def allows(stage: str) -> bool:
+    """False if running `stage` would likely exceed the request or daily token budget."""
+    cost = expected_tokens(stage)
+    request = _current.get()
+    over_request = (request is not None and request.budget
+                    and request.totals["total_tokens"] + cost > request.budget)
+    over_day = DAILY_TOKEN_BUDGET and tokens_today() + cost > DAILY_TOKEN_BUDGET
+    if over_request or over_day:
+        _budget_skips[stage] = _budget_skips.get(stage, 0) + 1
+        if request is not None:
+            request.budget_skips.append(stage)
+        print(f"⚠️ Skipping LLM {stage}: {'request' if over_request else 'daily'} token budget reached")
+        return False
+    return True
+
+
+def current() -> Optional[RequestUsage]:
+    return _current.get()
+
+
+@contextmanager
+def track_request(keyword: Optional[str], budget: Optional[int] = None):
+    """Attribute LLM usage inside the block to one request / keyword, under its own token budget."""
+    request = RequestUsage(keyword, REQUEST_TOKEN_BUDGET if budget is None else budget)
+    token = _current.set(request)
+    try:
+        yield request
+    finally:
+        _current.reset(token)
+
+
+def _rounded(totals: Dict[str, float]) -> Dict[str, float]:
+    return {k: round(v, 2) if k == "latency_seconds" else int(v) for k, v in totals.items()}
+
+
+def get_usage(top_keywords: int = 20) -> Dict[str, Any]:
+    saved = {
+        stage: {"hits": hits, "est_tokens_saved": int(hits * expected_tokens(stage))}
+        for stage, hits in _cache_hits.items()
+    }
+    keywords = sorted(_keywords.items(), key=lambda kv: kv[1]["total_tokens"], reverse=True)
+    return {
+        "today": {"date": _today(), "total_tokens": tokens_today(), "budget": DAILY_TOKEN_BUDGET or None},
+        "request_budget": REQUEST_TOKEN_BUDGET or None,
+        "stages": {stage: _rounded(t) for stage, t in _stages.items()},
+        "keywords": {k: _rounded(t) for k, t in keywords[:top_keywords]},
+        "hourly": [{"hour_utc": time.strftime("%Y-%m-%dT%H:00Z", time.gmtime(h * 3600)), **_rounded(t)}
+                   for h, t in _hours],
+        "cache": saved,
+        "budget_skips": dict(_budget_skips),
+        "cancelled": dict(_cancelled),
+    }
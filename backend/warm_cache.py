@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Offline cache warming for a list of popular products.
+
+Runs the full /analyze pipeline (Reddit fetch, classification, summary,
+pros/cons, similar products) for every product in a text file, one name per
+line, and stores each response in the production cache so /analyze serves it
+straight from the cache for ANALYSIS_TTL_SECONDS.
+
+Network-bound work (Reddit, OpenAI) is overlapped with asyncio up to
+--concurrency products at a time, at BACKGROUND priority so a live server
+sharing the Reddit quota keeps precedence. Classification is CPU-bound and
+runs in a pool of --processes forked workers sharing one copy of the models.
+Progress is checkpointed after every product, so an interrupted run resumes
+where it stopped.
+
+    python warm_cache.py products.txt --concurrency 8 --processes 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from Classification import analyze_comment, configure_worker_threads, share_model_memory
+from reddit_api_call import PostCache
+from reddit_scheduler import BACKGROUND, request_context
+from server import run_analysis
+
+CHECKPOINT_FILE = "warm_checkpoint.json"
+DEFAULT_CONCURRENCY = 8
+
+
+def _init_worker(threads: int) -> None:
+    configure_worker_threads(threads)
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def start_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Fork the classification workers now, before the asyncio loop and before torch
+    has run anything: forking a process whose OpenMP/intra-op thread pool is
+    already running can hang the children. The models are loaded on import
+    above and moved to shared memory first, so the workers map the same pages
+    (see serve.py).
+    """
+    share_model_memory()
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    pool = ProcessPoolExecutor(max_workers=processes, mp_context=mp.get_context("fork"),
+                               initializer=_init_worker, initargs=(threads,))
+    # With the fork context the first submit launches every worker at once.
+    pool.submit(_ready).result()
+    return pool
+
+
+def _classify_sync(texts: List[str]) -> list:
+    return asyncio.run(analyze_comment(texts))
+
+
+def read_products(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        names = [line.strip() for line in f]
+    seen = set()
+    products = []
+    for name in names:
+        if name and not name.startswith("#") and name.lower() not in seen:
+            seen.add(name.lower())
+            products.append(name)
+    return products
+
+
+def load_checkpoint(path: str) -> Dict[str, dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_checkpoint(path: str, state: Dict[str, dict]) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def warm(products: List[str], concurrency: int, pool: ProcessPoolExecutor,
+               checkpoint: str) -> Dict[str, dict]:
+    state = load_checkpoint(checkpoint)
+    todo = [p for p in products if state.get(p, {}).get("status") != "done"]
+    print(f"🔥 Warming {len(todo)} products ({len(products) - len(todo)} already done)")
+    loop = asyncio.get_running_loop()
+
+    async def classify(texts: List[str]) -> list:
+        return await loop.run_in_executor(pool, _classify_sync, texts)
+
+    post_cache = PostCache()
+    semaphore = asyncio.Semaphore(concurrency)
+    run_id = uuid.uuid4().hex[:12]  # keeps temp files apart from overlapping warm runs
+
+    async def warm_one(index: int, product: str) -> None:
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                with request_context(priority=BACKGROUND):
+                    response = await run_analysis(product, use_cache=False,
+                                                  post_cache=post_cache, classify=classify,
+                                                  tmp_tag=f"warm-{run_id}-{index}")
+                state[product] = {"status": "done", "seconds": round(time.monotonic() - started, 2),
+                                  "final_rating": response["final_rating"]}
+                print(f"✓ {product}: {response['final_rating']:.2f} in {state[product]['seconds']}s")
+            except Exception as e:
+                state[product] = {"status": "failed", "seconds": round(time.monotonic() - started, 2),
+                                  "error": str(e)}
+                print(f"⚠️ {product} failed: {e}")
+            save_checkpoint(checkpoint, state)
+
+    started = time.monotonic()
+    await asyncio.gather(*(warm_one(i, p) for i, p in enumerate(todo)))
+
+    elapsed = time.monotonic() - started
+    finished = [state[p] for p in todo if p in state]
+    done = [s for s in finished if s["status"] == "done"]
+    failed = len(finished) - len(done)
+    print(f"\n📊 Warmed {len(done)}/{len(todo)} products in {elapsed:.1f}s "
+          f"({len(done) / elapsed * 60 if elapsed else 0:.1f} products/min, "
+          f"{sum(s['seconds'] for s in done) / len(done) if done else 0:.1f}s avg each, "
+          f"{failed} failed, {post_cache.hits} shared posts reused)")
+    return state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute /analyze results for popular products.")
+    parser.add_argument("products", help="Text file with one product name per line")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Products analyzed at once (network-bound stages)")
+    parser.add_argument("--processes", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Worker processes for comment classification")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE,
+                        help="Progress file; finished products are skipped on rerun")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and warm everything")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    pool = start_pool(args.processes)
+    try:
+        asyncio.run(warm(read_products(args.products), args.concurrency, pool, args.checkpoint))
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()